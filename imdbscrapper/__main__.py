@@ -0,0 +1,3 @@
+from imdbscrapper.cli import main
+
+main()
@@ -0,0 +1,319 @@
+# Feedback-driven concurrency for listing workers and the TMDb client.
+#
+# The advanced spider's listing workers and TMDbClient each hold a resizable
+# limit, registered here by name. With AUTOSCALE_ENABLED the Autoscaler
+# extension reviews both every AUTOSCALE_INTERVAL seconds, AIMD style:
+#   - a limit is cut by AUTOSCALE_DECREASE_FACTOR as soon as one of its
+#     signals is over target;
+#   - otherwise it grows by one, but only while callers queued for it during
+#     the interval, so an idle limit is left alone.
+# TMDb is judged on its p90 latency, 429 share and 5xx/failure share over the
+# interval. Listing workers are judged on driver page-load p90, driver
+# restarts, host CPU and the RSS of the crawl process and its browsers.
+# Every change is logged with the readings behind it and counted under
+# autoscale/<limit>/*.
+
+import asyncio
+import logging
+import math
+import os
+import re
+import threading
+from collections import deque
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from imdbscrapper.metrics import bucket_bound, cumulative_buckets, is_histogram, quantile
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+LISTING_WORKERS = 'listing_workers'
+TMDB_IN_FLIGHT = 'tmdb_in_flight'
+
+_limits = {}
+_limits_lock = threading.Lock()
+
+
+def register_limit(name, limit):
+    with _limits_lock:
+        _limits[name] = limit
+    return limit
+
+
+def registered_limit(name):
+    with _limits_lock:
+        return _limits.get(name)
+
+
+class ThreadLimit:
+    # Caps how many threads hold a slot at once. Shrinking it never
+    # interrupts a holder; new holders wait until enough slots are free.
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiting = 0
+        self.waits = 0
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        with self.condition:
+            if self.active >= self.limit:
+                self.waits += 1
+                self.waiting += 1
+                self.condition.wait_for(lambda: self.active < self.limit)
+                self.waiting -= 1
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def resize(self, limit):
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+    def take_waits(self):
+        # Acquires that had to wait since the last call, plus threads still waiting.
+        with self.condition:
+            waits, self.waits = self.waits, 0
+            return waits + self.waiting
+
+
+class AsyncLimit:
+    # asyncio counterpart of ThreadLimit, used from the event loop only.
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waits = 0
+        self.waiters = deque()
+
+    async def __aenter__(self):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return self
+        self.waits += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.waiters and self.active < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    def resize(self, limit):
+        self.limit = limit
+        self._wake()
+
+    def take_waits(self):
+        waits, self.waits = self.waits, 0
+        return waits + len(self.waiters)
+
+
+def host_usage():
+    # (CPU %, RSS in MB) of the host and of this process plus its children,
+    # e.g. chromedriver and Chrome. Without psutil the CPU reading is the
+    # 1-minute load average per core and the RSS covers this process only.
+    if psutil is not None:
+        try:
+            process = psutil.Process()
+            rss = sum(child.memory_info().rss for child in [process, *process.children(recursive=True)])
+            return psutil.cpu_percent(interval=None), rss / 2 ** 20
+        except psutil.Error:
+            return None, None
+    cpu = None
+    if hasattr(os, 'getloadavg'):
+        cpu = os.getloadavg()[0] / (os.cpu_count() or 1) * 100
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        rss = None
+    return cpu, rss
+
+
+class StatsWindow:
+    # Differences between two readings of the crawl stats.
+
+    def __init__(self, previous, current):
+        self.previous = previous
+        self.current = current
+
+    def delta(self, key):
+        return self.current.get(key, 0) - self.previous.get(key, 0)
+
+    def delta_matching(self, pattern):
+        keys = {key for key in self.current if pattern.match(key)}
+        return sum(self.delta(key) for key in keys)
+
+    def observations(self, name):
+        # Observations added to histogram `name` in this window.
+        current, previous = self.current.get(name), self.previous.get(name)
+        if not is_histogram(current):
+            return 0
+        return current['count'] - (previous['count'] if is_histogram(previous) else 0)
+
+    def latency(self, prefix, q=0.9):
+        # Quantile of every histogram under prefix, over this window only.
+        pattern = re.compile(rf'^{re.escape(prefix)}(/.+)?$')
+        counts, longest = {}, None
+        for key, current in self.current.items():
+            if not is_histogram(current) or not pattern.match(key):
+                continue
+            previous = self.previous.get(key)
+            previous = previous['buckets'] if is_histogram(previous) else {}
+            longest = max(longest or 0, current['max'])
+            for label, count in current['buckets'].items():
+                bound = bucket_bound(label)
+                counts[bound] = counts.get(bound, 0) + count - previous.get(label, 0)
+        if not sum(counts.values()):
+            return None
+        return quantile({'buckets': cumulative_buckets(counts), 'max': longest}, q)
+
+
+def percent(value):
+    return f'{value * 100:.1f}%'
+
+
+class Autoscaler:
+    def __init__(self, crawler, interval=10, decrease_factor=0.5, workers=(1, 10), tmdb=(2, 64),
+                 tmdb_latency_target=1.0, page_load_target=10.0, max_error_rate=0.05, max_429_rate=0.01,
+                 max_cpu_percent=85.0, max_rss_mb=4096.0):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = interval
+        self.decrease_factor = decrease_factor
+        self.bounds = {LISTING_WORKERS: workers, TMDB_IN_FLIGHT: tmdb}
+        self.tmdb_latency_target = tmdb_latency_target
+        self.page_load_target = page_load_target
+        self.max_error_rate = max_error_rate
+        self.max_429_rate = max_429_rate
+        self.max_cpu_percent = max_cpu_percent
+        self.max_rss_mb = max_rss_mb
+        self.previous = {}
+        self.loop = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('AUTOSCALE_ENABLED'):
+            raise NotConfigured
+        scaler = cls(
+            crawler,
+            interval=settings.getfloat('AUTOSCALE_INTERVAL', 10),
+            decrease_factor=settings.getfloat('AUTOSCALE_DECREASE_FACTOR', 0.5),
+            workers=(settings.getint('AUTOSCALE_INSTANCES_MIN', 1), settings.getint('AUTOSCALE_INSTANCES_MAX', 10)),
+            tmdb=(settings.getint('AUTOSCALE_TMDB_MIN', 2), settings.getint('AUTOSCALE_TMDB_MAX', 64)),
+            tmdb_latency_target=settings.getfloat('AUTOSCALE_TMDB_LATENCY_TARGET', 1.0),
+            page_load_target=settings.getfloat('AUTOSCALE_PAGE_LOAD_TARGET', 10.0),
+            max_error_rate=settings.getfloat('AUTOSCALE_MAX_ERROR_RATE', 0.05),
+            max_429_rate=settings.getfloat('AUTOSCALE_MAX_429_RATE', 0.01),
+            max_cpu_percent=settings.getfloat('AUTOSCALE_MAX_CPU_PERCENT', 85),
+            max_rss_mb=settings.getfloat('AUTOSCALE_MAX_RSS_MB', 4096),
+        )
+        crawler.signals.connect(scaler.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(scaler.spider_closed, signal=signals.spider_closed)
+        return scaler
+
+    def spider_opened(self, spider):
+        self.previous = dict(self.stats.get_stats())
+        host_usage()
+        self.loop = task.LoopingCall(self.review)
+        self.loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+
+    def review(self):
+        current = dict(self.stats.get_stats())
+        window = StatsWindow(self.previous, current)
+        self.previous = current
+        cpu, rss = host_usage()
+        if cpu is not None:
+            self.stats.set_value('autoscale/cpu_percent', round(cpu, 1))
+        if rss is not None:
+            self.stats.set_value('autoscale/rss_mb', round(rss, 1))
+        self.adjust(TMDB_IN_FLIGHT, self.tmdb_readings(window))
+        self.adjust(LISTING_WORKERS, self.worker_readings(window, cpu, rss))
+
+    def tmdb_readings(self, window):
+        # (label, value, target, formatter) for every signal with data this interval.
+        readings = []
+        requests = window.delta('tmdb/requests')
+        if requests:
+            failures = window.delta_matching(re.compile(r'^tmdb/status/5\d\d$')) + window.delta('tmdb/failures')
+            readings.append(('429 rate', window.delta('tmdb/status/429') / requests, self.max_429_rate, percent))
+            readings.append(('error rate', failures / requests, self.max_error_rate, percent))
+        latency = window.latency('tmdb/latency')
+        if latency is not None:
+            readings.append(('p90 latency', latency, self.tmdb_latency_target, '{:.2f}s'.format))
+        return readings
+
+    def worker_readings(self, window, cpu, rss):
+        readings = []
+        pages = window.observations('driver/page_load')
+        if pages:
+            readings.append(('driver restart rate', window.delta('driver/restarts') / pages, self.max_error_rate,
+                             percent))
+        latency = window.latency('driver/page_load')
+        if latency is not None:
+            readings.append(('page load p90', latency, self.page_load_target, '{:.2f}s'.format))
+        if cpu is not None and self.max_cpu_percent:
+            readings.append(('CPU', cpu, self.max_cpu_percent, '{:.0f}%'.format))
+        if rss is not None and self.max_rss_mb:
+            readings.append(('RSS', rss, self.max_rss_mb, '{:.0f}MB'.format))
+        return readings
+
+    def adjust(self, name, readings):
+        limit = registered_limit(name)
+        if limit is None:
+            return
+        low, high = self.bounds[name]
+        current = limit.limit
+        waits = limit.take_waits()
+        over = [f'{label} {fmt(value)} > {fmt(target)}' for label, value, target, fmt in readings if value > target]
+        if over:
+            new = max(low, min(high, math.floor(current * self.decrease_factor)))
+            reason = ', '.join(over)
+        elif waits:
+            new = max(low, min(high, current + 1))
+            healthy = [f'{label} {fmt(value)} <= {fmt(target)}' for label, value, target, fmt in readings]
+            reason = ', '.join([f'{waits} waits', *healthy])
+        else:
+            new = max(low, min(high, current))
+            reason = 'bounds'
+        self.stats.set_value(f'autoscale/{name}/limit', new)
+        if new == current:
+            return
+        limit.resize(new)
+        self.stats.inc_value(f'autoscale/{name}/{"increases" if new > current else "decreases"}')
+        logger.info(f"Autoscale {name}: {current} -> {new} ({reason})")
@@ -0,0 +1,1072 @@
+# Offline benchmark harness.
+#
+#   python -m imdbscrapper.bench run --spiders advance_scrapper basic_scrapper
+#   python -m imdbscrapper.bench micro
+#   python -m imdbscrapper.bench parse --processes 0 2 4 8
+#   python -m imdbscrapper.bench showmore --density 250
+#   python -m imdbscrapper.bench catalog --items 100000
+#   python -m imdbscrapper.bench media --images 2000 --drop-rate 0.05
+#   python -m imdbscrapper.bench record --start 2020 --end 2020 --pages-dir bench-pages
+#   python -m imdbscrapper.bench imports
+#
+# `run` starts a fixture IMDb server (recorded search pages from --pages-dir,
+# synthetic ones for every other window) and a TMDb stub with configurable
+# latency and 429 rate, then crawls each spider end to end in its own
+# process. Every run reports titles/min, TMDb requests per title, peak RSS,
+# CPU time and the stage latencies from the crawl metrics, and the runs are
+# written together as one JSON report. `micro` times listing parsing and item
+# building in-process, and `parse` measures how listing parsing scales across
+# PARSE_PROCESSES worker processes. `showmore` expands a fixture page in
+# Chrome with the old click-and-sleep loop and with DriverPool.show_more.
+# `catalog` times bulk upserts into the SQLite catalog, `media` downloads
+# images from a local static server that drops connections; `record` saves
+# live IMDb search pages for `run`.
+# `imports` times the CLI and spider imports in fresh interpreters and exits
+# non-zero when one is over budget or loads Selenium, aiohttp or redis.
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urljoin, urlparse
+
+from parsel import Selector
+
+from imdbscrapper import listing
+from imdbscrapper.partitions import SPARSE_BEFORE, seed_windows, split_window
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPIDERS = ('advance_scrapper', 'basic_scrapper')
+RENDERED_BATCH = 50
+
+
+def fixture_ids(start_date, end_date, density):
+    # Stable tt IDs: `density` titles per release day, unique across windows.
+    for day in range(start_date.toordinal(), end_date.toordinal() + 1):
+        for k in range(density):
+            yield day * 100 + k
+
+
+def fixture_title_item(number):
+    return {
+        'titleId': f'tt{number}',
+        'titleText': {'text': f'Fixture Title {number}'},
+        'releaseYear': {'year': date.fromordinal(number // 100).year},
+        'ratingSummary': {'aggregateRating': round(1 + number % 90 / 10, 1), 'voteCount': number % 100000},
+        'metascore': {'score': number % 100},
+        'titleType': {'id': 'tvSeries' if number % 5 == 0 else 'movie'},
+    }
+
+
+def rendered_item(title_item):
+    # Like IMDb, only non-feature titles carry a type label.
+    title_type = title_item['titleType']['id']
+    type_label = '<span class="dli-title-type-data">TV Series</span>' if title_type == 'tvSeries' else ''
+    return (
+        '<li class="ipc-metadata-list-summary-item">'
+        f'<a class="ipc-lockup-overlay" href="/title/{title_item["titleId"]}/"></a>'
+        f'<h3 class="ipc-title__text">{title_item["titleText"]["text"]}</h3>'
+        f'<span class="dli-title-metadata-item">{title_item["releaseYear"]["year"]}</span>'
+        f'{type_label}'
+        f'<span class="ipc-rating-star--rating">{title_item["ratingSummary"]["aggregateRating"]}</span>'
+        f'<span class="ipc-rating-star--voteCount">({title_item["ratingSummary"]["voteCount"]})</span>'
+        f'<span class="metacritic-score-box">{title_item["metascore"]["score"]}</span>'
+        '</li>'
+    )
+
+
+def fixture_search_page(start_date, end_date, density, count=listing.SEARCH_PAGE_SIZE, show_more_delay=0.2,
+                        expanded=False, start=1):
+    # A search page shaped like IMDb's: __NEXT_DATA__ carries `count` results
+    # from the 1-based `start` and the list renders RENDERED_BATCH of them,
+    # with a show-more button that appends the next batch after
+    # `show_more_delay` seconds. `expanded` renders every result, like
+    # page_source after the last click.
+    total = (end_date.toordinal() - start_date.toordinal() + 1) * density
+    title_items = []
+    for position, number in enumerate(fixture_ids(start_date, end_date, density), 1):
+        if len(title_items) >= count:
+            break
+        if position >= start:
+            title_items.append(fixture_title_item(number))
+    next_data = {'props': {'pageProps': {'searchResults': {'titleResults': {
+        'total': total, 'titleListItems': title_items,
+    }}}}}
+    rendered = [rendered_item(title_item) for title_item in title_items]
+    batch = len(rendered) if expanded else RENDERED_BATCH
+    button = '<button class="ipc-see-more__button">50 more</button>' if len(rendered) > batch else ''
+    return f'''<html><head><title>Fixture search</title></head><body>
+<script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data)}</script>
+<ul class="ipc-metadata-list">{''.join(rendered[:batch])}</ul>{button}
+<script>
+const more = {json.dumps(rendered[batch:])};
+const button = document.querySelector('button.ipc-see-more__button');
+if (button) button.addEventListener('click', () => setTimeout(() => {{
+  document.querySelector('ul.ipc-metadata-list').insertAdjacentHTML('beforeend', more.splice(0, {RENDERED_BATCH}).join(''));
+  if (!more.length) button.remove();
+}}, {int(show_more_delay * 1000)}));
+</script></body></html>'''
+
+
+def recorded_page_name(start_date, end_date, start=1):
+    suffix = f'_{start}' if start > 1 else ''
+    return f'{start_date.isoformat()}_{end_date.isoformat()}{suffix}.html'
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler, **options):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.options = options
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(options.get('seed', 0))
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def handle_error(self, request, client_address):
+        # Crawlers drop idle keep-alive connections at shutdown.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='bench-fixture', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='application/json', headers=None):
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class IMDbFixtureHandler(FixtureHandler):
+    # Serves fixture search pages; windows starting on a date in the
+    # `missing` option (ISO dates) answer 404 instead.
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/robots.txt':
+            self.send_body(404, '', 'text/plain')
+            return
+        query = parse_qs(url.query)
+        options = self.server.options
+        self.server.count('requests')
+        if 'release_date' not in query:
+            self.send_body(200, '<html><body></body></html>', 'text/html')
+            return
+        start_date, end_date = (date.fromisoformat(day) for day in query['release_date'][0].split(','))
+        if start_date.isoformat() in options.get('missing', ()):
+            self.server.count('missing')
+            self.send_body(404, '<html><body>Not found</body></html>', 'text/html')
+            return
+        start = listing.page_start(self.path)
+        recorded = None
+        if options.get('pages_dir'):
+            recorded = os.path.join(options['pages_dir'], recorded_page_name(start_date, end_date, start))
+        if recorded and os.path.exists(recorded):
+            self.server.count('recorded')
+            with open(recorded, 'rb') as f:
+                self.send_body(200, f.read(), 'text/html; charset=utf-8')
+            return
+        count = int(query.get('count', [listing.SEARCH_PAGE_SIZE])[0])
+        page = fixture_search_page(start_date, end_date, options['density'], count, options['show_more_delay'],
+                                   start=start)
+        self.send_body(200, page, 'text/html; charset=utf-8')
+
+
+class TMDbStubHandler(FixtureHandler):
+    # Answers /find, /movie, /tv and the changes feeds like TMDb for the
+    # fixture IDs: multiples of five are TV shows, the rest movies, and one
+    # title in seven is unknown to TMDb. The changes feeds list the IDs in
+    # the `changes` option ({'movie': [...], 'tv': [...]}), empty by default,
+    # and those titles come back with a revised overview. Requests are
+    # counted by how they authenticate (auth/header, auth/query).
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/robots.txt':
+            self.send_body(404, '', 'text/plain')
+            return
+        options = self.server.options
+        parts = url.path.strip('/').split('/')[1:]
+        endpoint = parts[0] if parts else ''
+        self.server.count('requests')
+        self.server.count(f'requests/{endpoint}')
+        if self.headers.get('Authorization', '').startswith('Bearer '):
+            self.server.count('auth/header')
+        if 'api_key' in parse_qs(url.query):
+            self.server.count('auth/query')
+        with self.server.lock:
+            throttled = self.server.random.random() < options['error_rate']
+            delay = self.server.random.expovariate(1 / options['latency']) if options['latency'] else 0
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            self.server.count('429')
+            self.send_body(429, '{"status_code": 25}', headers={'Retry-After': str(options['retry_after'])})
+            return
+        body = self.answer(parts)
+        if body is None:
+            self.send_body(404, '{"status_code": 34}')
+        else:
+            self.send_body(200, json.dumps(body))
+
+    @staticmethod
+    def known(number):
+        return number % 7 != 3
+
+    def answer(self, parts):
+        if len(parts) == 2 and parts[1] == 'changes':
+            changed = self.server.options.get('changes', {}).get(parts[0], [])
+            return {'results': [{'id': tmdb_id, 'adult': False} for tmdb_id in changed], 'page': 1, 'total_pages': 1}
+        if len(parts) != 2:
+            return None
+        endpoint, ref = parts
+        if endpoint == 'find':
+            number = int(ref[2:]) if ref[2:].isdigit() else 0
+            found = [{'id': number}] if self.known(number) else []
+            is_movie = number % 5 != 0
+            return {'movie_results': found if is_movie else [], 'tv_results': [] if is_movie else found}
+        if endpoint not in ('movie', 'tv'):
+            return None
+        if ref.startswith('tt'):
+            # /movie/{imdb_id} only resolves feature films.
+            number = int(ref[2:]) if ref[2:].isdigit() else 0
+            if endpoint != 'movie' or number % 5 == 0 or not self.known(number):
+                return None
+        else:
+            number = int(ref)
+        data = self.details(endpoint, number)
+        if number in self.server.options.get('changes', {}).get(endpoint, ()):
+            data['overview'] = f'Revised overview for title {number}.'
+        return data
+
+    @staticmethod
+    def details(media_type, number):
+        data = {
+            'id': number,
+            'imdb_id': f'tt{number}',
+            'overview': f'Synthetic overview for title {number}.',
+            'tagline': 'A fixture title.',
+            'vote_average': round(number % 100 / 10, 1),
+            'vote_count': number % 5000,
+            'popularity': number % 1000 / 10,
+            'original_language': 'en',
+            'status': 'Released',
+            'adult': False,
+            'poster_path': f'/p{number}.jpg',
+            'backdrop_path': f'/b{number}.jpg',
+            'genres': [{'id': 18, 'name': 'Drama'}, {'id': 35, 'name': 'Comedy'}],
+            'production_companies': [{'name': 'Fixture Pictures'}],
+            'production_countries': [{'name': 'United States of America'}],
+            'spoken_languages': [{'english_name': 'English', 'name': 'English'}],
+            'origin_country': ['US'],
+            'credits': {
+                'cast': [{'name': f'Actor {number}-{k}'} for k in range(15)],
+                'crew': [{'name': f'Crew {number}-{k}', 'job': 'Director' if k == 0 else 'Writer'} for k in range(12)],
+            },
+            'videos': {'results': [{'type': 'Trailer', 'site': 'YouTube', 'key': f'v{number}'}]},
+        }
+        if media_type == 'movie':
+            data.update({'title': f'Fixture Title {number}', 'original_title': f'Fixture Title {number}',
+                         'release_date': date.fromordinal(number // 100).isoformat(), 'runtime': 90 + number % 60,
+                         'budget': number % 1000 * 10000, 'revenue': number % 1000 * 30000,
+                         'keywords': {'keywords': [{'name': 'fixture'}, {'name': 'benchmark'}]}})
+        else:
+            data.update({'name': f'Fixture Title {number}', 'original_name': f'Fixture Title {number}',
+                         'first_air_date': date.fromordinal(number // 100).isoformat(),
+                         'episode_run_time': [45], 'keywords': {'results': [{'name': 'fixture'}]}})
+        return data
+
+
+class MediaFixtureHandler(FixtureHandler):
+    # A static image server for /t/p/<size>/<name>. Every image is
+    # `image_kb` KB of bytes derived from its name; names ending in a
+    # multiple of `duplicate_every` share one body. Range requests are
+    # honoured, and a `drop_rate` share of responses is cut off halfway.
+    protocol_version = 'HTTP/1.1'
+
+    def image(self, name):
+        options = self.server.options
+        stem = os.path.splitext(name)[0]
+        number = int(''.join(ch for ch in stem if ch.isdigit()) or 0)
+        if options['duplicate_every'] and number % options['duplicate_every'] == 0:
+            stem = 'shared'
+        seed = hashlib.sha256(stem.encode('utf-8')).digest()
+        return (seed * (options['image_kb'] * 1024 // len(seed) + 1))[:options['image_kb'] * 1024]
+
+    def do_GET(self):
+        parts = urlparse(self.path).path.strip('/').split('/')
+        if len(parts) != 4 or parts[:2] != ['t', 'p']:
+            self.send_body(404, '', 'text/plain')
+            return
+        self.server.count('requests')
+        body = self.image(parts[3])
+        status, headers = 200, {'Accept-Ranges': 'bytes'}
+        ranged = self.headers.get('Range', '')
+        if ranged.startswith('bytes='):
+            start = int(ranged[len('bytes='):].split('-')[0])
+            if start >= len(body):
+                self.send_body(416, b'', 'image/jpeg', {'Content-Range': f'bytes */{len(body)}'})
+                return
+            self.server.count('ranges')
+            status, headers['Content-Range'] = 206, f'bytes {start}-{len(body) - 1}/{len(body)}'
+            body = body[start:]
+        with self.server.lock:
+            dropped = self.server.random.random() < self.server.options['drop_rate']
+        if not dropped:
+            self.send_body(status, body, 'image/jpeg', headers)
+            return
+        self.server.count('dropped')
+        self.send_response(status)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body[:len(body) // 2])
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def instance_counts(value):
+    try:
+        counts = [int(part) for part in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}") from None
+    if min(counts) < 1:
+        raise argparse.ArgumentTypeError(f"instance counts must be at least 1, got {value!r}")
+    return counts
+
+
+def spider_arguments(spider, args, num_instances=None):
+    arguments = {'tmdb_api_key': 'bench', 'listing_mode': args.listing_mode}
+    if spider == 'advance_scrapper':
+        arguments.update(start=args.start, end=args.end, num_instances=num_instances or args.num_instances[0])
+    else:
+        arguments.update(max_movies=args.max_movies)
+    return arguments
+
+
+def crawl_command(spider, arguments, settings):
+    command = [sys.executable, '-m', 'scrapy', 'crawl', spider]
+    for name, value in arguments.items():
+        command += ['-a', f'{name}={value}']
+    for name, value in settings.items():
+        command += ['-s', f'{name}={value}']
+    return command
+
+
+def sample_tree_rss(pid, peak, stop):
+    from imdbscrapper.drivers import process_rss
+
+    while not stop.wait(0.2):
+        rss = process_rss(pid)
+        if rss is not None:
+            peak[0] = max(peak[0], rss)
+
+
+def run_spider(spider, args, imdb, tmdb, report_dir, num_instances=None):
+    run_dir = tempfile.mkdtemp(prefix=f'{spider}-', dir=report_dir)
+    metrics_path = os.path.join(run_dir, 'metrics.json')
+    settings = {
+        'IMDB_BASE_URL': imdb.base_url,
+        'TMDB_BASE_URL': f'{tmdb.base_url}/3',
+        'TMDB_CACHE_PATH': os.path.join(run_dir, 'tmdb_cache.sqlite3'),
+        'EXPORT_DIR': os.path.join(run_dir, 'exports'),
+        'METRICS_JSON_PATH': metrics_path,
+        'METRICS_INTERVAL': 5,
+        'LOG_FILE': os.path.join(run_dir, 'crawl.log'),
+        'LOG_LEVEL': 'INFO',
+    }
+    for assignment in args.set:
+        name, _, value = assignment.partition('=')
+        settings[name] = value
+    env = {**os.environ, 'SCRAPY_SETTINGS_MODULE': 'imdbscrapper.settings',
+           'PYTHONPATH': os.pathsep.join(filter(None, [PACKAGE_ROOT, os.environ.get('PYTHONPATH')]))}
+    tmdb.counts.clear()
+    imdb.counts.clear()
+
+    started = time.monotonic()
+    arguments = spider_arguments(spider, args, num_instances)
+    process = subprocess.Popen(crawl_command(spider, arguments, settings), cwd=run_dir, env=env)
+    tree_peak, stop = [0], threading.Event()
+    sampler = threading.Thread(target=sample_tree_rss, args=(process.pid, tree_peak, stop), daemon=True)
+    sampler.start()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall_seconds = time.monotonic() - started
+    stop.set()
+    sampler.join()
+
+    metrics = {'stats': {}, 'latency': {}}
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding='utf-8') as f:
+            metrics = json.load(f)
+    stats = metrics['stats']
+    titles = stats.get('item_scraped_count', 0)
+    elapsed = stats.get('elapsed_time_seconds') or wall_seconds
+    cpu_seconds = usage.ru_utime + usage.ru_stime
+    return {
+        'spider': spider,
+        'arguments': arguments,
+        'settings': {name: value for name, value in settings.items() if name in args.set_names},
+        'exit_code': process.returncode,
+        'run_dir': run_dir,
+        'elapsed_seconds': round(elapsed, 3),
+        'wall_seconds': round(wall_seconds, 3),
+        'titles': titles,
+        'titles_per_minute': round(titles / elapsed * 60, 1) if elapsed else None,
+        'titles_per_second': round(titles / elapsed, 2) if elapsed else None,
+        'titles_dropped': stats.get('item_dropped_count', 0),
+        'imdb_requests': imdb.counts['requests'],
+        'tmdb_requests': tmdb.counts['requests'],
+        'tmdb_requests_per_title': round(tmdb.counts['requests'] / titles, 3) if titles else None,
+        'tmdb_requests_by_endpoint': {
+            key.split('/', 1)[1]: value for key, value in tmdb.counts.items() if key.startswith('requests/')
+        },
+        'tmdb_429': tmdb.counts['429'],
+        'tmdb_cache_hits': stats.get('tmdb/cache/hit', 0),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'peak_tree_rss_mb': round(tree_peak[0] / 2 ** 20, 1) if tree_peak[0] else None,
+        'cpu_user_seconds': round(usage.ru_utime, 3),
+        'cpu_system_seconds': round(usage.ru_stime, 3),
+        'cpu_percent': round(cpu_seconds / wall_seconds * 100, 1) if wall_seconds else None,
+        'latency': metrics['latency'],
+    }
+
+
+def command_run(args):
+    if args.listing_mode == 'replay' and 'basic_scrapper' in args.spiders:
+        sys.exit("bench: basic_scrapper does not support --listing-mode replay; use http or selenium")
+    args.set_names = {assignment.partition('=')[0] for assignment in args.set}
+    os.makedirs(args.report_dir, exist_ok=True)
+    imdb = FixtureServer(IMDbFixtureHandler, density=args.density, show_more_delay=args.show_more_delay,
+                         pages_dir=args.pages_dir).start()
+    tmdb = FixtureServer(TMDbStubHandler, latency=args.tmdb_latency, error_rate=args.tmdb_429_rate,
+                         retry_after=args.retry_after, seed=args.seed).start()
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpu_count': os.cpu_count()},
+        'fixture': {'density': args.density, 'show_more_delay': args.show_more_delay, 'pages_dir': args.pages_dir,
+                    'tmdb_latency': args.tmdb_latency, 'tmdb_429_rate': args.tmdb_429_rate,
+                    'retry_after': args.retry_after, 'seed': args.seed},
+        'runs': [],
+    }
+    # The advanced spider is run once per --num-instances value; basic_scrapper
+    # has a single browser and ignores it.
+    sweep = {}
+    try:
+        for spider in args.spiders:
+            for num_instances in (args.num_instances if spider == 'advance_scrapper' else [None]):
+                label = spider if num_instances is None else f'{spider} num_instances={num_instances}'
+                for repeat in range(args.repeat):
+                    print(f"Running {label} ({repeat + 1}/{args.repeat})...", flush=True)
+                    result = run_spider(spider, args, imdb, tmdb, args.report_dir, num_instances)
+                    report['runs'].append(result)
+                    if num_instances is not None and result['titles_per_second'] is not None:
+                        sweep.setdefault(num_instances, []).append(result['titles_per_second'])
+                    print(f"  {result['titles']} titles in {result['elapsed_seconds']}s: "
+                          f"{result['titles_per_second']} titles/s, "
+                          f"{result['tmdb_requests_per_title']} TMDb requests/title, "
+                          f"peak RSS {result['peak_rss_mb']} MB, CPU {result['cpu_percent']}%", flush=True)
+    finally:
+        imdb.stop()
+        tmdb.stop()
+    if len(sweep) > 1:
+        report['num_instances_sweep'] = {
+            num_instances: round(sum(rates) / len(rates), 2) for num_instances, rates in sweep.items()
+        }
+        print("advance_scrapper titles/s by num_instances:")
+        for num_instances, rate in report['num_instances_sweep'].items():
+            print(f"  {num_instances:>3}: {rate}")
+    path = args.output or os.path.join(args.report_dir, f"bench-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {path}")
+
+
+class BenchStats(dict):
+    # The part of Scrapy's stats collector API the pipelines use, for
+    # components benchmarked outside a crawl.
+
+    def inc_value(self, key, count=1, start=0):
+        self[key] = self.get(key, start) + count
+
+    def max_value(self, key, value):
+        self[key] = max(self.get(key, value), value)
+
+    def get_value(self, key, default=None):
+        return self.get(key, default)
+
+    def set_value(self, key, value):
+        self[key] = value
+
+    def get_stats(self):
+        return self
+
+
+def timed_rate(func, count, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(count / best, 1)
+
+
+class StaticPageHandler(FixtureHandler):
+    def do_GET(self):
+        self.send_body(200, self.server.options['page'], 'text/html; charset=utf-8')
+
+
+class FixtureElement:
+    # Stands in for a selenium WebElement over a parsel node, so the
+    # per-element extraction path runs without a browser. Each WebDriver
+    # command (find_element, .text, get_attribute) is counted and can be
+    # charged a simulated chromedriver round-trip.
+
+    def __init__(self, node, base_url, calls, round_trip=0.0):
+        self.node = node
+        self.base_url = base_url
+        self.calls = calls
+        self.round_trip = round_trip
+
+    def _command(self):
+        self.calls[0] += 1
+        if self.round_trip:
+            time.sleep(self.round_trip)
+
+    def find_element(self, by, selector):
+        from selenium.common.exceptions import NoSuchElementException
+
+        self._command()
+        found = self.node.css(selector)
+        if not found:
+            raise NoSuchElementException(selector)
+        return FixtureElement(found[0], self.base_url, self.calls, self.round_trip)
+
+    @property
+    def text(self):
+        self._command()
+        return self.node.xpath('string()').get().strip()
+
+    def get_attribute(self, name):
+        self._command()
+        value = self.node.attrib.get(name)
+        return urljoin(self.base_url, value) if name == 'href' and value else value
+
+
+def browser_extraction_rates(page, repeat):
+    # Both extraction paths against the same page in a real Chrome.
+    from selenium.webdriver.common.by import By
+
+    from imdbscrapper.drivers import DriverPool
+
+    server = FixtureServer(StaticPageHandler, page=page).start()
+    pool = DriverPool(blocked_urls=[])
+    driver = pool.acquire()
+    try:
+        driver.get(f'{server.base_url}/search')
+        count = len(driver.find_elements(By.CSS_SELECTOR, listing.ITEM_SELECTOR))
+        return {
+            'browser_batch_rows_per_second': timed_rate(
+                lambda: listing.parse_rendered_items(driver.page_source), count, repeat),
+            'browser_element_rows_per_second': timed_rate(
+                lambda: [listing.row_from_element(div)
+                         for div in driver.find_elements(By.CSS_SELECTOR, listing.ITEM_SELECTOR)], count, repeat),
+        }
+    finally:
+        pool.release(driver)
+        pool.close()
+        server.stop()
+
+
+def command_micro(args):
+    from scrapy.http import HtmlResponse
+
+    from imdbscrapper.items import ListingRow
+    from imdbscrapper.normalize import build_movie_item, build_movie_items
+
+    start_date = end_date = date(2020, 1, 1)
+    page = fixture_search_page(start_date, end_date, listing.SEARCH_PAGE_SIZE)
+    expanded = fixture_search_page(start_date, end_date, listing.SEARCH_PAGE_SIZE, expanded=True)
+    response = HtmlResponse(url=listing.search_url(start_date, end_date), body=page, encoding='utf-8')
+    rendered = listing.parse_rendered_items(expanded)
+    calls = [0]
+    elements = [FixtureElement(node, listing.IMDB_BASE_URL, calls, args.round_trip_ms / 1000)
+                for node in Selector(text=expanded).css(listing.ITEM_SELECTOR)]
+    assert [listing.row_from_element(element) for element in elements] == rendered
+    calls[0] = 0
+    rows = [ListingRow(**row) for row in listing.parse_search_results(response)[0]]
+    tmdb_data = [TMDbStubHandler.details('movie', int(row.imdb_id[2:])) for row in rows]
+    for data in tmdb_data:
+        data['media_type'] = 'movie'
+        data['trailer_link'] = None
+    items = [build_movie_item(data, row) for data, row in zip(tmdb_data, rows)]
+
+    def build_all():
+        for data, row in zip(tmdb_data, rows):
+            build_movie_item(data, row)
+
+    results = {
+        'listing_next_data_rows_per_second': timed_rate(
+            lambda: listing.parse_search_results(response), len(rows), args.repeat),
+        'listing_rendered_rows_per_second': timed_rate(
+            lambda: listing.parse_rendered_items(expanded), len(rendered), args.repeat),
+        'listing_element_rows_per_second': timed_rate(
+            lambda: [listing.row_from_element(element) for element in elements], len(rendered), args.repeat),
+        'round_trip_ms': args.round_trip_ms,
+        'build_movie_item_per_second': timed_rate(build_all, len(items), args.repeat),
+        'build_movie_items_per_second': timed_rate(
+            lambda: build_movie_items(zip(tmdb_data, rows)), len(items), args.repeat),
+        'movie_item_bytes': sys.getsizeof(items[0]),
+        'movie_item_as_dict_bytes': sys.getsizeof(asdict(items[0])),
+    }
+    results['element_webdriver_calls_per_row'] = round(calls[0] / (len(rendered) * args.repeat), 1)
+    if args.browser:
+        results.update(browser_extraction_rates(expanded, args.repeat))
+    print(json.dumps(results, indent=2))
+
+
+def click_loop_show_more(driver, wait=5.0, sleep=1.0):
+    # The show-more loop the spiders used before DriverPool.show_more: wait
+    # for a clickable button, click it, sleep a fixed interval, repeat until
+    # the wait times out.
+    from selenium.common.exceptions import NoSuchElementException, TimeoutException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    clicks = 0
+    while True:
+        try:
+            button = WebDriverWait(driver, wait).until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, listing.SHOW_MORE_SELECTOR))
+            )
+        except (TimeoutException, NoSuchElementException):
+            return clicks
+        driver.execute_script("arguments[0].click();", button)
+        clicks += 1
+        time.sleep(sleep)
+
+
+def observer_show_more(driver, total):
+    clicks = 0
+    while True:
+        result = driver.show_more(total)
+        clicks += result.clicked
+        if result.after <= result.before:
+            return clicks
+
+
+def command_showmore(args):
+    # Loads one fixture search page per round in Chrome and expands it with
+    # each strategy, alternating so both see the same browser state.
+    from imdbscrapper.drivers import DriverPool
+
+    imdb = FixtureServer(IMDbFixtureHandler, density=args.density, show_more_delay=args.show_more_delay).start()
+    pool = DriverPool(headless=not args.show_browser, blocked_urls=[], show_more_timeout=args.timeout)
+    day = date(2020, 1, 1)
+    url = listing.search_url(day, day, base_url=imdb.base_url)
+    strategies = {
+        'click_loop': lambda driver: click_loop_show_more(driver, args.click_wait, args.click_sleep),
+        'mutation_observer': lambda driver: observer_show_more(driver, args.density),
+    }
+    timings = {name: [] for name in strategies}
+    clicks, items = {}, {}
+    driver = pool.acquire()
+    try:
+        for _ in range(args.repeat):
+            for name, expand in strategies.items():
+                driver.get(url)
+                started = time.perf_counter()
+                clicks[name] = expand(driver)
+                timings[name].append(time.perf_counter() - started)
+                items[name] = driver.execute_script(
+                    'return document.querySelectorAll(arguments[0]).length', listing.ITEM_SELECTOR)
+    finally:
+        pool.release(driver)
+        pool.close()
+        imdb.stop()
+    results = {
+        'items': args.density,
+        'show_more_delay': args.show_more_delay,
+        'strategies': {
+            name: {
+                'median_seconds': round(sorted(values)[len(values) // 2], 3),
+                'min_seconds': round(min(values), 3),
+                'clicks': clicks[name],
+                'items_rendered': items[name],
+                'seconds_per_click': round(sorted(values)[len(values) // 2] / clicks[name], 3) if clicks[name] else None,
+            }
+            for name, values in timings.items()
+        },
+    }
+    old, new = (results['strategies'][name]['median_seconds'] for name in strategies)
+    results['speedup'] = round(old / new, 2) if new else None
+    print(json.dumps(results, indent=2))
+
+
+def tick_lag(stop, lags, interval=0.001):
+    # Stands in for the reactor thread: how late it wakes up shows how long
+    # parsing holds the GIL.
+    while not stop.is_set():
+        started = time.perf_counter()
+        time.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+def command_parse(args):
+    from imdbscrapper.parsing import ParserPool
+
+    pages = []
+    for number in range(args.pages):
+        first_day = date.fromordinal(date(2020, 1, 1).toordinal() + number * 28)
+        last_day = date.fromordinal(first_day.toordinal() + 27)
+        pages.append(fixture_search_page(first_day, last_day, listing.SEARCH_PAGE_SIZE, expanded=True))
+    rows_per_page = len(listing.parse_rendered_items(pages[0]))
+    process_counts = args.processes or sorted({0, 1, 2, 4, 8, os.cpu_count() or 1} & set(range((os.cpu_count() or 1) + 1)))
+    results = []
+    for processes in process_counts:
+        pool = ParserPool(processes)
+        try:
+            # Warm up so spawning the workers is not timed.
+            with ThreadPoolExecutor(max(processes, 1)) as warmup:
+                list(warmup.map(pool.rendered_rows, pages[:max(processes, 1)]))
+
+            def parse_page(page):
+                pool.search_total(page)
+                return len(pool.rendered_rows(page))
+
+            stop, lags = threading.Event(), []
+            ticker = threading.Thread(target=tick_lag, args=(stop, lags), daemon=True)
+            ticker.start()
+            cpu_started, started = time.process_time(), time.perf_counter()
+            with ThreadPoolExecutor(args.threads) as workers:
+                rows = sum(workers.map(parse_page, pages))
+            elapsed = time.perf_counter() - started
+            cpu = time.process_time() - cpu_started
+            stop.set()
+            ticker.join()
+        finally:
+            pool.close()
+        lags.sort()
+        results.append({
+            'processes': processes,
+            'pages_per_second': round(len(pages) / elapsed, 1),
+            'rows_per_second': round(rows / elapsed, 1),
+            'main_process_cpu_seconds': round(cpu, 3),
+            'tick_lag_p99_ms': round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else None,
+            'tick_lag_max_ms': round(lags[-1] * 1000, 2) if lags else None,
+        })
+        print(f"processes={processes}: {results[-1]['pages_per_second']} pages/s, "
+              f"reactor tick lag p99 {results[-1]['tick_lag_p99_ms']} ms", flush=True)
+    inline = next((result['pages_per_second'] for result in results if result['processes'] == 0), None)
+    for result in results:
+        result['speedup'] = round(result['pages_per_second'] / inline, 2) if inline else None
+    print(json.dumps({'cpu_count': os.cpu_count(), 'pages': len(pages), 'rows_per_page': rows_per_page,
+                      'threads': args.threads, 'results': results}, indent=2))
+
+
+def fixture_movie_items(count, offset=0):
+    from imdbscrapper.items import ListingRow
+    from imdbscrapper.normalize import build_movie_item
+
+    first = date(2000, 1, 1).toordinal() * 100
+    for number in range(first + offset, first + offset + count):
+        media_type = 'tv' if number % 5 == 0 else 'movie'
+        data = TMDbStubHandler.details(media_type, number)
+        data['media_type'] = media_type
+        data['trailer_link'] = None
+        row = ListingRow(imdb_id=f'tt{number}', title=f'Fixture Title {number}', year=str(2000 + number % 25),
+                         imdb_rating=round(1 + number % 90 / 10, 1), imdb_votes=number % 100000)
+        yield build_movie_item(data, row)
+
+
+def command_catalog(args):
+    from twisted.internet import defer
+
+    from imdbscrapper.catalog import Catalog
+    from imdbscrapper.pipelines import CatalogPipeline
+
+    path = args.path or os.path.join(tempfile.mkdtemp(prefix='bench-catalog-'), 'catalog.sqlite3')
+    results = {'path': path, 'items': args.items, 'batch_size': args.batch_size}
+    # The second pass upserts the same titles again, like a re-crawl.
+    for phase in ('insert', 'update'):
+        pipeline = CatalogPipeline(path, batch_size=args.batch_size, commit_interval=0)
+        # No reactor runs here, so upserts run inline and are timed directly.
+        pipeline.run_in_thread = defer.maybeDeferred
+        pipeline.open_spider(None)
+        busy = 0.0
+        for item in fixture_movie_items(args.items):
+            started = time.perf_counter()
+            pipeline.process_item(item, None)
+            busy += time.perf_counter() - started
+        started = time.perf_counter()
+        pipeline.close_spider(None)
+        busy += time.perf_counter() - started
+        results[f'{phase}_rows_per_second'] = round(args.items / busy, 1)
+        print(f"{phase}: {results[f'{phase}_rows_per_second']} rows/s", flush=True)
+    results['size_mb'] = round(os.path.getsize(path) / 1e6, 1)
+    catalog = Catalog(path)
+    queries = {
+        'top_rated_in_year': 'SELECT imdb_id FROM titles WHERE year = 2010 ORDER BY imdb_rating DESC LIMIT 50',
+        'most_voted': 'SELECT imdb_id FROM titles ORDER BY imdb_votes DESC LIMIT 50',
+        'titles_in_genre': 'SELECT count(*) FROM title_genres JOIN genres ON genres.id = genre_id '
+                           "WHERE genres.name = 'Drama'",
+    }
+    results['query_ms'] = {}
+    for name, sql in queries.items():
+        started = time.perf_counter()
+        catalog.db.execute(sql).fetchall()
+        results['query_ms'][name] = round((time.perf_counter() - started) * 1000, 2)
+    catalog.close()
+    print(json.dumps(results, indent=2))
+
+
+def command_media(args):
+    import asyncio
+
+    from imdbscrapper.media import MediaDownloader, MediaStore, variant_url
+
+    server = FixtureServer(MediaFixtureHandler, image_kb=args.image_kb, duplicate_every=args.duplicate_every,
+                           drop_rate=args.drop_rate, seed=args.seed).start()
+    media_dir = args.media_dir or tempfile.mkdtemp(prefix='bench-media-')
+    urls = [variant_url(f'https://image.tmdb.org/t/p/original/p{number}.jpg', args.size, f'{server.base_url}/t/p')
+            for number in range(args.images)]
+
+    async def download_all():
+        downloader = MediaDownloader(MediaStore(media_dir), max_in_flight=args.max_in_flight,
+                                     max_in_flight_bytes=args.max_in_flight_bytes,
+                                     max_bytes_per_second=args.max_bytes_per_second, stats=stats)
+        try:
+            return await asyncio.gather(*(downloader.download(url) for url in urls))
+        finally:
+            await downloader.close()
+
+    results = {'media_dir': media_dir, 'images': args.images, 'image_kb': args.image_kb}
+    try:
+        # The second pass finds every image in the index and downloads nothing.
+        for phase in ('download', 'rerun'):
+            stats = BenchStats()
+            started = time.perf_counter()
+            paths = asyncio.run(download_all())
+            elapsed = time.perf_counter() - started
+            counters = {key.split('/', 1)[1]: value for key, value in stats.get_stats().items()
+                        if key.startswith('media/') and '/' not in key.split('/', 1)[1]}
+            results[phase] = {
+                'seconds': round(elapsed, 3),
+                'images_per_second': round(len(urls) / elapsed, 1),
+                'mb_per_second': round(counters.get('bytes', 0) / elapsed / 1e6, 2),
+                'missing_paths': paths.count(None),
+                **counters,
+            }
+            print(f"{phase}: {results[phase]['images_per_second']} images/s, {results[phase]['mb_per_second']} MB/s",
+                  flush=True)
+        results['files_on_disk'] = sum(len(files) for root, _, files in os.walk(media_dir)
+                                       if os.path.basename(root) != '.partial' and root != media_dir)
+        results['server'] = dict(server.counts)
+    finally:
+        server.stop()
+    print(json.dumps(results, indent=2))
+
+
+def command_record(args):
+    os.makedirs(args.pages_dir, exist_ok=True)
+    for window in seed_windows(args.start, args.end, args.sparse_before):
+        start = 1
+        while start is not None:
+            path = os.path.join(args.pages_dir, recorded_page_name(window.start, window.end, start))
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    body = f.read()
+            else:
+                url = listing.search_url(window.start, window.end, start=start)
+                request = urllib.request.Request(url, headers={
+                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                                  'Chrome/124.0 Safari/537.36',
+                    'Accept-Language': 'en',
+                })
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    body = response.read()
+                with open(path, 'wb') as f:
+                    f.write(body)
+                print(f"Recorded {window} from {start} ({len(body)} bytes)", flush=True)
+                time.sleep(args.delay)
+            # Only windows the spiders cannot split are listed page by page.
+            rows, total = listing.parse_search_results(Selector(text=body.decode('utf-8', 'replace')))
+            start = listing.next_page_start(start, len(rows), total) if split_window(window) is None else None
+
+
+# Run in a fresh interpreter: times `module` after importing `baseline`.
+IMPORT_PROBE = '''
+import json, sys, time
+if {baseline!r}:
+    __import__({baseline!r})
+started = time.perf_counter()
+__import__({module!r})
+print(json.dumps([time.perf_counter() - started, [name for name in {heavy!r} if name in sys.modules]]))
+'''
+HEAVY_MODULES = ('selenium', 'aiohttp', 'redis', 'requests')
+# Default budgets of `bench imports`, also checked by tests/test_cli.py.
+CLI_BUDGET_MS = 50
+SPIDER_BUDGET_MS = 150
+
+
+def time_import(module, baseline='', repeat=5):
+    timings, heavy = [], []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_PROBE.format(module=module, baseline=baseline, heavy=HEAVY_MODULES)],
+            cwd=PACKAGE_ROOT, check=True, capture_output=True, text=True,
+        ).stdout
+        elapsed, heavy = json.loads(output)
+        timings.append(elapsed)
+    return sorted(timings)[len(timings) // 2], heavy
+
+
+def command_imports(args):
+    # Spiders are timed on top of `import scrapy`, which every crawl pays.
+    budgets = [('imdbscrapper.cli', '', args.cli_budget_ms)]
+    budgets += [(f'imdbscrapper.spiders.{module}', 'scrapy', args.spider_budget_ms)
+                for module in ('advance_scrapper', 'basic_scrapper')]
+    failed = False
+    for module, baseline, budget in budgets:
+        elapsed, heavy = time_import(module, baseline, args.repeat)
+        over = elapsed * 1000 > budget or heavy
+        failed = failed or over
+        loaded = f", loads {', '.join(heavy)}" if heavy else ''
+        print(f"{module}: {elapsed * 1000:.0f}ms (budget {budget}ms{loaded}){' FAIL' if over else ''}")
+    if failed:
+        sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m imdbscrapper.bench')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='crawl fixture servers end to end and write a JSON report')
+    run.add_argument('--spiders', nargs='+', choices=SPIDERS, default=list(SPIDERS))
+    run.add_argument('--listing-mode', choices=('http', 'selenium', 'replay'), default='http')
+    run.add_argument('--start', type=int, default=2020)
+    run.add_argument('--end', type=int, default=2020)
+    run.add_argument('--num-instances', type=instance_counts, default='5',
+                     help='listing workers for advance_scrapper; a comma-separated list such as 1,2,4,8 runs each')
+    run.add_argument('--max-movies', type=int, default=300000)
+    run.add_argument('--density', type=int, default=5, help='synthetic titles per release day')
+    run.add_argument('--show-more-delay', type=float, default=0.2, help='seconds before show-more renders')
+    run.add_argument('--pages-dir', help='recorded search pages to serve instead of synthetic ones')
+    run.add_argument('--tmdb-latency', type=float, default=0.05, help='mean TMDb stub latency in seconds')
+    run.add_argument('--tmdb-429-rate', type=float, default=0.0, help='fraction of TMDb requests answered 429')
+    run.add_argument('--retry-after', type=float, default=1.0, help='Retry-After sent with each 429')
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--repeat', type=int, default=1)
+    run.add_argument('--set', action='append', default=[], metavar='NAME=VALUE', help='extra Scrapy setting')
+    run.add_argument('--report-dir', default='bench-results')
+    run.add_argument('--output', help='report path (default: <report-dir>/bench-<timestamp>.json)')
+    run.set_defaults(func=command_run)
+
+    micro = commands.add_parser('micro', help='time listing parsing and item building in-process')
+    micro.add_argument('--repeat', type=int, default=20)
+    micro.add_argument('--round-trip-ms', type=float, default=0.0,
+                       help='simulated chromedriver round-trip per WebDriver call on the element path')
+    micro.add_argument('--browser', action='store_true', help='also time both extraction paths in Chrome')
+    micro.set_defaults(func=command_micro)
+
+    showmore = commands.add_parser('showmore', help='compare show-more strategies on a fixture page in Chrome')
+    showmore.add_argument('--density', type=int, default=250, help='titles on the fixture page')
+    showmore.add_argument('--show-more-delay', type=float, default=0.2, help='seconds before show-more renders')
+    showmore.add_argument('--repeat', type=int, default=3)
+    showmore.add_argument('--timeout', type=float, default=10, help='DRIVER_SHOW_MORE_TIMEOUT')
+    showmore.add_argument('--click-wait', type=float, default=5.0, help='click loop: seconds to wait for the button')
+    showmore.add_argument('--click-sleep', type=float, default=1.0, help='click loop: seconds slept after each click')
+    showmore.add_argument('--show-browser', action='store_true')
+    showmore.set_defaults(func=command_showmore)
+
+    parse = commands.add_parser('parse', help='compare inline and multiprocess listing parsing')
+    parse.add_argument('--pages', type=int, default=200, help='expanded fixture pages to parse')
+    parse.add_argument('--threads', type=int, default=5, help='threads submitting pages, like browser workers')
+    parse.add_argument('--processes', type=int, nargs='+', help='PARSE_PROCESSES values (default: 0 1 2 4 ... cores)')
+    parse.set_defaults(func=command_parse)
+
+    catalog = commands.add_parser('catalog', help='time bulk upserts into the SQLite catalog')
+    catalog.add_argument('--items', type=int, default=100000)
+    catalog.add_argument('--batch-size', type=int, default=1000, help='CATALOG_BATCH_SIZE')
+    catalog.add_argument('--path', help='catalog file (default: a new temporary file)')
+    catalog.set_defaults(func=command_catalog)
+
+    media = commands.add_parser('media', help='download fixture images through the media pipeline downloader')
+    media.add_argument('--images', type=int, default=2000)
+    media.add_argument('--image-kb', type=int, default=64)
+    media.add_argument('--size', default='w500', help='MEDIA_SIZE')
+    media.add_argument('--duplicate-every', type=int, default=10, help='every Nth image has identical content')
+    media.add_argument('--drop-rate', type=float, default=0.05, help='fraction of responses cut off halfway')
+    media.add_argument('--max-in-flight', type=int, default=16)
+    media.add_argument('--max-in-flight-bytes', type=int, default=32 * 1024 * 1024)
+    media.add_argument('--max-bytes-per-second', type=int, default=0)
+    media.add_argument('--media-dir', help='MEDIA_DIR (default: a new temporary directory)')
+    media.add_argument('--seed', type=int, default=0)
+    media.set_defaults(func=command_media)
+
+    record = commands.add_parser('record', help='save live IMDb search pages for `run --pages-dir`')
+    record.add_argument('--start', type=int, required=True)
+    record.add_argument('--end', type=int)
+    record.add_argument('--sparse-before', type=int, default=SPARSE_BEFORE)
+    record.add_argument('--pages-dir', default='bench-pages')
+    record.add_argument('--delay', type=float, default=2.0, help='seconds between requests')
+    record.set_defaults(func=command_record)
+
+    imports = commands.add_parser('imports', help='check CLI and spider import times against a budget')
+    imports.add_argument('--cli-budget-ms', type=int, default=CLI_BUDGET_MS)
+    imports.add_argument('--spider-budget-ms', type=int, default=SPIDER_BUDGET_MS, help='per spider, on top of `import scrapy`')
+    imports.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module; the median is reported')
+    imports.set_defaults(func=command_imports)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# Persistent SQLite cache for API responses.
+#
+# Entries are keyed by endpoint + id, expire after a per-endpoint TTL and are
+# evicted least-recently-used first once the cache grows past max_entries.
+# set() and the access times recorded by get() are buffered in memory until
+# flush(); the owner calls flush() and evict() from a worker thread on a timer
+# (see TMDbClient), so the SQLite writes stay off the event loop. Buffered
+# entries are served by get() before they reach the database.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DAY = 24 * 60 * 60
+
+
+class ResponseCache:
+    def __init__(self, path, ttls=None, default_ttl=7 * DAY, negative_ttl=DAY, max_entries=500000):
+        self.path = path
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        # lock guards the buffers and is only held briefly, so set() on the
+        # event loop never waits for a write; db_lock serialises the connection.
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+        self.pending = {}
+        self.flushing = {}
+        self.touched = {}
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, body BLOB, stored_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+
+    def ttl(self, endpoint, negative=False):
+        ttl = self.ttls.get(endpoint, self.default_ttl)
+        return min(ttl, self.negative_ttl) if negative else ttl
+
+    def get(self, key, endpoint):
+        # Returns (hit, data); a hit may carry None for a cached "not found".
+        now = time.time()
+        with self.lock:
+            row = self.pending.get(key) or self.flushing.get(key)
+        if row is None:
+            with self.db_lock:
+                row = self.db.execute('SELECT body, stored_at FROM responses WHERE key = ?', (key,)).fetchone()
+        else:
+            row = row[2:4]
+        if row is None:
+            return False, None
+        body, stored_at = row
+        if stored_at + self.ttl(endpoint, negative=body is None) < now:
+            return False, None
+        with self.lock:
+            self.touched[key] = now
+        return True, json.loads(zlib.decompress(body)) if body is not None else None
+
+    def set(self, key, endpoint, data):
+        now = time.time()
+        body = zlib.compress(json.dumps(data, separators=(',', ':')).encode()) if data is not None else None
+        with self.lock:
+            self.pending[key] = (key, endpoint, body, now, now)
+            self.touched.pop(key, None)
+
+    def flush(self):
+        # Writes buffered entries and access times in one transaction.
+        with self.db_lock:
+            with self.lock:
+                self.flushing, self.pending = self.pending, {}
+                touched, self.touched = self.touched, {}
+            if not self.flushing and not touched:
+                return
+            try:
+                with self.db:
+                    self.db.execute('BEGIN')
+                    self.db.executemany(
+                        'INSERT OR REPLACE INTO responses (key, endpoint, body, stored_at, accessed_at) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        self.flushing.values(),
+                    )
+                    self.db.executemany(
+                        'UPDATE responses SET accessed_at = ? WHERE key = ?',
+                        [(accessed_at, key) for key, accessed_at in touched.items()],
+                    )
+            finally:
+                with self.lock:
+                    self.flushing = {}
+
+    def evict(self):
+        with self.db_lock:
+            self._evict()
+
+    def _evict(self):
+        (count,) = self.db.execute('SELECT COUNT(*) FROM responses').fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.db.execute(
+                'DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)',
+                (excess,),
+            )
+
+    def close(self):
+        self.flush()
+        with self.db_lock:
+            self._evict()
+            self.db.close()
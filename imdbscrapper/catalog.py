@@ -0,0 +1,138 @@
+# Embedded SQLite catalog of scraped titles.
+#
+# Each title is one row in `titles`, keyed by its integer-encoded `tt` ID and
+# also indexed by (media_type, tmdb_id), and is upserted so re-crawls and
+# refreshes update it in place. Genres, keywords and people are stored once
+# in lookup tables and linked through title_genres, title_keywords,
+# title_cast and title_crew; the remaining list fields are kept as JSON
+# arrays. Items are written in batches, one transaction per batch.
+
+import json
+import os
+import re
+import sqlite3
+from dataclasses import fields
+
+from imdbscrapper.dedup import encode_imdb_id
+from imdbscrapper.items import MovieItem, field_types
+
+# Stored through lookup tables: (lookup table, link table, link column).
+LINKED_FIELDS = {
+    'genres': ('genres', 'title_genres', 'genre_id'),
+    'keywords': ('keywords', 'title_keywords', 'keyword_id'),
+    'cast': ('people', 'title_cast', 'person_id'),
+    'crew': ('people', 'title_crew', 'person_id'),
+}
+TITLE_FIELDS = [item_field.name for item_field in fields(MovieItem) if item_field.name not in LINKED_FIELDS]
+LIST_FIELDS = {name for name, kind in field_types(MovieItem).items() if kind is list and name not in LINKED_FIELDS}
+COLUMN_TYPES = {str: 'TEXT', int: 'INTEGER', float: 'REAL', bool: 'INTEGER', list: 'TEXT'}
+# Declared INTEGER so years sort and compare as numbers; MovieItem.year is
+# text ("2019", or "2019–2021" for a series) and is stored as its start year.
+COLUMN_OVERRIDES = {'year': 'INTEGER'}
+YEAR_PATTERN = re.compile(r'\d{4}')
+TITLE_INDEXES = {
+    'titles_tmdb': '(media_type, tmdb_id)',
+    'titles_year': '(year)',
+    'titles_rating': '(imdb_rating)',
+    'titles_votes': '(imdb_votes)',
+}
+
+
+def start_year(year):
+    match = YEAR_PATTERN.search(str(year)) if year is not None else None
+    return int(match.group()) if match else None
+
+
+def title_columns():
+    types = field_types(MovieItem)
+    return ', '.join(f'{name} {COLUMN_OVERRIDES.get(name, COLUMN_TYPES[types[name]])}' for name in TITLE_FIELDS)
+
+
+class Catalog:
+    def __init__(self, path, name_cache_size=200000):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.name_cache_size = name_cache_size
+        self.name_ids = {table: {} for table, _, _ in LINKED_FIELDS.values()}
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(f'CREATE TABLE IF NOT EXISTS titles (id INTEGER PRIMARY KEY, {title_columns()})')
+        for index, columns in TITLE_INDEXES.items():
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS {index} ON titles {columns}')
+        for table, link_table, column in LINKED_FIELDS.values():
+            self.db.execute(f'CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+            self.db.execute(
+                f'CREATE TABLE IF NOT EXISTS {link_table} (title_id INTEGER NOT NULL, position INTEGER NOT NULL, '
+                f'{column} INTEGER NOT NULL, PRIMARY KEY (title_id, position)) WITHOUT ROWID'
+            )
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS {link_table}_{column} ON {link_table} ({column})')
+        updates = ', '.join(f'{name} = excluded.{name}' for name in TITLE_FIELDS)
+        self.upsert_sql = (
+            f'INSERT INTO titles (id, {", ".join(TITLE_FIELDS)}) VALUES ({", ".join("?" * (len(TITLE_FIELDS) + 1))}) '
+            f'ON CONFLICT (id) DO UPDATE SET {updates}'
+        )
+
+    def _title_row(self, title_id, item):
+        values = [title_id]
+        for name in TITLE_FIELDS:
+            value = getattr(item, name)
+            if name in LIST_FIELDS:
+                value = json.dumps(value, ensure_ascii=False)
+            elif name == 'year':
+                value = start_year(value)
+            values.append(value)
+        return values
+
+    def _name_ids(self, table, names):
+        # Maps names to lookup-table IDs, inserting the ones not seen yet. The
+        # in-memory map is dropped once it holds name_cache_size entries.
+        known = self.name_ids[table]
+        missing = [name for name in set(names) if name not in known]
+        if len(known) + len(missing) > self.name_cache_size:
+            known.clear()
+            missing = list(set(names))
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            self.db.executemany(f'INSERT INTO {table} (name) VALUES (?) ON CONFLICT (name) DO NOTHING',
+                                [(name,) for name in chunk])
+            known.update(self.db.execute(
+                f'SELECT name, id FROM {table} WHERE name IN ({",".join("?" * len(chunk))})', chunk
+            ))
+        return known
+
+    def upsert(self, items):
+        # Writes a batch of MovieItems in one transaction and returns how many
+        # were stored; items without a valid IMDb ID are skipped.
+        titles = []
+        for item in items:
+            title_id = encode_imdb_id(item.imdb_id)
+            if title_id is not None:
+                titles.append((title_id, item))
+        if not titles:
+            return 0
+        self.db.execute('BEGIN')
+        try:
+            self.db.executemany(self.upsert_sql, [self._title_row(title_id, item) for title_id, item in titles])
+            title_ids = [(title_id,) for title_id, _ in titles]
+            for name, (table, link_table, column) in LINKED_FIELDS.items():
+                self.db.executemany(f'DELETE FROM {link_table} WHERE title_id = ?', title_ids)
+                ids = self._name_ids(table, [value for _, item in titles for value in getattr(item, name) or ()])
+                links = [
+                    (title_id, position, ids[value])
+                    for title_id, item in titles
+                    for position, value in enumerate(getattr(item, name) or ())
+                ]
+                self.db.executemany(f'INSERT OR REPLACE INTO {link_table} VALUES (?, ?, ?)', links)
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            for known in self.name_ids.values():
+                known.clear()
+            raise
+        return len(titles)
+
+    def close(self):
+        self.db.execute('PRAGMA optimize')
+        self.db.close()
@@ -0,0 +1,171 @@
+# Command-line entry point, installed as `imdbscrapper` (or run with
+# `python -m imdbscrapper`):
+#
+#   imdbscrapper crawl advance_scrapper --start 2020 --end 2023
+#   imdbscrapper resume --jobdir crawls/full-run
+#   imdbscrapper refresh --jobdir crawls/full-run
+#   imdbscrapper bench run --spiders advance_scrapper
+#
+# Only argparse is loaded up front. Scrapy, the spiders and the benchmark
+# harness are imported by the subcommand that runs them, so `--help` and
+# argument errors return at once. The TMDb API key comes from
+# --tmdb-api-key, the TMDB_API_KEY setting or the TMDB_API_KEY environment
+# variable, in that order.
+
+import argparse
+import json
+import os
+import sys
+
+SPIDERS = ('advance_scrapper', 'basic_scrapper')
+# basic_scrapper has no recorded pages to replay.
+LISTING_MODES = {'advance_scrapper': ('selenium', 'http', 'replay'), 'basic_scrapper': ('selenium', 'http')}
+SETTINGS_MODULE = 'imdbscrapper.settings'
+# Written to the JOBDIR of `crawl --jobdir` so `resume` repeats the same crawl.
+ARGUMENTS_FILENAME = 'cli_arguments.json'
+
+
+def setting(assignment):
+    name, separator, value = assignment.partition('=')
+    if not separator or not name:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {assignment!r}")
+    return name, value
+
+
+def project_settings(args):
+    os.environ.setdefault('SCRAPY_SETTINGS_MODULE', SETTINGS_MODULE)
+    from scrapy.utils.project import get_project_settings
+
+    settings = get_project_settings()
+    for name, value in args.set:
+        settings.set(name, value, priority='cmdline')
+    if getattr(args, 'jobdir', None):
+        settings.set('JOBDIR', args.jobdir, priority='cmdline')
+    if args.log_level:
+        settings.set('LOG_LEVEL', args.log_level, priority='cmdline')
+    return settings
+
+
+def crawl(args, spider, **spider_args):
+    settings = project_settings(args)
+    from imdbscrapper.tmdb import resolve_api_key
+
+    try:
+        api_key = resolve_api_key(settings, args.tmdb_api_key)
+    except ValueError as e:
+        sys.exit(f"imdbscrapper: {e}")
+    from scrapy.crawler import CrawlerProcess
+
+    process = CrawlerProcess(settings)
+    process.crawl(spider, tmdb_api_key=api_key,
+                  **{name: value for name, value in spider_args.items() if value is not None})
+    process.start()
+    return 1 if process.bootstrap_failed else 0
+
+
+def advance_arguments(args):
+    return {
+        'start': args.start,
+        'end': args.end,
+        'num_instances': args.num_instances,
+        'listing_mode': args.listing_mode,
+        'extraction_mode': args.extraction_mode,
+    }
+
+
+def check_listing_mode(spider, listing_mode):
+    if listing_mode is not None and listing_mode not in LISTING_MODES[spider]:
+        sys.exit(f"imdbscrapper: {spider} does not support --listing-mode {listing_mode}; "
+                 f"choose from {', '.join(LISTING_MODES[spider])}")
+
+
+def command_crawl(args):
+    check_listing_mode(args.spider, args.listing_mode)
+    if args.spider == 'basic_scrapper':
+        return crawl(args, args.spider, max_movies=args.max_movies, listing_mode=args.listing_mode,
+                     extraction_mode=args.extraction_mode)
+    spider_args = advance_arguments(args)
+    if args.jobdir:
+        os.makedirs(args.jobdir, exist_ok=True)
+        with open(os.path.join(args.jobdir, ARGUMENTS_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump({name: value for name, value in spider_args.items() if value is not None}, f)
+    return crawl(args, args.spider, **spider_args)
+
+
+def command_resume(args):
+    # Arguments given now override the ones the crawl was started with.
+    path = os.path.join(args.jobdir, ARGUMENTS_FILENAME)
+    if not os.path.exists(path):
+        sys.exit(f"imdbscrapper: {path} not found; start the crawl with `imdbscrapper crawl --jobdir`")
+    with open(path, encoding='utf-8') as f:
+        spider_args = json.load(f)
+    spider_args.update({name: value for name, value in advance_arguments(args).items() if value is not None})
+    return crawl(args, 'advance_scrapper', **spider_args)
+
+
+def command_refresh(args):
+    return crawl(args, 'advance_scrapper', mode='refresh', listing_mode=args.listing_mode,
+                 num_instances=args.num_instances)
+
+
+def command_bench(args):
+    from imdbscrapper import bench
+
+    bench.main(args.bench_args)
+    return 0
+
+
+def add_crawl_options(parser, advance=True, years=True, basic=False):
+    parser.add_argument('--tmdb-api-key', help='TMDb API key (default: TMDB_API_KEY setting or environment)')
+    parser.add_argument('-s', '--set', action='append', type=setting, default=[], metavar='NAME=VALUE',
+                        help='override a Scrapy setting')
+    parser.add_argument('-L', '--log-level', help='Scrapy LOG_LEVEL')
+    parser.add_argument('--listing-mode', choices=LISTING_MODES['advance_scrapper'],
+                        help='replay is advance_scrapper only' if basic else None)
+    if advance:
+        parser.add_argument('--num-instances', type=int, help='browser or replay workers')
+    if advance and years:
+        parser.add_argument('--start', type=int, help='first release year')
+        parser.add_argument('--end', type=int, help='last release year')
+        parser.add_argument('--extraction-mode', choices=('batch', 'element'))
+    if basic:
+        parser.add_argument('--max-movies', type=int, help='basic_scrapper: stop after this many titles')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='imdbscrapper', description='Scrape IMDb listings enriched with TMDb data.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = commands.add_parser('crawl', help='run a spider')
+    crawl_parser.add_argument('spider', choices=SPIDERS)
+    add_crawl_options(crawl_parser, basic=True)
+    crawl_parser.add_argument('--jobdir', help='keep crawl state here so the crawl can be resumed')
+    crawl_parser.set_defaults(func=command_crawl)
+
+    resume = commands.add_parser('resume', help='continue an advance_scrapper crawl from its JOBDIR')
+    resume.add_argument('--jobdir', required=True)
+    add_crawl_options(resume)
+    resume.set_defaults(func=command_resume)
+
+    refresh = commands.add_parser('refresh', help='re-enrich titles TMDb reports as changed since the last run')
+    refresh.add_argument('--jobdir', required=True)
+    add_crawl_options(refresh, years=False)
+    refresh.set_defaults(func=command_refresh)
+
+    bench = commands.add_parser('bench', help='offline benchmarks (see imdbscrapper/bench.py)', add_help=False)
+    bench.add_argument('bench_args', nargs=argparse.REMAINDER)
+    bench.set_defaults(func=command_bench)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    # Everything after `bench`, --help included, belongs to the bench parser.
+    if argv[:1] == ['bench']:
+        sys.exit(command_bench(argparse.Namespace(bench_args=argv[1:])))
+    args = build_parser().parse_args(argv)
+    sys.exit(args.func(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,527 @@
+# Shared partition queue and IMDb ID claims for crawls split across several
+# spider processes, possibly on different machines.
+#
+# Every node registers under DISTRIBUTED_NODE_ID and renews a lease of
+# DISTRIBUTED_LEASE_SECONDS from a heartbeat thread. A node claims release-date
+# partitions one at a time and keeps them until every title listed for them
+# is done. Partitions and unscraped title claims held by a node whose lease
+# has expired are handed to the next node that asks, so a crashed machine
+# only delays its work. Titles are claimed before enrichment, so no two
+# nodes enrich the same title. Claims are made a batch at a time; scraped and
+# released titles are written back after each export batch, with each
+# partition commit, or once TITLE_FLUSH_EVERY of them are waiting.
+#
+# DISTRIBUTED_BACKEND selects the store: `redis://host:port/db` for a
+# Redis-compatible server (needs the `redis` package, imported only for this
+# backend), or
+# `sqlite:///path/to/shared.sqlite3` for nodes sharing one file on a single
+# machine or a network filesystem with working locks.
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from imdbscrapper.dedup import encode_imdb_id
+from imdbscrapper.partitions import Window
+
+logger = logging.getLogger(__name__)
+
+TITLE_FLUSH_EVERY = 1000
+
+_coordinators = {}
+_coordinators_lock = threading.Lock()
+
+
+def default_node_id():
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def coordinator_from_crawler(crawler):
+    # The spider and the dedup middleware share one coordinator per backend
+    # and node; returns None when DISTRIBUTED_BACKEND is unset.
+    settings = crawler.settings
+    url = settings.get('DISTRIBUTED_BACKEND')
+    if not url:
+        return None
+    node_id = settings.get('DISTRIBUTED_NODE_ID') or default_node_id()
+    with _coordinators_lock:
+        coordinator = _coordinators.get((url, node_id))
+        if coordinator is None or coordinator.closed:
+            if url.startswith('sqlite://'):
+                cls = SQLiteCoordinator
+            elif url.startswith(('redis://', 'rediss://', 'unix://')):
+                cls = RedisCoordinator
+            else:
+                raise ValueError(f"Unsupported DISTRIBUTED_BACKEND {url!r}")
+            coordinator = cls(
+                url,
+                node_id=node_id,
+                lease_seconds=settings.getfloat('DISTRIBUTED_LEASE_SECONDS', 120),
+                poll_interval=settings.getfloat('DISTRIBUTED_POLL_INTERVAL', 5),
+                namespace=settings.get('DISTRIBUTED_NAMESPACE', 'imdbscrapper'),
+            )
+            _coordinators[(url, node_id)] = coordinator
+        return coordinator
+
+
+class Coordinator:
+    # Partition methods take and return Windows; the title methods mirror
+    # DedupIndex (claim_many, claim, record_many, record, release, flush,
+    # checkpoint, stored, close) so DedupMiddleware and the export pipeline
+    # can use either. Each node writes its own export, so no export
+    # checkpoints are kept.
+
+    def __init__(self, node_id, lease_seconds=120, poll_interval=5):
+        self.node_id = node_id
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        # Titles this node claimed that are not scraped or released yet.
+        self.claimed = set()
+        # Scraped and released titles not written to the backend yet.
+        self.unrecorded = []
+        self.unreleased = []
+        self.closed = False
+        self.stopping = threading.Event()
+        self.heartbeat()
+        self.heartbeat_thread = threading.Thread(target=self._beat, name='coordinator-heartbeat', daemon=True)
+        self.heartbeat_thread.start()
+
+    def _beat(self):
+        while not self.stopping.wait(self.lease_seconds / 3):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logger.error(f"Coordinator heartbeat for {self.node_id} failed: {e}")
+
+    def claim_many(self, imdb_ids):
+        # One backend round trip for the whole batch; returns, in order,
+        # whether each ID is new and now belongs to this node. Pending
+        # releases are written first, so a released title can be claimed again.
+        values = [encode_imdb_id(imdb_id) for imdb_id in imdb_ids]
+        with self.lock:
+            released, self.unreleased = self.unreleased, []
+        claimed = self._claim_titles(list(dict.fromkeys(value for value in values if value is not None)), released)
+        with self.lock:
+            self.claimed.update(claimed)
+        results = []
+        for value in values:
+            results.append(value is None or value in claimed)
+            claimed.discard(value)
+        return results
+
+    def claim(self, imdb_id):
+        return self.claim_many([imdb_id])[0]
+
+    def record(self, imdb_id):
+        self.record_many([imdb_id])
+
+    def record_many(self, imdb_ids):
+        values = [value for value in map(encode_imdb_id, imdb_ids) if value is not None]
+        with self.lock:
+            self.claimed.difference_update(values)
+            self.unrecorded.extend(values)
+            full = len(self.unrecorded) >= TITLE_FLUSH_EVERY
+        if full:
+            self.flush()
+
+    def release(self, imdb_id):
+        value = encode_imdb_id(imdb_id)
+        if value is None:
+            return
+        with self.lock:
+            self.claimed.discard(value)
+            self.unreleased.append(value)
+
+    def _take_titles(self):
+        with self.lock:
+            recorded, self.unrecorded = self.unrecorded, []
+            released, self.unreleased = self.unreleased, []
+        return recorded, released
+
+    def flush(self, checkpoint=None):
+        recorded, released = self._take_titles()
+        if recorded or released:
+            self._write_titles(recorded, released)
+
+    def checkpoint(self, name):
+        return None
+
+    def complete_partition(self, key):
+        # Titles scraped so far are recorded in the same write that marks the
+        # partition done.
+        self._write_titles(*self._take_titles(), done=key)
+
+    def close(self):
+        # Hands unfinished partitions and title claims back right away
+        # instead of waiting for this node's lease to run out.
+        if self.closed:
+            return
+        self.closed = True
+        self.stopping.set()
+        self.heartbeat_thread.join()
+        self.flush()
+        with self.lock:
+            claimed, self.claimed = list(self.claimed), set()
+        if claimed:
+            self._write_titles([], claimed)
+        released = self._release_partitions()
+        if released:
+            logger.info(f"Returned {released} unfinished partitions to the shared queue")
+        self._disconnect()
+
+
+class SQLiteCoordinator(Coordinator):
+    def __init__(self, url, node_id, lease_seconds=120, poll_interval=5, namespace=None):
+        # sqlite:///relative/path or sqlite:////absolute/path
+        path = url.split('://', 1)[1]
+        path = path[1:] if path.startswith('/') else path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS nodes (node_id TEXT PRIMARY KEY, lease_until REAL NOT NULL)')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS partitions (key TEXT PRIMARY KEY, status TEXT NOT NULL, node_id TEXT)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS partitions_status ON partitions (status, node_id)')
+        # node_id is NULL once the title has been scraped.
+        self.db.execute('CREATE TABLE IF NOT EXISTS titles (id INTEGER PRIMARY KEY, node_id TEXT) WITHOUT ROWID')
+        self.db_lock = threading.Lock()
+        super().__init__(node_id, lease_seconds, poll_interval)
+
+    def _transaction(self, func, *args):
+        # BEGIN IMMEDIATE takes the write lock up front, so two nodes never
+        # read the same pending partition and both claim it.
+        with self.db_lock:
+            self.db.execute('BEGIN IMMEDIATE')
+            try:
+                result = func(*args)
+            except BaseException:
+                self.db.execute('ROLLBACK')
+                raise
+            self.db.execute('COMMIT')
+            return result
+
+    def _node_alive(self, node_id):
+        row = self.db.execute('SELECT lease_until FROM nodes WHERE node_id = ?', (node_id,)).fetchone()
+        return row is not None and row[0] >= time.time()
+
+    def heartbeat(self):
+        with self.db_lock:
+            self.db.execute('INSERT OR REPLACE INTO nodes (node_id, lease_until) VALUES (?, ?)',
+                            (self.node_id, time.time() + self.lease_seconds))
+
+    def seed(self, windows):
+        def seed():
+            self.db.executemany("INSERT OR IGNORE INTO partitions (key, status) VALUES (?, 'pending')",
+                                ((window.key,) for window in windows))
+            self.db.execute("UPDATE partitions SET status = 'pending' WHERE status = 'failed'")
+        self._transaction(seed)
+
+    def claim_partition(self):
+        def claim():
+            row = self.db.execute(
+                "SELECT key, node_id FROM partitions WHERE status = 'pending' OR (status = 'leased' "
+                'AND node_id NOT IN (SELECT node_id FROM nodes WHERE lease_until >= ?)) ORDER BY key LIMIT 1',
+                (time.time(),),
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE partitions SET status = 'leased', node_id = ? WHERE key = ?", (self.node_id, row[0]))
+            return row
+        row = self._transaction(claim)
+        if row is None:
+            return None
+        key, previous_owner = row
+        if previous_owner:
+            logger.info(f"Took over partition {key} from expired node {previous_owner}")
+        return Window.from_key(key)
+
+    def split(self, window, halves):
+        # Marks a dense partition done and leases its halves to this node;
+        # returns the halves it now holds.
+        def split():
+            self.db.execute("UPDATE partitions SET status = 'done', node_id = NULL WHERE key = ?", (window.key,))
+            mine = []
+            for half in halves:
+                row = self.db.execute('SELECT status FROM partitions WHERE key = ?', (half.key,)).fetchone()
+                if row is None or row[0] == 'pending':
+                    self.db.execute("INSERT OR REPLACE INTO partitions (key, status, node_id) VALUES (?, 'leased', ?)",
+                                    (half.key, self.node_id))
+                    mine.append(half)
+            return mine
+        return self._transaction(split)
+
+    def fail_partition(self, key):
+        with self.db_lock:
+            self.db.execute("UPDATE partitions SET status = 'failed', node_id = NULL WHERE key = ? AND node_id = ?",
+                            (key, self.node_id))
+
+    def drained(self):
+        with self.db_lock:
+            row = self.db.execute(
+                "SELECT 1 FROM partitions WHERE status IN ('pending', 'leased') LIMIT 1"
+            ).fetchone()
+        return row is None
+
+    def _release_partitions(self):
+        with self.db_lock:
+            return self.db.execute(
+                "UPDATE partitions SET status = 'pending', node_id = NULL WHERE status = 'leased' AND node_id = ?",
+                (self.node_id,),
+            ).rowcount
+
+    def _delete_released(self, values):
+        self.db.executemany('DELETE FROM titles WHERE id = ? AND node_id = ?',
+                            ((value, self.node_id) for value in values))
+
+    def _claim_titles(self, values, released):
+        def claim():
+            self._delete_released(released)
+            owners = {}
+            for start in range(0, len(values), 500):
+                chunk = values[start:start + 500]
+                owners.update(self.db.execute(
+                    f'SELECT id, node_id FROM titles WHERE id IN ({", ".join("?" * len(chunk))})', chunk
+                ))
+            alive, new, taken = {}, [], []
+            for value in values:
+                if value not in owners:
+                    new.append(value)
+                    continue
+                owner = owners[value]
+                if owner is None or owner == self.node_id:
+                    continue
+                if owner not in alive:
+                    alive[owner] = self._node_alive(owner)
+                if not alive[owner]:
+                    taken.append(value)
+            self.db.executemany('INSERT INTO titles (id, node_id) VALUES (?, ?)',
+                                ((value, self.node_id) for value in new))
+            self.db.executemany('UPDATE titles SET node_id = ? WHERE id = ?',
+                                ((self.node_id, value) for value in taken))
+            return {*new, *taken}
+        return self._transaction(claim)
+
+    def _write_titles(self, recorded, released, done=None):
+        def write():
+            self.db.executemany('UPDATE titles SET node_id = NULL WHERE id = ?', ((value,) for value in recorded))
+            self._delete_released(released)
+            if done is not None:
+                self.db.execute("UPDATE partitions SET status = 'done', node_id = NULL WHERE key = ?", (done,))
+        self._transaction(write)
+
+    @property
+    def stored(self):
+        with self.db_lock:
+            return self.db.execute('SELECT COUNT(*) FROM titles WHERE node_id IS NULL').fetchone()[0]
+
+    def _disconnect(self):
+        with self.db_lock:
+            self.db.execute('DELETE FROM nodes WHERE node_id = ?', (self.node_id,))
+            self.db.close()
+
+
+# Redis layout, under DISTRIBUTED_NAMESPACE:
+#   <ns>:node:<node_id>  key that expires with the node's lease
+#   <ns>:status          hash partition key -> pending | leased | done | failed
+#   <ns>:pending         list of claimable partition keys
+#   <ns>:leased          hash partition key -> owning node
+#   <ns>:titles          hash tt number -> claiming node, or '' once scraped
+# The scripts touch keys derived from the namespace, so the namespace must
+# live on a single (non-cluster) Redis instance.
+
+SEED_SCRIPT = '''
+local ns = ARGV[1]
+for i = 2, #ARGV do
+  local key = ARGV[i]
+  if redis.call('HSETNX', ns .. ':status', key, 'pending') == 1 then
+    redis.call('RPUSH', ns .. ':pending', key)
+  elseif redis.call('HGET', ns .. ':status', key) == 'failed' then
+    redis.call('HSET', ns .. ':status', key, 'pending')
+    redis.call('RPUSH', ns .. ':pending', key)
+  end
+end
+'''
+
+CLAIM_PARTITION_SCRIPT = '''
+local ns, node = ARGV[1], ARGV[2]
+local key = redis.call('LPOP', ns .. ':pending')
+if key then
+  redis.call('HSET', ns .. ':status', key, 'leased')
+  redis.call('HSET', ns .. ':leased', key, node)
+  return {key, ''}
+end
+local leased = redis.call('HGETALL', ns .. ':leased')
+for i = 1, #leased, 2 do
+  local owner = leased[i + 1]
+  if owner ~= node and redis.call('EXISTS', ns .. ':node:' .. owner) == 0 then
+    redis.call('HSET', ns .. ':leased', leased[i], node)
+    return {leased[i], owner}
+  end
+end
+return false
+'''
+
+SPLIT_SCRIPT = '''
+local ns, node, parent = ARGV[1], ARGV[2], ARGV[3]
+redis.call('HDEL', ns .. ':leased', parent)
+redis.call('HSET', ns .. ':status', parent, 'done')
+local mine = {}
+for i = 4, #ARGV do
+  local half = ARGV[i]
+  local status = redis.call('HGET', ns .. ':status', half)
+  if not status or status == 'pending' then
+    if status then
+      redis.call('LREM', ns .. ':pending', 0, half)
+    end
+    redis.call('HSET', ns .. ':status', half, 'leased')
+    redis.call('HSET', ns .. ':leased', half, node)
+    table.insert(mine, half)
+  end
+end
+return mine
+'''
+
+FINISH_PARTITION_SCRIPT = '''
+local ns, node, key, status = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+if status == 'done' or redis.call('HGET', ns .. ':leased', key) == node then
+  redis.call('HDEL', ns .. ':leased', key)
+  redis.call('HSET', ns .. ':status', key, status)
+end
+'''
+
+RELEASE_PARTITIONS_SCRIPT = '''
+local ns, node = ARGV[1], ARGV[2]
+local leased = redis.call('HGETALL', ns .. ':leased')
+local released = 0
+for i = 1, #leased, 2 do
+  if leased[i + 1] == node then
+    redis.call('HDEL', ns .. ':leased', leased[i])
+    redis.call('HSET', ns .. ':status', leased[i], 'pending')
+    redis.call('LPUSH', ns .. ':pending', leased[i])
+    released = released + 1
+  end
+end
+return released
+'''
+
+CLAIM_TITLES_SCRIPT = '''
+local ns, node = ARGV[1], ARGV[2]
+local claimed = {}
+for i = 3, #ARGV do
+  local owner = redis.call('HGET', ns .. ':titles', ARGV[i])
+  if owner and (owner == '' or owner == node or redis.call('EXISTS', ns .. ':node:' .. owner) == 1) then
+    claimed[i - 2] = 0
+  else
+    redis.call('HSET', ns .. ':titles', ARGV[i], node)
+    claimed[i - 2] = 1
+  end
+end
+return claimed
+'''
+
+RELEASE_TITLES_SCRIPT = '''
+local ns, node = ARGV[1], ARGV[2]
+for i = 3, #ARGV do
+  if redis.call('HGET', ns .. ':titles', ARGV[i]) == node then
+    redis.call('HDEL', ns .. ':titles', ARGV[i])
+  end
+end
+'''
+
+
+class RedisCoordinator(Coordinator):
+    def __init__(self, url, node_id, lease_seconds=120, poll_interval=5, namespace='imdbscrapper'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(f"DISTRIBUTED_BACKEND {url!r} needs the redis package (pip install redis)") from None
+        self.namespace = namespace
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.scripts = {
+            name: self.client.register_script(script)
+            for name, script in [
+                ('seed', SEED_SCRIPT), ('claim_partition', CLAIM_PARTITION_SCRIPT), ('split', SPLIT_SCRIPT),
+                ('finish_partition', FINISH_PARTITION_SCRIPT), ('release_partitions', RELEASE_PARTITIONS_SCRIPT),
+                ('claim_titles', CLAIM_TITLES_SCRIPT), ('release_titles', RELEASE_TITLES_SCRIPT),
+            ]
+        }
+        super().__init__(node_id, lease_seconds, poll_interval)
+
+    def _run(self, name, *args, client=None):
+        return self.scripts[name](args=[self.namespace, *args], client=client)
+
+    def heartbeat(self):
+        self.client.set(f'{self.namespace}:node:{self.node_id}', 1, px=int(self.lease_seconds * 1000))
+
+    def seed(self, windows):
+        keys = [window.key for window in windows]
+        for start in range(0, len(keys), 1000):
+            self._run('seed', *keys[start:start + 1000])
+
+    def claim_partition(self):
+        result = self._run('claim_partition', self.node_id)
+        if not result:
+            return None
+        key, previous_owner = result
+        if previous_owner:
+            logger.info(f"Took over partition {key} from expired node {previous_owner}")
+        return Window.from_key(key)
+
+    def split(self, window, halves):
+        mine = set(self._run('split', self.node_id, window.key, *(half.key for half in halves)))
+        return [half for half in halves if half.key in mine]
+
+    def fail_partition(self, key):
+        self._run('finish_partition', self.node_id, key, 'failed')
+
+    def drained(self):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.llen(f'{self.namespace}:pending')
+        pipe.hlen(f'{self.namespace}:leased')
+        pending, leased = pipe.execute()
+        return not pending and not leased
+
+    def _release_partitions(self):
+        return self._run('release_partitions', self.node_id)
+
+    def _release_titles(self, values, pipe):
+        for start in range(0, len(values), 1000):
+            self._run('release_titles', self.node_id, *values[start:start + 1000], client=pipe)
+
+    def _claim_titles(self, values, released):
+        pipe = self.client.pipeline(transaction=False)
+        self._release_titles(released, pipe)
+        chunks = [values[start:start + 1000] for start in range(0, len(values), 1000)]
+        for chunk in chunks:
+            self._run('claim_titles', self.node_id, *chunk, client=pipe)
+        results = pipe.execute()
+        claimed = set()
+        for chunk, flags in zip(chunks, results[len(results) - len(chunks):]):
+            claimed.update(value for value, flag in zip(chunk, flags) if flag)
+        return claimed
+
+    def _write_titles(self, recorded, released, done=None):
+        # One MULTI/EXEC, so a partition is never marked done without its titles.
+        pipe = self.client.pipeline(transaction=True)
+        if recorded:
+            pipe.hset(f'{self.namespace}:titles', mapping=dict.fromkeys(recorded, ''))
+        self._release_titles(released, pipe)
+        if done is not None:
+            self._run('finish_partition', self.node_id, done, 'done', client=pipe)
+        pipe.execute()
+
+    @property
+    def stored(self):
+        # Counts claimed as well as scraped titles.
+        return self.client.hlen(f'{self.namespace}:titles')
+
+    def _disconnect(self):
+        self.client.delete(f'{self.namespace}:node:{self.node_id}')
+        self.client.close()
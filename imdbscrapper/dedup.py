@@ -0,0 +1,178 @@
+# Memory-bounded, persistent index of IMDb IDs already handed to enrichment.
+#
+# `tt` IDs are stored as integers. A Bloom filter answers most lookups from
+# memory; only its positives are confirmed against the IDs claimed in this run
+# and an exact SQLite table, so a false positive never drops a new title.
+# IDs are written to SQLite by the export pipeline right after each batch is
+# exported, before the partitions it completes are committed, so a title
+# claimed by a crawl that dies before exporting it is enriched again on
+# resume. The same write stores the export's size as a checkpoint; rows past
+# it were never recorded and are cut off when the crawl resumes.
+#
+# Without DEDUP_PATH or JOBDIR the exact table lives in memory for the run
+# and takes about 10 MB per million IDs recorded.
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import weakref
+
+DEDUP_FILENAME = 'seen_ids.sqlite3'
+
+# Sent with the ListingRow when DedupMiddleware drops a duplicate.
+item_duplicate = object()
+
+_indexes = weakref.WeakKeyDictionary()
+
+
+def dedup_index(crawler):
+    # The index DedupMiddleware claims IDs in and the export pipeline records
+    # them in: the shared coordinator in a distributed crawl, otherwise one
+    # DedupIndex per crawler.
+    from imdbscrapper.coordination import coordinator_from_crawler
+
+    coordinator = coordinator_from_crawler(crawler)
+    if coordinator is not None:
+        return coordinator
+    if crawler not in _indexes:
+        _indexes[crawler] = DedupIndex.from_crawler(crawler)
+    return _indexes[crawler]
+
+
+def encode_imdb_id(imdb_id):
+    if not imdb_id or not imdb_id.startswith('tt') or not imdb_id[2:].isdigit():
+        return None
+    return int(imdb_id[2:])
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.to_bytes(8, 'little'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class DedupIndex:
+    def __init__(self, path=None, capacity=10000000, error_rate=0.001, flush_every=1000):
+        self.path = path or ':memory:'
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.claimed = set()
+        self.unwritten = []
+        self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS seen (id INTEGER PRIMARY KEY) WITHOUT ROWID')
+        self.db.execute('CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self.stored = 0
+        for (value,) in self.db.execute('SELECT id FROM seen'):
+            self.bloom.add(value)
+            self.stored += 1
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = settings.get('DEDUP_PATH')
+        if not path and settings.get('JOBDIR'):
+            path = os.path.join(settings.get('JOBDIR'), DEDUP_FILENAME)
+        return cls(
+            path,
+            capacity=settings.getint('DEDUP_CAPACITY', 10000000),
+            error_rate=settings.getfloat('DEDUP_ERROR_RATE', 0.001),
+        )
+
+    def _stored_among(self, values):
+        stored = set()
+        for start in range(0, len(values), 500):
+            chunk = values[start:start + 500]
+            stored.update(value for (value,) in self.db.execute(
+                f'SELECT id FROM seen WHERE id IN ({", ".join("?" * len(chunk))})', chunk
+            ))
+        return stored
+
+    def claim_many(self, imdb_ids):
+        # Returns, in order, whether each ID is new and now belongs to the
+        # caller. Bloom positives are confirmed with one query per batch.
+        values = [encode_imdb_id(imdb_id) for imdb_id in imdb_ids]
+        with self.lock:
+            stored = self._stored_among([
+                value for value in set(values)
+                if value is not None and value not in self.claimed and value in self.bloom
+            ])
+            results = []
+            for value in values:
+                if value is None:
+                    results.append(True)
+                elif value in self.claimed or value in stored:
+                    results.append(False)
+                else:
+                    self.bloom.add(value)
+                    self.claimed.add(value)
+                    results.append(True)
+            return results
+
+    def claim(self, imdb_id):
+        return self.claim_many([imdb_id])[0]
+
+    def record(self, imdb_id):
+        self.record_many([imdb_id])
+
+    def record_many(self, imdb_ids):
+        values = [value for value in map(encode_imdb_id, imdb_ids) if value is not None]
+        with self.lock:
+            self.unwritten.extend(values)
+            if len(self.unwritten) >= self.flush_every:
+                self._flush()
+
+    def release(self, imdb_id):
+        # Gives an ID back after its item was dropped, so it can be retried.
+        value = encode_imdb_id(imdb_id)
+        with self.lock:
+            self.claimed.discard(value)
+
+    def flush(self, checkpoint=None):
+        # Writes recorded IDs, and the (name, value) checkpoint if given, in
+        # one transaction.
+        with self.lock:
+            self._flush(checkpoint)
+
+    def checkpoint(self, name):
+        with self.lock:
+            row = self.db.execute('SELECT value FROM checkpoints WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def _flush(self, checkpoint=None):
+        if not self.unwritten and checkpoint is None:
+            return
+        changes = self.db.total_changes
+        self.db.execute('BEGIN')
+        self.db.executemany('INSERT OR IGNORE INTO seen (id) VALUES (?)', ((value,) for value in self.unwritten))
+        stored = self.db.total_changes - changes
+        if checkpoint is not None:
+            self.db.execute('INSERT OR REPLACE INTO checkpoints (name, value) VALUES (?, ?)', checkpoint)
+        self.db.execute('COMMIT')
+        self.stored += stored
+        self.claimed.difference_update(self.unwritten)
+        self.unwritten = []
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.db.close()
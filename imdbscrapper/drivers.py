@@ -0,0 +1,276 @@
+# Pool of reusable Chrome WebDrivers for listing workers.
+#
+# Drivers launch headless with the `eager` page-load strategy, and CDP blocks
+# images, fonts, stylesheets and ad/analytics hosts, none of which the
+# listing parsers read. Each driver is recycled after DRIVER_MAX_PAGES pages
+# to cap Chrome's memory growth and restarted when it stops responding, so a
+# crashed browser costs one page load instead of a whole worker.
+#
+# Show-more clicks return as soon as the page reacts instead of sleeping a
+# fixed interval. Page loads and clicks are timed into the driver/page_load
+# and listing/show_more latency histograms.
+
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+from imdbscrapper.listing import ITEM_SELECTOR, SHOW_MORE_SELECTOR
+from imdbscrapper.metrics import observe
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+BLOCKED_URLS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+    '*.woff', '*.woff2', '*.ttf', '*.otf', '*.css',
+    '*doubleclick.net*', '*googlesyndication.com*', '*google-analytics.com*', '*googletagmanager.com*',
+    '*amazon-adsystem.com*', '*scorecardresearch.com*', '*facebook.net*', '*adsrvr.org*',
+]
+
+# Upper bound for execute_async_script; the show-more script enforces its own,
+# shorter timeout.
+SCRIPT_TIMEOUT = 60
+
+ShowMoreResult = namedtuple('ShowMoreResult', 'clicked before after seconds')
+
+# Clicks the show-more button and resolves as soon as a MutationObserver sees
+# the item count grow or the button disappear, or after timeout_ms. With an
+# expected total, a button that has not rendered yet is waited for as well.
+SHOW_MORE_SCRIPT = '''
+const [buttonSelector, itemSelector, expected, timeoutMs, done] = arguments;
+const count = () => document.querySelectorAll(itemSelector).length;
+const before = count();
+let clicked = false, finished = false, scheduled = false, observer = null, timer = null;
+const finish = () => {
+  if (finished) return;
+  finished = true;
+  if (observer) observer.disconnect();
+  clearTimeout(timer);
+  done({clicked: clicked, before: before, after: count()});
+};
+const step = () => {
+  scheduled = false;
+  if (finished) return;
+  const button = document.querySelector(buttonSelector);
+  if (!clicked) {
+    if (button) {
+      clicked = true;
+      button.click();
+    } else if (expected === null || before >= expected) {
+      finish();
+    }
+    return;
+  }
+  if (count() > before || !button) finish();
+};
+if (expected !== null && before >= expected) {
+  finish();
+} else {
+  observer = new MutationObserver(() => {
+    if (!scheduled) {
+      scheduled = true;
+      setTimeout(step, 0);
+    }
+  });
+  observer.observe(document.body, {childList: true, subtree: true, attributes: true});
+  timer = setTimeout(finish, timeoutMs);
+  step();
+}
+'''
+
+
+def chrome_options(headless=True, page_load_strategy='eager'):
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--window-size=1366,768')
+    options.add_experimental_option('prefs', {
+        'profile.managed_default_content_settings.images': 2,
+        'profile.default_content_setting_values.notifications': 2,
+    })
+    options.page_load_strategy = page_load_strategy
+    return options
+
+
+def process_rss(pid):
+    # Resident memory of a chromedriver process and every browser process under it.
+    if psutil is None or pid is None:
+        return None
+    try:
+        process = psutil.Process(pid)
+        return sum(child.memory_info().rss for child in [process, *process.children(recursive=True)])
+    except psutil.Error:
+        return None
+
+
+class ManagedDriver:
+    # Wraps one WebDriver slot; attribute access falls through to the live
+    # driver, so it can be used anywhere a webdriver.Chrome is expected.
+
+    def __init__(self, pool, slot):
+        self.pool = pool
+        self.slot = slot
+        self.driver = None
+        self.pages = 0
+        self.started_at = None
+
+    def __getattr__(self, name):
+        if self.driver is None:
+            self.start()
+        return getattr(self.driver, name)
+
+    def start(self):
+        self.driver = self.pool.launch()
+        self.pages = 0
+        self.started_at = time.monotonic()
+
+    def stop(self):
+        if self.driver is None:
+            return
+        self.record_stats()
+        try:
+            self.driver.quit()
+        except WebDriverException as e:
+            logger.warning(f"Driver {self.slot} did not quit cleanly: {e}")
+        self.driver = None
+
+    def restart(self):
+        self.pool.inc_stat('driver/restarts')
+        self.stop()
+        self.start()
+
+    def is_alive(self):
+        try:
+            self.driver.window_handles
+            return True
+        except WebDriverException:
+            return False
+
+    def get(self, url):
+        if self.driver is None:
+            self.start()
+        elif self.pages >= self.pool.max_pages:
+            self.pool.inc_stat('driver/recycles')
+            self.stop()
+            self.start()
+        elif not self.is_alive():
+            logger.warning(f"Driver {self.slot} stopped responding; replacing it")
+            self.restart()
+        started = time.monotonic()
+        self.driver.get(url)
+        self.pool.observe('driver/page_load', time.monotonic() - started)
+        self.pages += 1
+        self.pool.inc_stat('driver/pages')
+
+    def show_more(self, expected=None):
+        # Clicks show-more once; a click that loaded nothing before the
+        # timeout counts as the end of the listing.
+        started = time.monotonic()
+        result = self.driver.execute_async_script(
+            SHOW_MORE_SCRIPT, SHOW_MORE_SELECTOR, ITEM_SELECTOR, expected, int(self.pool.show_more_timeout * 1000)
+        )
+        result = ShowMoreResult(result['clicked'], result['before'], result['after'], time.monotonic() - started)
+        if result.clicked:
+            self.pool.observe('listing/show_more', result.seconds)
+            if result.after <= result.before:
+                self.pool.inc_stat('listing/show_more/empty')
+        return result
+
+    def record_stats(self):
+        elapsed = time.monotonic() - self.started_at
+        if elapsed > 0 and self.pages:
+            self.pool.max_stat(f'driver/{self.slot}/pages_per_second', round(self.pages / elapsed, 3))
+        service = getattr(self.driver, 'service', None)
+        rss = process_rss(getattr(getattr(service, 'process', None), 'pid', None))
+        if rss is not None:
+            self.pool.max_stat(f'driver/{self.slot}/rss_mb', round(rss / 2 ** 20, 1))
+
+
+class DriverPool:
+    def __init__(self, headless=True, page_load_strategy='eager', blocked_urls=None, max_pages=50,
+                 show_more_timeout=10, stats=None):
+        self.headless = headless
+        self.page_load_strategy = page_load_strategy
+        self.blocked_urls = BLOCKED_URLS if blocked_urls is None else blocked_urls
+        self.max_pages = max_pages
+        self.show_more_timeout = show_more_timeout
+        self.stats = stats
+        self.lock = threading.Lock()
+        self.idle = []
+        self.slots = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        blocked_urls = settings.getlist('DRIVER_BLOCKED_URLS') if 'DRIVER_BLOCKED_URLS' in settings else None
+        return cls(
+            headless=settings.getbool('DRIVER_HEADLESS', True),
+            page_load_strategy=settings.get('DRIVER_PAGE_LOAD_STRATEGY', 'eager'),
+            blocked_urls=blocked_urls,
+            max_pages=settings.getint('DRIVER_MAX_PAGES', 50),
+            show_more_timeout=settings.getfloat('DRIVER_SHOW_MORE_TIMEOUT', 10),
+            stats=crawler.stats,
+        )
+
+    def inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+    def max_stat(self, key, value):
+        if self.stats is not None:
+            self.stats.max_value(key, value)
+
+    def observe(self, name, seconds):
+        observe(self.stats, name, seconds)
+
+    def launch(self):
+        driver = webdriver.Chrome(options=chrome_options(self.headless, self.page_load_strategy))
+        driver.set_script_timeout(SCRIPT_TIMEOUT)
+        if self.blocked_urls:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_urls})
+        self.inc_stat('driver/launched')
+        return driver
+
+    def acquire(self):
+        # Hands out an idle driver slot, or a new one; Chrome starts on first use.
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+            managed = ManagedDriver(self, len(self.slots))
+            self.slots.append(managed)
+            return managed
+
+    def release(self, managed):
+        with self.lock:
+            self.idle.append(managed)
+
+    def trim(self, size):
+        # Stops idle browsers until at most `size` are running.
+        with self.lock:
+            running = sum(managed.driver is not None for managed in self.slots)
+            excess = [managed for managed in self.idle if managed.driver is not None][:max(running - size, 0)]
+            self.idle = [managed for managed in self.idle if managed not in excess]
+        for managed in excess:
+            managed.stop()
+            self.inc_stat('driver/trimmed')
+        if excess:
+            with self.lock:
+                self.idle.extend(excess)
+
+    def close(self):
+        with self.lock:
+            for managed in self.slots:
+                managed.stop()
+            self.idle = []
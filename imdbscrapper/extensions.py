@@ -0,0 +1,170 @@
+# Periodic crawl metrics: item throughput, plus an optional JSON snapshot file
+# and an optional Prometheus text endpoint built from the crawl stats.
+#
+# Every METRICS_INTERVAL seconds the exporter records items/sec and the
+# counters of every rate-limit bucket (<name>/ratelimit/*) in the stats.
+# It also renders a snapshot of the stats and latency histograms
+# (imdbscrapper/metrics.py), writing it to METRICS_JSON_PATH and/or serving
+# it at http://<METRICS_HOST>:<METRICS_PORT>/metrics.
+
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from imdbscrapper.metrics import histograms, quantile
+from imdbscrapper.ratelimit import buckets
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = 'imdbscrapper'
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def metric_name(key):
+    return f"{METRIC_PREFIX}_{re.sub(r'[^a-zA-Z0-9_]', '_', key).strip('_')}"
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def render_prometheus(stats):
+    hists = histograms(stats)
+    lines = []
+    for name, hist in sorted(hists.items()):
+        metric = metric_name(name) + '_seconds'
+        lines.append(f'# TYPE {metric} histogram')
+        for bound, cumulative in hist['buckets']:
+            le = '+Inf' if bound == math.inf else f'{bound:g}'
+            lines.append(f'{metric}_bucket{{le="{le}"}} {cumulative}')
+        if hist['buckets'][-1][0] != math.inf:
+            lines.append(f'{metric}_bucket{{le="+Inf"}} {hist["count"]}')
+        lines.append(f'{metric}_sum {hist["sum"]}')
+        lines.append(f'{metric}_count {hist["count"]}')
+    for key, value in sorted(stats.items()):
+        if not is_number(value):
+            continue
+        metric = metric_name(key)
+        lines.append(f'# TYPE {metric} gauge')
+        lines.append(f'{metric} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def snapshot(stats):
+    latencies = {}
+    for name, hist in histograms(stats).items():
+        latencies[name] = {
+            'count': hist['count'],
+            'mean': hist['sum'] / hist['count'] if hist['count'] else None,
+            'max': hist['max'],
+            **{f'p{round(q * 100)}': quantile(hist, q) for q in QUANTILES},
+        }
+    counters = {key: value for key, value in stats.items() if is_number(value)}
+    return {'time': datetime.now().isoformat(timespec='seconds'), 'stats': counters, 'latency': latencies}
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.exporter.prometheus_text.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter:
+    def __init__(self, crawler, interval=15, json_path=None, host='127.0.0.1', port=None):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = interval
+        self.json_path = json_path
+        self.host = host
+        self.port = port
+        self.prometheus_text = ''
+        self.server = None
+        self.loop = None
+        self.started = None
+        self.last_time = None
+        self.last_items = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        interval = settings.getfloat('METRICS_INTERVAL', 15)
+        if not interval:
+            raise NotConfigured
+        exporter = cls(
+            crawler,
+            interval=interval,
+            json_path=settings.get('METRICS_JSON_PATH'),
+            host=settings.get('METRICS_HOST', '127.0.0.1'),
+            port=settings.getint('METRICS_PORT') or None,
+        )
+        crawler.signals.connect(exporter.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(exporter.spider_closed, signal=signals.spider_closed)
+        return exporter
+
+    def spider_opened(self, spider):
+        self.started = self.last_time = time.monotonic()
+        if self.port:
+            self.server = ThreadingHTTPServer((self.host, self.port), MetricsHandler)
+            self.server.exporter = self
+            threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True).start()
+            logger.info(f"Serving Prometheus metrics on http://{self.host}:{self.server.server_port}/metrics")
+        self.loop = task.LoopingCall(self.publish)
+        self.loop.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        elapsed = time.monotonic() - self.started
+        if elapsed > 0:
+            self.stats.set_value('metrics/items_per_second_avg',
+                                 round(self.stats.get_value('item_scraped_count', 0) / elapsed, 3))
+        self.publish()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def publish(self):
+        now = time.monotonic()
+        items = self.stats.get_value('item_scraped_count', 0)
+        if now > self.last_time:
+            self.stats.set_value('metrics/items_per_second', round((items - self.last_items) / (now - self.last_time), 3))
+        self.last_time, self.last_items = now, items
+        for name, bucket in buckets().items():
+            for counter, value in bucket.counters().items():
+                self.stats.set_value(f'{name}/ratelimit/{counter}', value)
+        stats = dict(self.stats.get_stats())
+        if self.server is not None:
+            self.prometheus_text = render_prometheus(stats)
+        if self.json_path:
+            self.write_json(snapshot(stats))
+
+    def write_json(self, data):
+        if os.path.dirname(self.json_path):
+            os.makedirs(os.path.dirname(self.json_path), exist_ok=True)
+        tmp_path = f'{self.json_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, default=str)
+            os.replace(tmp_path, self.json_path)
+        except OSError as e:
+            logger.error(f"Could not write metrics to {self.json_path}: {e}")
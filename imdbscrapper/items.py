@@ -2,11 +2,76 @@
 #
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/items.html
+#
+# Slotted dataclasses; MovieItem's annotations give the export column types.
+
+import typing
+from dataclasses import dataclass, field, fields
+
+
+@dataclass(slots=True)
+class ListingRow:
+    # One title as read off an IMDb search listing, before TMDb enrichment.
+    imdb_id: str | None = None
+    title: str | None = None
+    year: str | None = None
+    movie_url: str | None = None
+    imdb_rating: float | None = None
+    imdb_votes: int | None = None
+    metascore: float | None = None
+    title_type: str | None = None
+    partition: str | None = None
+    # Set on rows re-queued by refresh mode for titles TMDb reports as changed.
+    tmdb_id: int | None = None
+    media_type: str | None = None
+    refresh: bool = False
+
 
-import scrapy
+@dataclass(slots=True)
+class MovieItem:
+    title: str | None = None
+    original_title: str | None = None
+    imdb_id: str | None = None
+    tmdb_id: int | None = None
+    media_type: str | None = None
+    year: str | None = None
+    release_date: str | None = None
+    runtime: int | None = None
+    poster_path: str | None = None
+    backdrop_path: str | None = None
+    homepage: str | None = None
+    imdb_rating: float | None = None
+    imdb_votes: int | None = None
+    imdb_metascore: float | None = None
+    tmdb_vote_average: float | None = None
+    tmdb_vote_count: int | None = None
+    genres: list[str] = field(default_factory=list)
+    overview: str | None = None
+    tagline: str | None = None
+    budget: int | None = None
+    revenue: int | None = None
+    adult: bool | None = None
+    original_language: str | None = None
+    popularity: float | None = None
+    status: str | None = None
+    origin_country: list[str] = field(default_factory=list)
+    production_companies: list[str] = field(default_factory=list)
+    production_countries: list[str] = field(default_factory=list)
+    spoken_languages: list[str] = field(default_factory=list)
+    cast: list[str] = field(default_factory=list)
+    crew: list[str] = field(default_factory=list)
+    keywords: list[str] = field(default_factory=list)
+    trailer_link: str | None = None
+    scraped_at: str | None = None
 
 
-class ImdbscrapperItem(scrapy.Item):
-    # define the fields for your item here like:
-    # name = scrapy.Field()
-    pass
+def field_types(item_class=MovieItem):
+    # Maps each field name to its base type: str, int, float, bool or list.
+    types = {}
+    for item_field in fields(item_class):
+        kind = item_field.type
+        args = [arg for arg in typing.get_args(kind) if arg is not type(None)]
+        if typing.get_origin(kind) is not list and args:
+            kind = args[0]
+        types[item_field.name] = typing.get_origin(kind) or kind
+    return types
@@ -0,0 +1,197 @@
+# Helpers for IMDb advanced title search listings.
+#
+# The search page is a Next.js app: the first batch of results is embedded in
+# the `__NEXT_DATA__` script tag, so it can be read with a plain HTTP request
+# instead of rendering the page in a browser. Each page holds at most
+# SEARCH_PAGE_SIZE results; later pages are requested with a 1-based `start`.
+
+import json
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urljoin, urlsplit
+
+from parsel import Selector
+
+from imdbscrapper.normalize import convert_to_float, convert_votes
+
+IMDB_BASE_URL = 'https://www.imdb.com'
+SEARCH_PAGE_SIZE = 250
+ITEM_SELECTOR = 'li.ipc-metadata-list-summary-item'
+SHOW_MORE_SELECTOR = 'button.ipc-see-more__button'
+TITLE_TYPE_SELECTOR = 'span.dli-title-type-data'
+# Per-field selectors inside one ITEM_SELECTOR list item, shared by the
+# page_source parser and the per-element WebDriver path.
+FIELD_SELECTORS = {
+    'title': 'h3.ipc-title__text',
+    'year': 'span.dli-title-metadata-item:nth-of-type(1)',
+    'movie_url': 'a.ipc-lockup-overlay',
+    'imdb_rating': 'span.ipc-rating-star--rating',
+    'imdb_votes': 'span.ipc-rating-star--voteCount',
+    'metascore': 'span.metacritic-score-box',
+    'title_type': TITLE_TYPE_SELECTOR,
+}
+# Rendered rows label every title type but feature films, which is what
+# TMDbClient.fetch needs to pick /movie or /find without a wasted request.
+TITLE_TYPE_LABELS = {'TV Series': 'tvSeries', 'TV Mini Series': 'tvMiniSeries', 'TV Movie': 'tvMovie',
+                     'TV Special': 'tvSpecial', 'TV Short': 'tvShort', 'Short': 'short', 'Video': 'video'}
+
+
+def month_window(year, month):
+    first_day = date(year, month, 1)
+    last_day = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return first_day, last_day
+
+
+def search_url(start_date, end_date, count=SEARCH_PAGE_SIZE, base_url=IMDB_BASE_URL, start=1):
+    url = (
+        f'{base_url}/search/title/?title_type=feature,tv_series'
+        f'&release_date={start_date.isoformat()},{end_date.isoformat()}&adult=include&count={count}'
+    )
+    return f'{url}&start={start}' if start > 1 else url
+
+
+def page_start(url):
+    values = parse_qs(urlsplit(url).query).get('start')
+    try:
+        return int(values[0]) if values else 1
+    except ValueError:
+        return 1
+
+
+def next_page_start(start, listed, total):
+    # `start` of the page after one that began at `start` and listed `listed`
+    # titles, or None when that page was the last. An empty page ends the
+    # search even if `total` promises more.
+    if not listed or not total or start + listed > total:
+        return None
+    return start + listed
+
+
+def unlisted_titles(start, listed, total):
+    # Titles a search reports beyond the last one listed so far.
+    return max(0, (total or 0) - (start - 1 + listed))
+
+
+def load_next_data(response):
+    payload = response.css('script#__NEXT_DATA__::text').get()
+    if not payload:
+        return None
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+def title_results(next_data):
+    try:
+        return next_data['props']['pageProps']['searchResults']['titleResults']
+    except (KeyError, TypeError):
+        return None
+
+
+def _nested(value, *keys):
+    for key in keys:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def row_from_title_item(title_item, base_url=IMDB_BASE_URL):
+    imdb_id = title_item.get('titleId')
+    title = title_item.get('titleText')
+    if isinstance(title, dict):
+        title = title.get('text')
+    year = title_item.get('releaseYear')
+    if isinstance(year, dict):
+        year = year.get('year')
+    rating = _nested(title_item, 'ratingSummary', 'aggregateRating')
+    votes = _nested(title_item, 'ratingSummary', 'voteCount')
+    metascore = title_item.get('metascore')
+    if isinstance(metascore, dict):
+        metascore = metascore.get('score')
+    title_type = title_item.get('titleType')
+    if isinstance(title_type, dict):
+        title_type = title_type.get('id')
+    return {
+        'title': title,
+        'year': str(year) if year is not None else None,
+        'movie_url': f'{base_url}/title/{imdb_id}/' if imdb_id else None,
+        'imdb_rating': float(rating) if rating is not None else None,
+        'imdb_votes': int(votes) if votes is not None else None,
+        'metascore': float(metascore) if metascore is not None else None,
+        'imdb_id': imdb_id,
+        'title_type': title_type,
+    }
+
+
+def parse_search_total(html):
+    results = title_results(load_next_data(Selector(text=html)))
+    return results.get('total') if results else None
+
+
+def parse_search_results(response, base_url=IMDB_BASE_URL):
+    results = title_results(load_next_data(response))
+    if not results:
+        return [], None
+    rows = [row_from_title_item(title_item, base_url) for title_item in results.get('titleListItems') or []]
+    return rows, results.get('total')
+
+
+def title_type_from_label(label):
+    # None (unknown type) for labels not in TITLE_TYPE_LABELS.
+    if not label:
+        return 'movie'
+    return TITLE_TYPE_LABELS.get(label.strip())
+
+
+def _text(node, selector):
+    element = node.css(selector)
+    if not element:
+        return None
+    return element[0].xpath('string()').get().strip()
+
+
+def parse_rendered_items(html, base_url=IMDB_BASE_URL):
+    # Reads every rendered list item out of one page_source snapshot instead
+    # of issuing a WebDriver round-trip per field and item.
+    rows = []
+    for node in Selector(text=html).css(ITEM_SELECTOR):
+        href = node.css(f"{FIELD_SELECTORS['movie_url']}::attr(href)").get()
+        movie_url = urljoin(base_url, href) if href else None
+        rows.append({
+            'title': _text(node, FIELD_SELECTORS['title']),
+            'year': _text(node, FIELD_SELECTORS['year']),
+            'movie_url': movie_url,
+            'imdb_rating': convert_to_float(_text(node, FIELD_SELECTORS['imdb_rating'])),
+            'imdb_votes': convert_votes(_text(node, FIELD_SELECTORS['imdb_votes'])),
+            'metascore': convert_to_float(_text(node, FIELD_SELECTORS['metascore'])),
+            'imdb_id': movie_url.split('/')[-2] if movie_url else None,
+            'title_type': title_type_from_label(_text(node, FIELD_SELECTORS['title_type'])),
+        })
+    return rows
+
+
+def row_from_element(movie_div):
+    # The same row as parse_rendered_items, read from one WebElement with a
+    # WebDriver round-trip per field (extraction_mode=element).
+    from selenium.common.exceptions import NoSuchElementException
+    from selenium.webdriver.common.by import By
+
+    movie_data = {}
+    for key, selector in FIELD_SELECTORS.items():
+        try:
+            element = movie_div.find_element(By.CSS_SELECTOR, selector)
+        except NoSuchElementException:
+            movie_data[key] = None
+            continue
+        if key == 'movie_url':
+            movie_data[key] = element.get_attribute('href')
+        elif key == 'imdb_votes':
+            movie_data[key] = convert_votes(element.text)
+        elif key in ('imdb_rating', 'metascore'):
+            movie_data[key] = convert_to_float(element.text)
+        else:
+            movie_data[key] = element.text
+    movie_data['imdb_id'] = movie_data['movie_url'].split('/')[-2] if movie_data['movie_url'] else None
+    movie_data['title_type'] = title_type_from_label(movie_data['title_type'])
+    return movie_data
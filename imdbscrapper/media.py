@@ -0,0 +1,216 @@
+# Poster and backdrop downloads for MediaPipeline.
+#
+# Images are fetched in a TMDb size variant (MEDIA_SIZE, e.g. w500) through
+# one aiohttp session, with at most MEDIA_MAX_IN_FLIGHT downloads and
+# MEDIA_MAX_IN_FLIGHT_BYTES of response bodies in progress at once. Writes to
+# disk are paced by a byte-counting token bucket (MEDIA_MAX_BYTES_PER_SECOND).
+#
+# Files are stored by content: <MEDIA_DIR>/<sha256[:2]>/<sha256><ext>, so an
+# image served under several URLs is kept once. media.sqlite3 maps every
+# downloaded URL to its file and lets later runs skip it. A download is
+# written to .partial/ first and continues with a Range request after a
+# dropped connection or a crash; TMDb never changes the image behind a path,
+# so the partial bytes stay valid.
+
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+import aiohttp
+
+from imdbscrapper.metrics import observe
+from imdbscrapper.ratelimit import get_bucket
+
+logger = logging.getLogger(__name__)
+
+TMDB_IMAGE_BASE_URL = 'https://image.tmdb.org/t/p'
+INDEX_FILENAME = 'media.sqlite3'
+PARTIAL_DIR = '.partial'
+CHUNK_SIZE = 64 * 1024
+
+
+def variant_url(url, size, base_url=TMDB_IMAGE_BASE_URL):
+    # https://image.tmdb.org/t/p/original/abc.jpg -> <base_url>/<size>/abc.jpg
+    if not url:
+        return None
+    file_name = urlparse(url).path.rsplit('/', 1)[-1]
+    return f"{base_url.rstrip('/')}/{size}/{file_name}" if file_name else None
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    # commit() hashes and moves files, so MediaDownloader runs it in a worker
+    # thread; db_lock serializes the index connection between threads.
+
+    def __init__(self, root):
+        self.root = root
+        self.db_lock = threading.Lock()
+        os.makedirs(os.path.join(root, PARTIAL_DIR), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, INDEX_FILENAME), check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS media (url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, path TEXT NOT NULL, '
+            'bytes INTEGER NOT NULL, stored_at REAL NOT NULL)'
+        )
+        self.db.execute('CREATE INDEX IF NOT EXISTS media_sha256 ON media (sha256)')
+
+    def lookup(self, url):
+        with self.db_lock:
+            row = self.db.execute('SELECT path FROM media WHERE url = ?', (url,)).fetchone()
+        if row and os.path.exists(os.path.join(self.root, row[0])):
+            return row[0]
+        return None
+
+    def partial_path(self, url):
+        return os.path.join(self.root, PARTIAL_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.part')
+
+    def commit(self, url, partial_path):
+        # Moves a finished download to its content address. Returns the
+        # stored path and whether the same content was already on disk.
+        digest = file_digest(partial_path)
+        extension = os.path.splitext(urlparse(url).path)[1].lower() or '.jpg'
+        path = f'{digest[:2]}/{digest}{extension}'
+        full_path = os.path.join(self.root, path)
+        size = os.path.getsize(partial_path)
+        duplicate = os.path.exists(full_path)
+        if duplicate:
+            os.remove(partial_path)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(partial_path, full_path)
+        with self.db_lock:
+            self.db.execute('INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?)',
+                            (url, digest, path, size, time.time()))
+        return path, duplicate
+
+    def close(self):
+        with self.db_lock:
+            self.db.close()
+
+
+class ByteBudget:
+    # Caps the bytes of response bodies being downloaded at once. A body
+    # larger than the whole budget waits until it can take all of it.
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, size):
+        size = min(size, self.limit)
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.used + size <= self.limit)
+            self.used += size
+        return size
+
+    async def release(self, size):
+        async with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+class MediaDownloader:
+    def __init__(self, store, max_in_flight=16, max_in_flight_bytes=32 * 1024 * 1024, max_bytes_per_second=0,
+                 timeout=60, retry_times=3, stats=None):
+        self.store = store
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_bytes = max_in_flight_bytes
+        self.timeout = timeout
+        self.retry_times = retry_times
+        self.stats = stats
+        self.bucket = None
+        if max_bytes_per_second:
+            self.bucket = get_bucket('media', max_bytes_per_second, max(max_bytes_per_second, CHUNK_SIZE))
+        self.session = None
+        self.semaphore = None
+        self.budget = None
+        self.downloading = {}
+
+    async def open(self):
+        if self.session is None:
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+            self.budget = ByteBudget(self.max_in_flight_bytes)
+            connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self.store.close()
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(f'media/{key}', count)
+
+    async def download(self, url):
+        # Returns the stored path relative to the media directory, or None.
+        path = self.store.lookup(url)
+        if path is not None:
+            self._inc_stat('already_stored')
+            return path
+        if url not in self.downloading:
+            self.downloading[url] = asyncio.ensure_future(self._download(url))
+            self.downloading[url].add_done_callback(lambda _: self.downloading.pop(url, None))
+        return await asyncio.shield(self.downloading[url])
+
+    async def _download(self, url):
+        await self.open()
+        async with self.semaphore:
+            for attempt in range(self.retry_times + 1):
+                try:
+                    return await self._fetch(url)
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    if attempt == self.retry_times:
+                        logger.error(f"Giving up on {url} after {attempt + 1} attempts: {e!r}")
+                        self._inc_stat('errors')
+                        return None
+                    self._inc_stat('retries')
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+    async def _fetch(self, url):
+        partial_path = self.store.partial_path(url)
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        started = time.monotonic()
+        async with self.session.get(url, headers=headers) as response:
+            if response.status == 404:
+                self._inc_stat('missing')
+                return None
+            # 416: the partial file already holds the whole image.
+            if not (response.status == 416 and offset):
+                response.raise_for_status()
+                if response.status == 206:
+                    self._inc_stat('resumed')
+                else:
+                    offset = 0
+                reserved = await self.budget.acquire(response.content_length or CHUNK_SIZE)
+                try:
+                    with open(partial_path, 'ab' if offset else 'wb') as f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            if self.bucket is not None:
+                                await self.bucket.acquire_async(len(chunk))
+                            f.write(chunk)
+                            self._inc_stat('bytes', len(chunk))
+                finally:
+                    await self.budget.release(reserved)
+        path, duplicate = await asyncio.to_thread(self.store.commit, url, partial_path)
+        observe(self.stats, 'media/download', time.monotonic() - started)
+        self._inc_stat('duplicates' if duplicate else 'stored')
+        return path
@@ -0,0 +1,100 @@
+# Latency histograms kept in the Scrapy crawl stats.
+#
+# A histogram named `tmdb/latency/movie` is one stats value under that key:
+# {'count', 'sum', 'max', 'buckets': {<bound label>: count}}, with only the
+# buckets that were hit, so it shows up compactly in the stats dump at the
+# end of a crawl. observe() may be called from worker threads: updates are
+# serialised by a lock and each one stores a new dict, so readers never see
+# a histogram half-updated. MetricsExporter (imdbscrapper/extensions.py) and
+# the Autoscaler read the values back to publish Prometheus histograms and
+# quantile estimates.
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_observe_lock = threading.Lock()
+
+
+def bucket_label(bound):
+    return 'inf' if bound == math.inf else f'{bound:g}'
+
+
+def bucket_bound(label):
+    return math.inf if label == 'inf' else float(label)
+
+
+def is_histogram(value):
+    return isinstance(value, dict) and 'buckets' in value
+
+
+def observe(stats, name, seconds, buckets=LATENCY_BUCKETS):
+    if stats is None:
+        return
+    index = bisect.bisect_left(buckets, seconds)
+    label = bucket_label(buckets[index] if index < len(buckets) else math.inf)
+    with _observe_lock:
+        old = stats.get_value(name)
+        if not is_histogram(old):
+            old = {'count': 0, 'sum': 0.0, 'max': None, 'buckets': {}}
+        stats.set_value(name, {
+            'count': old['count'] + 1,
+            'sum': old['sum'] + seconds,
+            'max': seconds if old['max'] is None else max(old['max'], seconds),
+            'buckets': {**old['buckets'], label: old['buckets'].get(label, 0) + 1},
+        })
+
+
+@contextmanager
+def timed(stats, name):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        observe(stats, name, time.monotonic() - started)
+
+
+def cumulative_buckets(counts):
+    # Sorted (upper bound, cumulative count) pairs from {bound: count}, with
+    # every LATENCY_BUCKETS bound present.
+    cumulative, buckets = 0, []
+    for bound in sorted(set(counts) | set(LATENCY_BUCKETS)):
+        cumulative += counts.get(bound, 0)
+        buckets.append((bound, cumulative))
+    return buckets
+
+
+def histograms(stats):
+    # {name: {'count', 'sum', 'max', 'buckets'}} for every histogram in a
+    # stats dict; 'buckets' is a sorted list of (upper bound, cumulative count).
+    return {
+        name: {
+            'count': value['count'],
+            'sum': value['sum'],
+            'max': value['max'],
+            'buckets': cumulative_buckets({bucket_bound(label): count for label, count in value['buckets'].items()}),
+        }
+        for name, value in stats.items() if is_histogram(value)
+    }
+
+
+def quantile(histogram, q):
+    # Estimates a quantile by interpolating inside the bucket that holds it.
+    total = histogram['buckets'][-1][1] if histogram['buckets'] else 0
+    if not total:
+        return None
+    rank = q * total
+    lower, below = 0.0, 0
+    for bound, cumulative in histogram['buckets']:
+        if cumulative >= rank:
+            if bound == math.inf:
+                return histogram['max']
+            inside = cumulative - below
+            estimate = lower + (bound - lower) * ((rank - below) / inside if inside else 1)
+            return min(estimate, histogram['max']) if histogram['max'] is not None else estimate
+        lower, below = bound, cumulative
+    return histogram['max']
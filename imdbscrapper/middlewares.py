@@ -3,101 +3,183 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import asyncio
+import time
+
 from scrapy import signals
+from scrapy.utils.httpobj import urlparse_cached
 
 # useful for handling different item types with a single interface
-from itemadapter import is_item, ItemAdapter
-
-
-class ImdbscrapperSpiderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the spider middleware does not modify the
-    # passed objects.
-
-    @classmethod
-    def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
-        return s
-
-    def process_spider_input(self, response, spider):
-        # Called for each response that goes through the spider
-        # middleware and into the spider.
+from itemadapter import ItemAdapter
 
-        # Should return None or raise an exception.
-        return None
+from imdbscrapper.dedup import dedup_index, item_duplicate
+from imdbscrapper.items import ListingRow
+from imdbscrapper.metrics import observe
+from imdbscrapper.state import exports_items
+from imdbscrapper.workers import run_in_thread
 
-    def process_spider_output(self, response, result, spider):
-        # Called with the results returned from the Spider, after
-        # it has processed the response.
 
-        # Must return an iterable of Request, or item objects.
-        for i in result:
-            yield i
+async def ready(future):
+    # Lets `future` run until it would block; True if it finished.
+    await asyncio.wait([future], timeout=0)
+    return future.done()
 
-    def process_spider_exception(self, response, exception, spider):
-        # Called when a spider or process_spider_input() method
-        # (from other spider middleware) raises an exception.
 
-        # Should return either None or an iterable of Request or item objects.
-        pass
+class TimingSpiderMiddleware:
+    # Times spider callbacks into the spider/<callback> latency histograms.
+    # Only time spent inside the callback counts, not the time its output
+    # spends in later middlewares and pipelines. Install it closest to the
+    # spider (the highest order number).
 
-    def process_start_requests(self, start_requests, spider):
-        # Called with the start requests of the spider, and works
-        # similarly to the process_spider_output() method, except
-        # that it doesn’t have a response associated.
+    def __init__(self, stats):
+        self.stats = stats
 
-        # Must return only requests (not items).
-        for r in start_requests:
-            yield r
-
-    def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.stats)
 
+    @staticmethod
+    def _histogram(response):
+        callback = getattr(response.request, 'callback', None)
+        return f"spider/{getattr(callback, '__name__', 'parse')}"
 
-class ImdbscrapperDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    def process_spider_output(self, response, result, spider):
+        elapsed = 0.0
+        result = iter(result)
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    i = next(result)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.monotonic() - started
+                yield i
+        finally:
+            observe(self.stats, self._histogram(response), elapsed)
+
+    async def process_spider_output_async(self, response, result, spider):
+        elapsed = 0.0
+        result = result.__aiter__()
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    i = await result.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += time.monotonic() - started
+                yield i
+        finally:
+            observe(self.stats, self._histogram(response), elapsed)
+
+
+class TimingDownloaderMiddleware:
+    # Records download latency per host in the http/<host> histograms and
+    # counts 429 responses per host, next to Scrapy's own retry/* stats.
+
+    def __init__(self, stats):
+        self.stats = stats
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
-        return s
-
-    def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
-        return None
+        return cls(crawler.stats)
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        host = urlparse_cached(request).hostname or 'unknown'
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            observe(self.stats, f'http/{host}', latency)
+        if response.status == 429:
+            self.stats.inc_value(f'http/{host}/throttled')
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        host = urlparse_cached(request).hostname or 'unknown'
+        self.stats.inc_value(f'http/{host}/errors')
+
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+class DedupMiddleware:
+    # Drops ListingRow items whose IMDb ID was already claimed in this crawl,
+    # or scraped in an earlier one, before any TMDb work is scheduled for them.
+    # Rows re-queued by refresh mode are known titles and always pass.
+    #
+    # Rows are claimed in batches on a reactor pool thread: a batch goes out
+    # as soon as the callback has no more output ready, or once it holds
+    # DEDUP_BATCH_SIZE rows, so one index or backend round trip covers a
+    # whole listing page or partition without holding rows back.
+
+    def __init__(self, index, crawler, batch_size=500):
+        self.index = index
+        self.crawler = crawler
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # A distributed crawl claims IDs in the shared backend instead.
+        middleware = cls(dedup_index(crawler), crawler, crawler.settings.getint('DEDUP_BATCH_SIZE', 500))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        if not exports_items(crawler.settings):
+            # StreamingExportPipeline records IDs once they are exported.
+            crawler.signals.connect(middleware.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(middleware.item_not_scraped, signal=signals.item_dropped)
+        crawler.signals.connect(middleware.item_not_scraped, signal=signals.item_error)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    async def _claim(self, rows, spider):
+        if not rows:
+            return []
+        claimed = await run_in_thread(self.index.claim_many, [row.imdb_id for row in rows])
+        self.crawler.stats.inc_value('dedup/batches')
+        new = []
+        for row, is_new in zip(rows, claimed):
+            if is_new:
+                new.append(row)
+                continue
+            self.crawler.stats.inc_value('dedup/duplicates')
+            self.crawler.signals.send_catch_log(item_duplicate, item=row, spider=spider)
+        return new
+
+    async def process_spider_output(self, response, result, spider):
+        # Sync callback output is upgraded to an async iterable by Scrapy.
+        batch = []
+        result = result.__aiter__()
+        upcoming = None
+        try:
+            while True:
+                if upcoming is None:
+                    upcoming = asyncio.ensure_future(result.__anext__())
+                if batch and (len(batch) >= self.batch_size or not await ready(upcoming)):
+                    for row in await self._claim(batch, spider):
+                        yield row
+                    batch = []
+                try:
+                    i = await upcoming
+                except StopAsyncIteration:
+                    break
+                upcoming = None
+                if isinstance(i, ListingRow) and not i.refresh:
+                    batch.append(i)
+                else:
+                    yield i
+        finally:
+            if upcoming is not None:
+                upcoming.cancel()
+        for row in await self._claim(batch, spider):
+            yield row
+
+    def item_scraped(self, item):
+        self.index.record(ItemAdapter(item).get('imdb_id'))
+
+    def item_not_scraped(self, item):
+        self.index.release(ItemAdapter(item).get('imdb_id'))
 
     def spider_opened(self, spider):
-        spider.logger.info("Spider opened: %s" % spider.name)
+        if self.index.stored:
+            spider.logger.info(f"Dedup index holds {self.index.stored} already scraped titles")
+
+    def spider_closed(self):
+        self.index.close()
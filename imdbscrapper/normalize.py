@@ -0,0 +1,92 @@
+# Field conversion shared by both spiders.
+#
+# IMDb listing rows and TMDb detail payloads are coerced into MovieItem here
+# and nowhere else, so every exporter downstream can trust the field types.
+# build_movie_items converts a whole batch of (tmdb_data, row) pairs at once.
+
+from datetime import datetime
+
+from imdbscrapper.items import MovieItem
+
+TMDB_IMAGE_BASE_URL = 'https://image.tmdb.org/t/p/original'
+CREDITS_LIMIT = 10
+
+
+def convert_votes(votes_str):
+    if not votes_str:
+        return None
+    votes_str = votes_str.strip().replace('(', '').replace(')', '').replace(',', '').lower()
+    if 'k' in votes_str:
+        return int(float(votes_str.replace('k', '')) * 1000)
+    elif 'm' in votes_str:
+        return int(float(votes_str.replace('m', '')) * 1000000)
+    return int(votes_str) if votes_str.isdigit() else None
+
+
+def convert_to_float(value):
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def convert_to_int(value):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def image_url(path):
+    return f'{TMDB_IMAGE_BASE_URL}{path}' if path else None
+
+
+def names(entries, key='name', limit=None):
+    values = [entry[key] for entry in entries or () if entry.get(key)]
+    return values[:limit] if limit is not None else values
+
+
+def build_movie_item(tmdb_data, row, scraped_at=None):
+    credits = tmdb_data.get('credits') or {}
+    return MovieItem(
+        title=tmdb_data.get('title') or row.title,
+        original_title=tmdb_data.get('original_title'),
+        imdb_id=row.imdb_id or tmdb_data.get('imdb_id'),
+        tmdb_id=convert_to_int(tmdb_data.get('id')),
+        media_type=tmdb_data.get('media_type'),
+        year=row.year,
+        release_date=tmdb_data.get('release_date') or None,
+        runtime=convert_to_int(tmdb_data.get('runtime')),
+        poster_path=image_url(tmdb_data.get('poster_path')),
+        backdrop_path=image_url(tmdb_data.get('backdrop_path')),
+        homepage=tmdb_data.get('homepage') or None,
+        imdb_rating=convert_to_float(row.imdb_rating),
+        imdb_votes=convert_to_int(row.imdb_votes),
+        imdb_metascore=convert_to_float(row.metascore),
+        tmdb_vote_average=convert_to_float(tmdb_data.get('vote_average')),
+        tmdb_vote_count=convert_to_int(tmdb_data.get('vote_count')),
+        genres=names(tmdb_data.get('genres')),
+        overview=tmdb_data.get('overview'),
+        tagline=tmdb_data.get('tagline'),
+        budget=convert_to_int(tmdb_data.get('budget')),
+        revenue=convert_to_int(tmdb_data.get('revenue')),
+        adult=tmdb_data.get('adult'),
+        original_language=tmdb_data.get('original_language'),
+        popularity=convert_to_float(tmdb_data.get('popularity')),
+        status=tmdb_data.get('status'),
+        origin_country=[str(country) for country in tmdb_data.get('origin_country') or ()],
+        production_companies=names(tmdb_data.get('production_companies')),
+        production_countries=names(tmdb_data.get('production_countries')),
+        spoken_languages=names(tmdb_data.get('spoken_languages'), key='english_name'),
+        cast=names(credits.get('cast'), limit=CREDITS_LIMIT),
+        crew=names(credits.get('crew'), limit=CREDITS_LIMIT),
+        keywords=names((tmdb_data.get('keywords') or {}).get('keywords')),
+        trailer_link=tmdb_data.get('trailer_link'),
+        scraped_at=scraped_at or datetime.now().isoformat(),
+    )
+
+
+def build_movie_items(pairs, scraped_at=None):
+    # One timestamp for the batch; the per-item work is build_movie_item's.
+    scraped_at = scraped_at or datetime.now().isoformat()
+    return [build_movie_item(tmdb_data, row, scraped_at) for tmdb_data, row in pairs]
@@ -0,0 +1,60 @@
+# Release-date windows used as units of listing work.
+#
+# Sparse early years (before PARTITION_SPARSE_BEFORE) are listed one whole
+# year per window, later years one month per window, and any window whose
+# search reports more titles than a listing page should hold is split in half
+# until it fits (down to one day). Seeding and splitting only depend on their
+# arguments, so a resumed crawl gets the same window keys as the run it
+# continues.
+
+from collections import namedtuple
+from datetime import date, timedelta
+
+from imdbscrapper.listing import month_window
+
+# Default PARTITION_SPARSE_BEFORE: IMDb lists few enough titles per year
+# before then that a year fits in one window or splits cheaply.
+SPARSE_BEFORE = 1970
+
+
+class Window(namedtuple('Window', 'start end')):
+    __slots__ = ()
+
+    @classmethod
+    def from_key(cls, key):
+        start, end = key.split(',')
+        return cls(date.fromisoformat(start), date.fromisoformat(end))
+
+    @property
+    def key(self):
+        return f'{self.start.isoformat()},{self.end.isoformat()}'
+
+    @property
+    def days(self):
+        return (self.end - self.start).days + 1
+
+    def __str__(self):
+        return self.key
+
+
+def seed_windows(start_year, end_year=None, sparse_before=SPARSE_BEFORE, today=None):
+    today = today or date.today()
+    if end_year is None:
+        last_year, last_month = today.year, today.month
+    else:
+        last_year, last_month = end_year, 12
+
+    for year in range(start_year, last_year + 1):
+        final_month = last_month if year == last_year else 12
+        if year < sparse_before:
+            yield Window(date(year, 1, 1), month_window(year, final_month)[1])
+            continue
+        for month in range(1, final_month + 1):
+            yield Window(*month_window(year, month))
+
+
+def split_window(window):
+    if window.days < 2:
+        return []
+    middle = window.start + timedelta(days=window.days // 2 - 1)
+    return [Window(window.start, middle), Window(middle + timedelta(days=1), window.end)]
@@ -3,11 +3,459 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
+import asyncio
+import json
+import logging
+import os
+from dataclasses import fields
+from datetime import datetime
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from twisted.internet import defer, task, threads
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+from imdbscrapper.catalog import Catalog
+from imdbscrapper.dedup import dedup_index
+from imdbscrapper.items import ListingRow, MovieItem, field_types
+from imdbscrapper.metrics import timed
+from imdbscrapper.normalize import build_movie_item
+from imdbscrapper.state import items_exported
+from imdbscrapper.tmdb import TMDbClient
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = [item_field.name for item_field in fields(MovieItem)]
+
+
+def parquet_schema():
+    arrow_types = {str: pa.string(), int: pa.int64(), float: pa.float64(), bool: pa.bool_(), list: pa.list_(pa.string())}
+    return pa.schema([(name, arrow_types[kind]) for name, kind in field_types(MovieItem).items()])
+
+
+class EnrichmentPipeline:
+    # Turns the ListingRow items spiders yield into MovieItems. Rows are
+    # gathered into micro-batches of ENRICH_BATCH_SIZE (or whatever arrived
+    # within ENRICH_BATCH_TIMEOUT seconds) and each batch is enriched
+    # concurrently through the shared TMDb client, so listing never waits on
+    # TMDb. Scrapy's CONCURRENT_ITEMS only bounds the rows of one response,
+    # so ENRICH_MAX_PENDING caps the rows being enriched across all of them.
+    # Titles TMDb does not know are dropped and counted under
+    # enrich/no_match; other items pass through.
+
+    def __init__(self, batch_size=50, batch_timeout=0.5, max_pending=1000):
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.pending = asyncio.Semaphore(max_pending)
+        self.batch = []
+        self.timer = None
+        self.tasks = set()
+        self.crawler = None
+        self.tmdb = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            batch_size=settings.getint('ENRICH_BATCH_SIZE', 50),
+            batch_timeout=settings.getfloat('ENRICH_BATCH_TIMEOUT', 0.5),
+            max_pending=settings.getint('ENRICH_MAX_PENDING', 1000),
+        )
+        pipeline.crawler = crawler
+        crawler.signals.connect(pipeline.open_tmdb, signal=signals.spider_opened)
+        crawler.signals.connect(pipeline.close_tmdb, signal=signals.spider_closed)
+        return pipeline
+
+    def open_tmdb(self, spider):
+        self.tmdb = TMDbClient.from_crawler(self.crawler, spider.tmdb_api_key)
+
+    async def close_tmdb(self):
+        await self.tmdb.close()
+
+    async def process_item(self, item, spider):
+        if not isinstance(item, ListingRow):
+            return item
+        if self.pending.locked():
+            self.crawler.stats.inc_value('enrich/pending_waits')
+        async with self.pending:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self.batch.append((item, future))
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+            elif self.timer is None:
+                self.timer = loop.call_later(self.batch_timeout, self.flush)
+            tmdb_data = await future
+        if not tmdb_data:
+            self.crawler.stats.inc_value('enrich/no_match')
+            raise DropItem(f"No TMDb match for {item.imdb_id}")
+        with timed(self.crawler.stats, 'enrich/normalize'):
+            return build_movie_item(tmdb_data, item)
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.batch = self.batch, []
+        if batch:
+            task = asyncio.ensure_future(self.enrich_batch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def enrich_batch(self, batch):
+        self.crawler.stats.inc_value('enrich/batches')
+        self.crawler.stats.inc_value('enrich/rows', len(batch))
+        waiting = {}
+        for row, future in batch:
+            waiting.setdefault(row.imdb_id, []).append(future)
+        title_types = {row.imdb_id: row.title_type for row, _ in batch}
+        tmdb_refs = {row.imdb_id: (row.media_type, row.tmdb_id) for row, _ in batch if row.refresh}
+        try:
+            with timed(self.crawler.stats, 'enrich/batch'):
+                async for imdb_id, tmdb_data in self.tmdb.enrich(waiting, title_types, tmdb_refs):
+                    for future in waiting.pop(imdb_id):
+                        if not future.done():
+                            future.set_result(tmdb_data)
+        except Exception as e:
+            logger.error(f"TMDb enrichment of {len(batch)} rows failed: {e}", exc_info=True)
+        for futures in waiting.values():
+            for future in futures:
+                if not future.done():
+                    future.set_result(None)
+
+
+class MediaPipeline:
+    # Downloads each item's poster and backdrop (MEDIA_FIELDS) in the
+    # background through MediaDownloader (imdbscrapper/media.py, imported
+    # only when MEDIA_ENABLED since it needs aiohttp). Items pass on at once;
+    # they only wait when MEDIA_MAX_PENDING downloads are already queued, and
+    # the crawl finishes once every queued download is done.
+
+    def __init__(self, downloader, size='w500', base_url=None, fields=('poster_path', 'backdrop_path'),
+                 max_pending=1000):
+        self.downloader = downloader
+        self.size = size
+        self.base_url = base_url
+        self.fields = fields
+        self.max_pending = max_pending
+        self.tasks = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('MEDIA_ENABLED'):
+            raise NotConfigured
+        from imdbscrapper.media import TMDB_IMAGE_BASE_URL, MediaDownloader, MediaStore
+
+        downloader = MediaDownloader(
+            MediaStore(settings.get('MEDIA_DIR', 'exports/media')),
+            max_in_flight=settings.getint('MEDIA_MAX_IN_FLIGHT', 16),
+            max_in_flight_bytes=settings.getint('MEDIA_MAX_IN_FLIGHT_BYTES', 32 * 1024 * 1024),
+            max_bytes_per_second=settings.getint('MEDIA_MAX_BYTES_PER_SECOND', 0),
+            timeout=settings.getfloat('MEDIA_TIMEOUT', 60),
+            retry_times=settings.getint('MEDIA_RETRY_TIMES', 3),
+            stats=crawler.stats,
+        )
+        pipeline = cls(
+            downloader,
+            size=settings.get('MEDIA_SIZE', 'w500'),
+            base_url=settings.get('MEDIA_IMAGE_BASE_URL', TMDB_IMAGE_BASE_URL),
+            fields=settings.getlist('MEDIA_FIELDS', ['poster_path', 'backdrop_path']),
+            max_pending=settings.getint('MEDIA_MAX_PENDING', 1000),
+        )
+        crawler.signals.connect(pipeline.finish_downloads, signal=signals.spider_closed)
+        return pipeline
+
+    async def process_item(self, item, spider):
+        if not isinstance(item, MovieItem):
+            return item
+        for name in self.fields:
+            url = self.image_url(getattr(item, name))
+            if url:
+                task = asyncio.ensure_future(self.downloader.download(url))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+        while len(self.tasks) >= self.max_pending:
+            await asyncio.wait(self.tasks, return_when=asyncio.FIRST_COMPLETED)
+        return item
+
+    def image_url(self, url):
+        from imdbscrapper.media import TMDB_IMAGE_BASE_URL, variant_url
+
+        return variant_url(url, self.size, self.base_url or TMDB_IMAGE_BASE_URL)
+
+    async def finish_downloads(self):
+        if self.tasks:
+            logger.info(f"Waiting for {len(self.tasks)} image downloads to finish")
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.downloader.close()
+
+
+class StreamingExportPipeline:
+    # Buffers items into fixed-size batches and streams them out as
+    # newline-delimited JSON (appended across runs, one object per line) and
+    # as Parquet files that rotate every EXPORT_ROTATE_ROWS rows, so memory
+    # use stays bounded by EXPORT_BATCH_SIZE whatever the crawl size. A batch
+    # is also written every EXPORT_FLUSH_INTERVAL seconds.
+    #
+    # After each batch the IMDb IDs are recorded in the dedup index together
+    # with the NDJSON file's size, then items_exported is sent so the spider
+    # can commit the partitions the batch completes. On resume, rows past
+    # that checkpoint were written by a crawl killed before recording them;
+    # their partitions were not committed and are listed again, so the rows
+    # are cut off rather than exported twice.
+    #
+    # Batches are written in a reactor thread, one at a time in order; the
+    # item that fills a batch (and close_spider) waits for its write.
+    run_in_thread = staticmethod(threads.deferToThread)
+
+    def __init__(self, export_dir='exports', formats=('ndjson', 'parquet'), batch_size=1000, rotate_rows=100000,
+                 flush_interval=5.0):
+        self.export_dir = export_dir
+        self.formats = set(formats)
+        self.batch_size = batch_size
+        self.rotate_rows = rotate_rows
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.lock = defer.DeferredLock()
+        self.loop = None
+        self.index = None
+        self.signals = None
+        self.ndjson_path = None
+        self.ndjson_file = None
+        self.parquet_writer = None
+        self.parquet_schema = None
+        self.parquet_rows = 0
+        self.parquet_part = 0
+        self.run_id = None
+        self.stats = None
+        if 'parquet' in self.formats and pa is None:
+            logger.warning("pyarrow is not installed; Parquet export is disabled")
+            self.formats.discard('parquet')
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        pipeline = cls(
+            export_dir=settings.get('EXPORT_DIR', 'exports'),
+            formats=settings.getlist('EXPORT_FORMATS', ['ndjson', 'parquet']),
+            batch_size=settings.getint('EXPORT_BATCH_SIZE', 1000),
+            rotate_rows=settings.getint('EXPORT_ROTATE_ROWS', 100000),
+            flush_interval=settings.getfloat('EXPORT_FLUSH_INTERVAL', 5.0),
+        )
+        pipeline.stats = crawler.stats
+        pipeline.index = dedup_index(crawler)
+        pipeline.signals = crawler.signals
+        return pipeline
+
+    def open_spider(self, spider):
+        self.export_dir = os.path.join(self.export_dir, spider.name)
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.run_id = datetime.now().strftime('%Y%m%dT%H%M%S')
+        if 'parquet' in self.formats:
+            self.parquet_schema = parquet_schema()
+        if 'ndjson' in self.formats:
+            self.ndjson_path = os.path.abspath(os.path.join(self.export_dir, 'movies.ndjson'))
+            self._truncate_unrecorded()
+            self.ndjson_file = open(self.ndjson_path, 'a', encoding='utf-8')
+        if self.flush_interval:
+            self.loop = task.LoopingCall(self.flush)
+            self.loop.start(self.flush_interval, now=False)
+
+    def _truncate_unrecorded(self):
+        checkpoint = self.index.checkpoint(self.ndjson_path) if self.index is not None else None
+        if checkpoint is None or not os.path.exists(self.ndjson_path):
+            return
+        size = os.path.getsize(self.ndjson_path)
+        if size > checkpoint:
+            with open(self.ndjson_path, 'r+b') as f:
+                f.truncate(checkpoint)
+            logger.info(f"Cut {size - checkpoint} bytes of unrecorded rows off {self.ndjson_path}")
+            if self.stats is not None:
+                self.stats.inc_value('export/truncated_bytes', size - checkpoint)
+
+    def close_spider(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        d = self.flush()
+        d.addCallback(lambda _: self.lock.run(self.run_in_thread, self._close_files))
+        if getattr(spider, 'mode', None) == 'refresh':
+            d.addCallback(lambda _: self.lock.run(self.run_in_thread, self._merge_ndjson))
+        return d
+
+    def _merge_ndjson(self):
+        # Refresh runs append the titles they re-fetch. Each title's latest
+        # row then replaces its earlier one in place, so movies.ndjson keeps
+        # one current row per title in the order titles were first exported.
+        # Parquet parts are left as written.
+        if self.ndjson_path is None or not os.path.exists(self.ndjson_path):
+            return
+        latest, rows = {}, 0
+        with open(self.ndjson_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                latest[json.loads(line).get('imdb_id')] = offset
+                offset += len(line)
+                rows += 1
+        if rows == len(latest):
+            return
+        merged_path = self.ndjson_path + '.merging'
+        written = set()
+        with open(self.ndjson_path, 'rb') as source, open(self.ndjson_path, 'rb') as rows_file, \
+                open(merged_path, 'wb') as merged:
+            for line in source:
+                imdb_id = json.loads(line).get('imdb_id')
+                if imdb_id not in written:
+                    written.add(imdb_id)
+                    rows_file.seek(latest[imdb_id])
+                    merged.write(rows_file.readline())
+            merged.flush()
+            os.fsync(merged.fileno())
+        os.replace(merged_path, self.ndjson_path)
+        if self.index is not None:
+            self.index.flush((self.ndjson_path, os.path.getsize(self.ndjson_path)))
+        logger.info(f"Merged {rows - len(latest)} refreshed rows into {self.ndjson_path}")
+        if self.stats is not None:
+            self.stats.inc_value('export/merged_rows', rows - len(latest))
+
+    def _close_files(self):
+        if self.ndjson_file is not None:
+            self.ndjson_file.close()
+        self._close_parquet()
+
+    def process_item(self, item, spider):
+        self.buffer.append(item)
+        if len(self.buffer) >= self.batch_size:
+            return self.flush().addCallback(lambda _: item)
+        return item
+
+    def flush(self):
+        if not self.buffer:
+            return defer.succeed(None)
+        items, self.buffer = self.buffer, []
+        d = self.lock.run(self.run_in_thread, self._write_batch, items)
+        d.addCallback(self._batch_written, items)
+        return d
+
+    def _write_batch(self, items):
+        batch = [ItemAdapter(item).asdict() for item in items]
+        checkpoint = None
+        if self.ndjson_file is not None:
+            with timed(self.stats, 'export/ndjson'):
+                self.ndjson_file.writelines(json.dumps(row, ensure_ascii=False) + '\n' for row in batch)
+                self.ndjson_file.flush()
+            checkpoint = (self.ndjson_path, self.ndjson_file.tell())
+        if 'parquet' in self.formats:
+            with timed(self.stats, 'export/parquet'):
+                self._write_parquet(batch)
+        if self.index is not None:
+            with timed(self.stats, 'export/record'):
+                self.index.record_many(row.get('imdb_id') for row in batch)
+                self.index.flush(checkpoint)
+
+    def _batch_written(self, _, items):
+        if self.signals is not None:
+            self.signals.send_catch_log(items_exported, items=items)
+        if self.stats is not None:
+            self.stats.inc_value('export/batches')
+            self.stats.inc_value('export/rows', len(items))
+
+    def _write_parquet(self, batch):
+        while batch:
+            if self.parquet_writer is None:
+                path = os.path.join(self.export_dir, f'movies-{self.run_id}-{self.parquet_part:05d}.parquet')
+                self.parquet_writer = pq.ParquetWriter(path, self.parquet_schema, compression='zstd')
+            room = self.rotate_rows - self.parquet_rows
+            chunk, batch = batch[:room], batch[room:]
+            columns = {name: [row.get(name) for row in chunk] for name in EXPORT_FIELDS}
+            self.parquet_writer.write_table(pa.table(columns, schema=self.parquet_schema))
+            self.parquet_rows += len(chunk)
+            if self.parquet_rows >= self.rotate_rows:
+                self._close_parquet()
+
+    def _close_parquet(self):
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+            self.parquet_writer = None
+            self.parquet_rows = 0
+            self.parquet_part += 1
+
+
+class CatalogPipeline:
+    # With CATALOG_ENABLED, upserts items into the SQLite catalog at
+    # CATALOG_PATH (see imdbscrapper/catalog.py) in batches of
+    # CATALOG_BATCH_SIZE, committing at least every CATALOG_COMMIT_INTERVAL
+    # seconds so a slow crawl still shows up in the catalog while it runs.
+    # Like StreamingExportPipeline, batches are written one at a time in a
+    # reactor thread.
+    run_in_thread = staticmethod(threads.deferToThread)
+
+    def __init__(self, path, batch_size=1000, commit_interval=5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self.buffer = []
+        self.lock = defer.DeferredLock()
+        self.catalog = None
+        self.loop = None
+        self.stats = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        path = settings.get('CATALOG_PATH')
+        if not settings.getbool('CATALOG_ENABLED') or not path:
+            raise NotConfigured
+        pipeline = cls(
+            path,
+            batch_size=settings.getint('CATALOG_BATCH_SIZE', 1000),
+            commit_interval=settings.getfloat('CATALOG_COMMIT_INTERVAL', 5.0),
+        )
+        pipeline.stats = crawler.stats
+        return pipeline
+
+    def open_spider(self, spider):
+        self.catalog = Catalog(self.path)
+        if self.commit_interval:
+            self.loop = task.LoopingCall(self.flush)
+            self.loop.start(self.commit_interval, now=False)
+
+    def close_spider(self, spider):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        d = self.flush()
+        d.addCallback(lambda _: self.lock.run(self.run_in_thread, self.catalog.close))
+        return d
 
-class ImdbscrapperPipeline:
     def process_item(self, item, spider):
+        if isinstance(item, MovieItem):
+            self.buffer.append(item)
+            if len(self.buffer) >= self.batch_size:
+                return self.flush().addCallback(lambda _: item)
         return item
+
+    def flush(self):
+        if not self.buffer:
+            return defer.succeed(None)
+        batch, self.buffer = self.buffer, []
+        return self.lock.run(self.run_in_thread, self._write_batch, batch)
+
+    def _write_batch(self, batch):
+        try:
+            with timed(self.stats, 'catalog/upsert'):
+                stored = self.catalog.upsert(batch)
+        except Exception as e:
+            logger.error(f"Could not write {len(batch)} items to the catalog at {self.path}: {e}", exc_info=True)
+            if self.stats is not None:
+                self.stats.inc_value('catalog/errors', len(batch))
+            return
+        if self.stats is not None:
+            self.stats.inc_value('catalog/batches')
+            self.stats.inc_value('catalog/rows', stored)
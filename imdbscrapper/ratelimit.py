@@ -0,0 +1,79 @@
+# Token bucket rate limiting shared by every caller of an API in the process.
+#
+# Callers reserve a token and wait out the returned delay, so a steady stream
+# of requests runs just under the configured rate instead of bursting into the
+# server's limit. A 429 with Retry-After pauses the whole bucket. Callers can
+# also reserve several tokens at once, e.g. one per byte written. Each bucket
+# counts the waits it imposed, the seconds waited and its pauses;
+# MetricsExporter copies them into the crawl stats as <name>/ratelimit/*.
+
+import asyncio
+import threading
+import time
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.waits = 0
+        self.wait_time = 0.0
+        self.pauses = 0
+
+    def _reserve(self, tokens=1):
+        with self.lock:
+            now = time.monotonic()
+            if now > self.updated:
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+            self.tokens -= tokens
+            delay = self.updated - now
+            if self.tokens < 0:
+                delay += -self.tokens / self.rate
+            if delay > 0:
+                self.waits += 1
+                self.wait_time += delay
+            return max(delay, 0.0)
+
+    def acquire(self, tokens=1):
+        delay = self._reserve(tokens)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens=1):
+        delay = self._reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+    def counters(self):
+        with self.lock:
+            return {'waits': self.waits, 'wait_seconds': round(self.wait_time, 3), 'pauses': self.pauses}
+
+    def pause(self, seconds):
+        with self.lock:
+            resume_at = time.monotonic() + seconds
+            if resume_at > self.updated:
+                self.updated = resume_at
+                self.tokens = min(self.tokens, 0.0)
+                self.pauses += 1
+
+
+def get_bucket(name, rate, burst=None):
+    with _buckets_lock:
+        bucket = _buckets.get(name)
+        if bucket is None:
+            bucket = _buckets[name] = TokenBucket(rate, burst)
+        return bucket
+
+
+def buckets():
+    with _buckets_lock:
+        return dict(_buckets)
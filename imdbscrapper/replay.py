@@ -0,0 +1,65 @@
+# Recorded IMDb listing pages for offline replay.
+#
+# With LISTING_RECORD enabled the advanced spider stores every search page it
+# lists: the fully expanded page_source in selenium mode ('rendered') or the
+# raw response in http mode ('search'). Windows that were split are stored
+# with only their reported total. Pages are zlib-compressed in one SQLite
+# file (LISTING_STORE_PATH), keyed by the URL's path and query so recordings
+# replay under any IMDB_BASE_URL. `-a listing_mode=replay` then lists
+# partitions from the store without a browser or any IMDb request.
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+RecordedPage = namedtuple('RecordedPage', 'kind total html')
+
+
+def page_key(url):
+    parts = urlsplit(url)
+    return f'{parts.path}?{parts.query}' if parts.query else parts.path
+
+
+class PageStore:
+    def __init__(self, path, compression_level=6):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.compression_level = compression_level
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS pages (key TEXT PRIMARY KEY, kind TEXT NOT NULL, total INTEGER, '
+            'body BLOB, recorded_at REAL NOT NULL)'
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler.settings.get('LISTING_STORE_PATH', '.scrapy/listing_pages.sqlite3'))
+
+    def put(self, url, kind, html, total=None):
+        body = zlib.compress(html.encode('utf-8'), self.compression_level) if html is not None else None
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)',
+                            (page_key(url), kind, total, body, time.time()))
+
+    def get(self, url):
+        with self.lock:
+            row = self.db.execute('SELECT kind, total, body FROM pages WHERE key = ?', (page_key(url),)).fetchone()
+        if row is None:
+            return None
+        kind, total, body = row
+        return RecordedPage(kind, total, zlib.decompress(body).decode('utf-8') if body is not None else None)
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT count(*) FROM pages').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
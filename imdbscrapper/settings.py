@@ -44,27 +44,32 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "imdbscrapper.middlewares.ImdbscrapperSpiderMiddleware": 543,
-#}
+SPIDER_MIDDLEWARES = {
+    "imdbscrapper.middlewares.DedupMiddleware": 100,
+    "imdbscrapper.middlewares.TimingSpiderMiddleware": 950,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "imdbscrapper.middlewares.ImdbscrapperDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    "imdbscrapper.middlewares.TimingDownloaderMiddleware": 950,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+EXTENSIONS = {
+    "imdbscrapper.extensions.MetricsExporter": 500,
+    "imdbscrapper.autoscale.Autoscaler": 510,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    "imdbscrapper.pipelines.ImdbscrapperPipeline": 300,
-#}
+ITEM_PIPELINES = {
+    "imdbscrapper.pipelines.EnrichmentPipeline": 300,
+    "imdbscrapper.pipelines.MediaPipeline": 400,
+    "imdbscrapper.pipelines.StreamingExportPipeline": 800,
+    "imdbscrapper.pipelines.CatalogPipeline": 850,
+}
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/autothrottle.html
@@ -91,3 +96,172 @@ ROBOTSTXT_OBEY = True
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 FEED_EXPORT_ENCODING = "utf-8"
+
+# IMDb origin for search listings; point it at a fixture server to benchmark
+# offline (see imdbscrapper/bench.py).
+#IMDB_BASE_URL = "https://www.imdb.com"
+
+# TMDb API client (see imdbscrapper/tmdb.py). The API key can also be passed
+# as `-a tmdb_api_key=...` or through the TMDB_API_KEY environment variable.
+# A v4 read access token is sent as a bearer header; a v3 key has to go in
+# the query string.
+#TMDB_API_KEY = "your_tmdb_api_key"
+#TMDB_BASE_URL = "https://api.themoviedb.org/3"
+TMDB_MAX_IN_FLIGHT = 20
+TMDB_TIMEOUT = 30
+TMDB_RETRY_TIMES = 5
+# Requests per second allowed through the shared token bucket (0 disables it)
+TMDB_RATE_LIMIT = 40
+#TMDB_RATE_BURST = 40
+# On-disk response cache; TTLs are in seconds per endpoint, "not found"
+# answers expire after the negative TTL
+TMDB_CACHE_ENABLED = True
+TMDB_CACHE_PATH = ".scrapy/tmdb_cache.sqlite3"
+#TMDB_CACHE_TTLS = {"find": 2592000, "movie": 604800, "tv": 604800}
+#TMDB_CACHE_NEGATIVE_TTL = 86400
+TMDB_CACHE_MAX_ENTRIES = 500000
+# New entries are written in one transaction every TMDB_CACHE_FLUSH_INTERVAL
+# seconds and the cache is trimmed to TMDB_CACHE_MAX_ENTRIES every
+# TMDB_CACHE_EVICT_INTERVAL seconds, both from a worker thread
+TMDB_CACHE_FLUSH_INTERVAL = 1.0
+TMDB_CACHE_EVICT_INTERVAL = 60.0
+
+# Listing partitions: years before PARTITION_SPARSE_BEFORE are listed a whole
+# year at a time, later ones a month at a time, and windows reporting more
+# than PARTITION_MAX_RESULTS titles are split in half until they fit. A
+# resumed JOBDIR keeps the cutoff it was started with.
+PARTITION_SPARSE_BEFORE = 1970
+PARTITION_MAX_RESULTS = 1000
+
+# Streaming export: movies.ndjson is appended to across runs and Parquet files
+# rotate every EXPORT_ROTATE_ROWS rows, both under EXPORT_DIR/<spider name>/.
+# Batches are written at EXPORT_BATCH_SIZE items or every
+# EXPORT_FLUSH_INTERVAL seconds, one at a time in a reactor thread; a
+# partition is only committed once its items have been written.
+EXPORT_DIR = "exports"
+EXPORT_FORMATS = ["ndjson", "parquet"]
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FLUSH_INTERVAL = 5
+EXPORT_ROTATE_ROWS = 100000
+
+# Local catalog (off by default): scraped titles are upserted into a SQLite
+# database at CATALOG_PATH keyed by IMDb ID, with genres, keywords, cast and
+# crew in linked tables. Writes are batched CATALOG_BATCH_SIZE items per
+# transaction and committed at least every CATALOG_COMMIT_INTERVAL seconds.
+CATALOG_ENABLED = False
+CATALOG_PATH = "exports/catalog.sqlite3"
+CATALOG_BATCH_SIZE = 1000
+CATALOG_COMMIT_INTERVAL = 5
+
+# Poster and backdrop downloads (off by default). Images are fetched in the
+# MEDIA_SIZE variant (w92 ... w780, original) and stored by content hash under
+# MEDIA_DIR, with MEDIA_DIR/media.sqlite3 mapping each URL to its file.
+# MEDIA_MAX_IN_FLIGHT downloads and MEDIA_MAX_IN_FLIGHT_BYTES of image data
+# are in progress at most, disk writes are capped at
+# MEDIA_MAX_BYTES_PER_SECOND (0 = unlimited), and items only wait once
+# MEDIA_MAX_PENDING downloads are queued.
+MEDIA_ENABLED = False
+MEDIA_DIR = "exports/media"
+MEDIA_SIZE = "w500"
+MEDIA_FIELDS = ["poster_path", "backdrop_path"]
+#MEDIA_IMAGE_BASE_URL = "https://image.tmdb.org/t/p"
+MEDIA_MAX_IN_FLIGHT = 16
+MEDIA_MAX_IN_FLIGHT_BYTES = 33554432
+MEDIA_MAX_BYTES_PER_SECOND = 0
+MEDIA_MAX_PENDING = 1000
+MEDIA_RETRY_TIMES = 3
+MEDIA_TIMEOUT = 60
+
+# TMDb enrichment runs as an item pipeline stage: listing rows are enriched in
+# micro-batches of ENRICH_BATCH_SIZE, or whatever arrived within
+# ENRICH_BATCH_TIMEOUT seconds. Scrapy runs at most CONCURRENT_ITEMS rows of
+# each response through the pipelines at once; ENRICH_MAX_PENDING caps the
+# rows awaiting TMDb across all responses. The advanced spider's browser
+# workers block once ENRICH_QUEUE_DEPTH listed partitions are waiting to be
+# handed over.
+ENRICH_BATCH_SIZE = 50
+ENRICH_BATCH_TIMEOUT = 0.5
+ENRICH_MAX_PENDING = 1000
+ENRICH_QUEUE_DEPTH = 10
+CONCURRENT_ITEMS = 200
+
+# IMDb ID dedup: a Bloom filter sized for DEDUP_CAPACITY IDs at
+# DEDUP_ERROR_RATE false positives (about 18 MB for the defaults), backed by
+# an exact SQLite table in DEDUP_PATH, or JOBDIR when that is unset. Without
+# either, IDs are only deduplicated within one run and the exact table is
+# kept in memory, growing by about 10 MB per million titles scraped.
+# DEDUP_BATCH_SIZE caps how many rows are claimed in one round trip.
+DEDUP_CAPACITY = 10000000
+DEDUP_ERROR_RATE = 0.001
+DEDUP_BATCH_SIZE = 500
+#DEDUP_PATH = ".scrapy/seen_ids.sqlite3"
+
+# Chrome drivers for Selenium listing. Drivers launch headless with the eager
+# page-load strategy and are recycled after DRIVER_MAX_PAGES pages. Images,
+# fonts, stylesheets and ad hosts are blocked through CDP; set
+# DRIVER_BLOCKED_URLS to replace the default pattern list (an empty list
+# disables blocking). A partition whose browser crashes, or whose listing
+# fails for any other reason, is retried up to DRIVER_MAX_PARTITION_ATTEMPTS
+# times (on a fresh driver after a crash) and then counted under
+# partitions/failed and left for the next run. A show-more click that
+# loads nothing within DRIVER_SHOW_MORE_TIMEOUT seconds ends the listing.
+DRIVER_HEADLESS = True
+DRIVER_PAGE_LOAD_STRATEGY = "eager"
+DRIVER_MAX_PAGES = 50
+DRIVER_SHOW_MORE_TIMEOUT = 10
+DRIVER_MAX_PARTITION_ATTEMPTS = 3
+#DRIVER_BLOCKED_URLS = ["*.png", "*.jpg", "*.css"]
+
+# Listing pages are parsed in PARSE_PROCESSES worker processes instead of the
+# crawl process (advance_scrapper only). 0 parses inline; -1 starts one worker
+# per CPU core.
+PARSE_PROCESSES = 0
+
+# Record every listing page the advanced spider loads (zlib-compressed, keyed
+# by URL) into LISTING_STORE_PATH, so `-a listing_mode=replay` can later list
+# the same partitions offline without a browser.
+LISTING_RECORD = False
+LISTING_STORE_PATH = ".scrapy/listing_pages.sqlite3"
+
+# Crawl metrics. Latency histograms and counters live in the crawl stats;
+# every METRICS_INTERVAL seconds MetricsExporter records items/sec and, when
+# configured, writes a JSON snapshot with latency quantiles to
+# METRICS_JSON_PATH and serves Prometheus text on METRICS_HOST:METRICS_PORT.
+METRICS_INTERVAL = 15
+#METRICS_JSON_PATH = "exports/metrics.json"
+#METRICS_PORT = 9410
+METRICS_HOST = "127.0.0.1"
+
+# Feedback-driven autoscaling (see imdbscrapper/autoscale.py). Every
+# AUTOSCALE_INTERVAL seconds the advanced spider's active listing workers and
+# the TMDb in-flight limit grow by one while callers are queueing for them,
+# and are multiplied by AUTOSCALE_DECREASE_FACTOR when a signal is over its
+# target: TMDb p90 latency, 429 or error rate for TMDb; driver page-load p90,
+# restart rate, host CPU or crawl RSS (including browsers) for the workers.
+# num_instances and TMDB_MAX_IN_FLIGHT are the starting points. Each change
+# is logged with its reason.
+AUTOSCALE_ENABLED = False
+AUTOSCALE_INTERVAL = 10
+AUTOSCALE_DECREASE_FACTOR = 0.5
+AUTOSCALE_INSTANCES_MIN = 1
+AUTOSCALE_INSTANCES_MAX = 10
+AUTOSCALE_TMDB_MIN = 2
+AUTOSCALE_TMDB_MAX = 64
+AUTOSCALE_TMDB_LATENCY_TARGET = 1.0
+AUTOSCALE_PAGE_LOAD_TARGET = 10.0
+AUTOSCALE_MAX_ERROR_RATE = 0.05
+AUTOSCALE_MAX_429_RATE = 0.01
+AUTOSCALE_MAX_CPU_PERCENT = 85
+AUTOSCALE_MAX_RSS_MB = 4096
+
+# Distributed crawling (see imdbscrapper/coordination.py). With a shared
+# backend, advance_scrapper processes on several machines split one crawl:
+# partitions are claimed under a lease that each node renews every third of
+# DISTRIBUTED_LEASE_SECONDS, and IMDb IDs are claimed before enrichment. Idle
+# nodes poll every DISTRIBUTED_POLL_INTERVAL seconds for released work.
+#DISTRIBUTED_BACKEND = "redis://localhost:6379/0"
+#DISTRIBUTED_BACKEND = "sqlite:///crawls/shared.sqlite3"
+#DISTRIBUTED_NODE_ID = "node-1"
+DISTRIBUTED_LEASE_SECONDS = 120
+DISTRIBUTED_POLL_INTERVAL = 5
+DISTRIBUTED_NAMESPACE = "imdbscrapper"
@@ -1,17 +1,28 @@
-import requests
+# Selenium, the Chrome driver pool and the TMDb client are imported where
+# they are used, so loading the spider (`scrapy list`, http or replay
+# listing) does not pay for the WebDriver or aiohttp stacks.
+
 import scrapy
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import Counter
 from datetime import datetime, timedelta
-from queue import Queue
-from requests.adapters import HTTPAdapter
-from scrapy.crawler import CrawlerProcess
-from selenium import webdriver
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-from urllib3.util.retry import Retry
+from urllib.parse import urlparse
+from queue import Empty, Queue
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+
+from imdbscrapper import listing
+from imdbscrapper.autoscale import LISTING_WORKERS, ThreadLimit, register_limit
+from imdbscrapper.coordination import coordinator_from_crawler
+from imdbscrapper.dedup import item_duplicate
+from imdbscrapper.items import ListingRow, MovieItem
+from imdbscrapper.metrics import timed
+from imdbscrapper.parsing import ParserPool
+from imdbscrapper.partitions import SPARSE_BEFORE, Window, seed_windows, split_window
+from imdbscrapper.replay import PageStore
+from imdbscrapper.state import JobState, PartitionListed, PartitionTracker, exports_items, items_exported
+from imdbscrapper.workers import ListingWorkerPool
 
 
 class IMDbTMDbSpider(scrapy.Spider):
@@ -35,264 +46,475 @@ class IMDbTMDbSpider(scrapy.Spider):
         'DOWNLOAD_TIMEOUT': 30,
         'COOKIES_ENABLED': False,
         'TELNETCONSOLE_ENABLED': False,
-        'FEEDS': {
-            'movies.json': {
-                'format': 'json',
-                'overwrite': False,
-            },
-            'movies.csv': {
-                'format': 'csv',
-                'overwrite': False,
-            },
-        }
     }
 
-    def __init__(self, tmdb_api_key, num_instances=5, start=2000, end=None, *args, **kwargs):
+    def __init__(self, tmdb_api_key=None, num_instances=5, start=2000, end=None, listing_mode='selenium',
+                 extraction_mode='batch', mode='full', *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if mode not in ('full', 'refresh'):
+            raise ValueError(f"Unknown mode {mode!r}; expected 'full' or 'refresh'")
+        if listing_mode not in ('selenium', 'http', 'replay'):
+            raise ValueError(f"Unknown listing_mode {listing_mode!r}; expected 'selenium', 'http' or 'replay'")
+        if extraction_mode not in ('batch', 'element'):
+            raise ValueError(f"Unknown extraction_mode {extraction_mode!r}; expected 'batch' or 'element'")
         self.tmdb_api_key = tmdb_api_key
-        self.num_instances = num_instances
-        self.base_tmdb_url = "https://api.themoviedb.org/3"
-        self.year_month_queue = Queue()
-        self.executor = ThreadPoolExecutor(max_workers=self.num_instances)
-        self.scraped_years_months = set()
-        self.scraped_imdb_ids = set()
-        self.populate_year_month_queue(start, end)
-        self.session = self.create_session()
-
-    def create_session(self):
-        session = requests.Session()
-        retries = Retry(total=5, backoff_factor=0.1, status_forcelist=[429, 500, 502, 503, 504])
-        adapter = HTTPAdapter(max_retries=retries, pool_connections=100000, pool_maxsize=100000)
-        session.mount('http://', adapter)
-        session.mount('https://', adapter)
-        return session
+        self.mode = mode
+        self.num_instances = int(num_instances)
+        self.listing_mode = listing_mode
+        self.extraction_mode = extraction_mode
+        self.start_year = int(start)
+        self.end_year = int(end) if end is not None else None
+        self.partition_queue = Queue()
+        self.started_at = datetime.now()
+        self.partition_attempts = Counter()
+        self.driver_pool = None
 
-    def start_requests(self):
-        yield scrapy.Request(url='https://www.imdb.com', callback=self.parse, dont_filter=True)
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        from imdbscrapper.tmdb import TMDB_BASE_URL, resolve_api_key
 
-    def parse(self, response):
-        self.logger.info("Starting to scrape...")
-        futures = []
-        for _ in range(self.num_instances):
-            futures.append(self.executor.submit(self.scrape_instance))
-        for future in as_completed(futures):
-            yield from future.result()
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.tmdb_api_key = resolve_api_key(crawler.settings, spider.tmdb_api_key)
+        spider.imdb_base_url = crawler.settings.get('IMDB_BASE_URL', listing.IMDB_BASE_URL).rstrip('/')
+        tmdb_base_url = crawler.settings.get('TMDB_BASE_URL', TMDB_BASE_URL)
+        if spider.allowed_domains:
+            spider.allowed_domains = spider.allowed_domains + [
+                urlparse(spider.imdb_base_url).hostname, urlparse(tmdb_base_url).hostname
+            ]
+        spider.job_state = JobState.from_crawler(crawler)
+        spider.coordinator = coordinator_from_crawler(crawler)
+        if spider.coordinator is not None and spider.mode == 'refresh':
+            raise ValueError("Refresh mode runs on a single node; unset DISTRIBUTED_BACKEND")
+        spider.max_partition_attempts = crawler.settings.getint('DRIVER_MAX_PARTITION_ATTEMPTS', 3)
+        # In distributed mode, finished partitions are committed to the shared backend.
+        spider.tracker = PartitionTracker(spider.coordinator or spider.job_state)
+        spider.max_partition_results = crawler.settings.getint('PARTITION_MAX_RESULTS', 1000)
+        spider.parser_pool = ParserPool.from_crawler(crawler)
+        # num_instances workers list at once. With autoscaling, threads up to
+        # AUTOSCALE_INSTANCES_MAX are started and the Autoscaler moves the limit.
+        spider.max_instances = spider.num_instances
+        if crawler.settings.getbool('AUTOSCALE_ENABLED'):
+            spider.max_instances = max(spider.num_instances, crawler.settings.getint('AUTOSCALE_INSTANCES_MAX', 10))
+        spider.worker_limit = register_limit(LISTING_WORKERS, ThreadLimit(spider.num_instances))
+        # Replay reads listing pages from the store; recording writes them.
+        spider.record_pages = crawler.settings.getbool('LISTING_RECORD') and spider.listing_mode != 'replay'
+        spider.page_store = None
+        if spider.record_pages or spider.listing_mode == 'replay':
+            spider.page_store = PageStore.from_crawler(crawler)
+        if spider.listing_mode == 'replay':
+            spider.logger.info(f"Replaying {len(spider.page_store)} recorded listing pages from {spider.page_store.path}")
+        if spider.mode == 'refresh':
+            # The current month is always re-listed to pick up new titles.
+            spider.completed_partitions = set()
+            spider.enqueue_partition(Window(*listing.month_window(spider.started_at.year, spider.started_at.month)))
+        elif spider.coordinator is not None:
+            spider.completed_partitions = set()
+            spider.coordinator.seed(list(seed_windows(
+                spider.start_year, spider.end_year, crawler.settings.getint('PARTITION_SPARSE_BEFORE', SPARSE_BEFORE)
+            )))
+            spider.logger.info(f"Joined distributed crawl as node {spider.coordinator.node_id}")
+        else:
+            spider.completed_partitions = spider.job_state.completed_partitions()
+            spider.populate_partition_queue(spider.start_year, spider.end_year, spider.sparse_before())
+        if spider.completed_partitions:
+            spider.logger.info(f"Resuming: skipping {len(spider.completed_partitions)} completed partitions")
+        crawler.signals.connect(spider.close_state, signal=signals.spider_closed)
+        crawler.signals.connect(spider.claim_more_partitions, signal=signals.spider_idle)
+        crawler.signals.connect(spider.open_drivers, signal=signals.spider_opened)
+        crawler.signals.connect(spider.close_drivers, signal=signals.spider_closed)
+        crawler.signals.connect(spider.parser_pool.close, signal=signals.spider_closed)
+        if exports_items(crawler.settings):
+            crawler.signals.connect(spider.items_exported, signal=items_exported)
+        else:
+            crawler.signals.connect(spider.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(spider.item_not_scraped, signal=signals.item_dropped)
+        crawler.signals.connect(spider.item_not_scraped, signal=signals.item_error)
+        crawler.signals.connect(spider.item_not_scraped, signal=item_duplicate)
+        return spider
 
-    def scrape_instance(self):
-        driver = webdriver.Chrome()
-        try:
-            while not self.year_month_queue.empty():
-                year, month = self.year_month_queue.get()
-                if (year, month) in self.scraped_years_months:
-                    continue
-                last_day = (datetime(year, month, 28) + timedelta(days=4) - timedelta(days=1)).day
-                url = f'https://www.imdb.com/search/title/?title_type=feature,tv_series&release_date={year}-{month:02d}-01,{year}-{month:02d}-{last_day}&adult=include&count=250'
-                self.logger.info(f"Scraping URL: {url}")
-                try:
-                    driver.get(url)
-                    while self.click_show_more(driver):
-                        pass
-                    WebDriverWait(driver, 10).until(
-                        EC.presence_of_all_elements_located((By.CSS_SELECTOR, 'li.ipc-metadata-list-summary-item'))
-                    )
-                    movie_divs = driver.find_elements(By.CSS_SELECTOR, 'li.ipc-metadata-list-summary-item')
-                    self.logger.info(f"Found {len(movie_divs)} movie items after fully loading the page.")
-                    futures = []
-                    for movie_div in movie_divs:
-                        movie_data = self.get_movie_data(movie_div)
-                        if movie_data and movie_data['imdb_id'] not in self.scraped_imdb_ids:
-                            futures.append(self.executor.submit(self.process_movie, movie_data))
-                    for future in as_completed(futures):
-                        result = future.result()
-                        if result:
-                            self.scraped_imdb_ids.add(result['imdb_id'])
-                            yield result
-                    self.scraped_years_months.add((year, month))
-                except WebDriverException as e:
-                    self.logger.error(f"WebDriverException encountered: {e}")
-                except Exception as e:
-                    self.logger.error(f"Unexpected error: {e}")
-        finally:
-            driver.quit()
+    def close_state(self, reason):
+        if reason == 'finished':
+            self.job_state.set_meta('last_run_started_at', self.started_at.isoformat(timespec='seconds'))
+        self.job_state.close()
+        if self.page_store is not None:
+            self.page_store.close()
+        if self.coordinator is not None:
+            self.coordinator.close()
 
-    def process_movie(self, movie_data):
-        if self.is_valid_movie(movie_data):
-            tmdb_data = self.fetch_tmdb_data(movie_data)
-            if tmdb_data:
-                return self.clean_movie_data(tmdb_data, movie_data)
-        return None
+    def open_drivers(self):
+        if self.listing_mode != 'selenium':
+            return
+        from imdbscrapper.drivers import DriverPool
 
-    def populate_year_month_queue(self, start, end=None):
-        if end is None:
-            current_year = datetime.now().year
-            current_month = datetime.now().month
-        else:
-            current_year = end
-            current_month = 12
+        self.driver_pool = DriverPool.from_crawler(self.crawler)
 
-        for year in range(start, current_year + 1):
-            last_month = current_month if year == current_year else 12
+    def close_drivers(self):
+        if self.driver_pool is not None:
+            self.driver_pool.close()
 
-            for month in range(1, last_month + 1):
-                self.year_month_queue.put((year, month))
+    def item_scraped(self, item):
+        self.tracker.item_done(ItemAdapter(item).get('imdb_id'))
+        if isinstance(item, MovieItem):
+            self.job_state.remember_title(item)
 
-    def get_movie_data(self, movie_div):
-        selectors = {
-            'title': 'h3.ipc-title__text',
-            'year': 'span.dli-title-metadata-item:nth-of-type(1)',
-            'movie_url': 'a.ipc-lockup-overlay',
-            'imdb_rating': 'span.ipc-rating-star--rating',
-            'imdb_votes': 'span.ipc-rating-star--voteCount',
-            'metascore': 'span.metacritic-score-box'
-        }
-        movie_data = {}
-        for key, selector in selectors.items():
-            try:
-                element = movie_div.find_element(By.CSS_SELECTOR, selector)
-                if key == 'movie_url':
-                    movie_data[key] = element.get_attribute('href')
-                elif key == 'imdb_votes':
-                    movie_data[key] = self.convert_votes(element.text)
-                elif key in ['imdb_rating', 'metascore']:
-                    movie_data[key] = self.convert_to_float(element.text)
-                else:
-                    movie_data[key] = element.text
-            except NoSuchElementException:
-                movie_data[key] = None
-        movie_data['imdb_id'] = movie_data['movie_url'].split('/')[-2] if movie_data.get('movie_url') else None
-        return movie_data
+    def items_exported(self, items):
+        for item in items:
+            self.item_scraped(item)
 
-    @staticmethod
-    def convert_votes(votes_str):
-        if not votes_str:
-            return None
-        votes_str = votes_str.replace('(', '').replace(')', '').replace(',', '').lower()
-        if 'k' in votes_str:
-            return int(float(votes_str.replace('k', '')) * 1000)
-        elif 'm' in votes_str:
-            return int(float(votes_str.replace('m', '')) * 1000000)
-        return int(votes_str) if votes_str.isdigit() else None
+    def item_not_scraped(self, item):
+        adapter = ItemAdapter(item)
+        self.tracker.item_done(adapter.get('imdb_id'), adapter.get('partition'))
 
-    @staticmethod
-    def convert_to_float(value):
+    def enqueue_partition(self, window):
+        if window.key not in self.completed_partitions:
+            self.partition_queue.put(window)
+
+    def next_partition(self):
+        # Windows this process already holds (halves of a split, retries)
+        # come first. In distributed mode the shared queue is claimed next.
         try:
-            return float(value)
-        except (ValueError, TypeError):
+            return self.partition_queue.get_nowait()
+        except Empty:
+            pass
+        if self.coordinator is None:
             return None
+        window = self.coordinator.claim_partition()
+        if window is not None:
+            self.crawler.stats.inc_value('distributed/partitions_claimed')
+        return window
 
-    @staticmethod
-    def is_valid_movie(movie_data):
-        return movie_data.get('title') and movie_data.get('imdb_id')
+    def wait_for_partitions(self):
+        # Called by a listing worker that found no partition, without a
+        # worker_limit slot held. In distributed mode, sleeps for one poll
+        # interval while other nodes still hold partitions; returns False
+        # once there is nothing left to wait for.
+        if self.coordinator is None or self.coordinator.drained():
+            return False
+        time.sleep(self.coordinator.poll_interval)
+        return True
+
+    def claim_more_partitions(self):
+        # Keeps a distributed http crawl open while other nodes still hold
+        # partitions that may come back to the shared queue.
+        if self.coordinator is None or self.listing_mode != 'http':
+            return
+        for _ in range(self.num_instances):
+            window = self.next_partition()
+            if window is None:
+                break
+            self.crawler.engine.crawl(self.listing_request(window))
+        if not self.coordinator.drained():
+            raise DontCloseSpider
+
+    def split_dense_partition(self, window, total, limit):
+        # Returns None when the window fits and should be listed as is,
+        # otherwise the halves that still need listing (possibly none).
+        if not total or total <= limit:
+            return None
+        halves = split_window(window)
+        if not halves:
+            self.logger.warning(f"Partition {window} reports {total} titles but cannot be split further")
+            return None
+        self.logger.info(f"Splitting partition {window} ({total} titles > {limit}) into {halves[0]} and {halves[1]}")
+        self.crawler.stats.inc_value('partitions/split')
+        if self.coordinator is not None:
+            return self.coordinator.split(window, halves)
+        return [half for half in halves if half.key not in self.completed_partitions]
 
-    def click_show_more(self, driver):
+    def listing_request(self, window, start=1):
+        # JobState decides which partitions are listed again; Scrapy's
+        # dupefilter, persisted in JOBDIR, would drop the listing requests of
+        # partitions a killed run had requested but never committed.
+        return scrapy.Request(
+            url=listing.search_url(window.start, window.end, base_url=self.imdb_base_url, start=start),
+            callback=self.parse_listing,
+            errback=self.listing_failed,
+            cb_kwargs={'window': window, 'start': start},
+            dont_filter=True,
+        )
+
+    def listing_failed(self, failure):
+        # A search page that failed for good (an HTTP error, or retries used
+        # up) counts as one attempt at its partition. HTTP listing has no
+        # worker thread to take retries off the queue, so the page is asked
+        # for again from here.
+        window, start = failure.request.cb_kwargs['window'], failure.request.cb_kwargs['start']
+        self.logger.error(f"Listing {failure.request.url} failed: {failure.value!r}")
+        if self.count_partition_attempt(window):
+            yield self.listing_request(window, start)
+
+    def start_requests(self):
+        if self.mode == 'refresh':
+            # The feeds are read through the TMDb client, which authenticates
+            # like enrichment and shares its rate limit.
+            yield scrapy.Request(url='data:,', callback=self.parse_changes, dont_filter=True)
+        if self.listing_mode == 'http':
+            while (window := self.next_partition()) is not None:
+                yield self.listing_request(window)
+            return
+        if self.listing_mode == 'replay':
+            # A data: URL starts the replay workers without contacting IMDb.
+            yield scrapy.Request(url='data:,', callback=self.parse, dont_filter=True)
+            return
+        yield scrapy.Request(url=self.imdb_base_url, callback=self.parse, dont_filter=True)
+
+    async def parse_changes(self, response):
+        # Covers everything since the last finished run started; without one,
+        # falls back to the past day like the feeds themselves do.
+        from imdbscrapper.tmdb import TMDbClient, changes_windows
+
+        last_run = self.job_state.get_meta('last_run_started_at')
+        until = self.started_at.date()
+        since = datetime.fromisoformat(last_run).date() if last_run else until - timedelta(days=1)
+        self.logger.info(f"Refreshing titles TMDb reports as changed between {since} and {until}")
+        client = TMDbClient.from_crawler(self.crawler, self.tmdb_api_key)
         try:
-            show_more_button = WebDriverWait(driver, 5).until(
-                EC.element_to_be_clickable((By.CSS_SELECTOR, 'button.ipc-see-more__button'))
-            )
-            driver.execute_script("arguments[0].click();", show_more_button)
-            time.sleep(1)
+            for start_date, end_date in changes_windows(since, until):
+                for media_type in ('movie', 'tv'):
+                    changed = await client.changes(media_type, start_date, end_date)
+                    known = self.job_state.known_titles(media_type, changed)
+                    self.crawler.stats.inc_value(f'refresh/{media_type}/changed', len(changed))
+                    self.crawler.stats.inc_value(f'refresh/{media_type}/known', len(known))
+                    for row in known:
+                        yield row
+        finally:
+            await client.close()
+
+    async def parse_listing(self, response, window, start=1):
+        # Windows denser than one search page are split on their first page;
+        # one that cannot be split further is listed page by page, and the
+        # partition only finishes listing with its last page.
+        rows, total = await self.parser_pool.search_results(response, self.imdb_base_url)
+        halves = None
+        if start == 1:
+            halves = self.split_dense_partition(window, total,
+                                                min(self.max_partition_results, listing.SEARCH_PAGE_SIZE))
+        if self.record_pages:
+            self.page_store.put(response.url, 'search', response.text if halves is None else None, total)
+        if halves is not None:
+            for half in halves:
+                yield self.listing_request(half)
+            return
+        self.logger.info(f"Found {len(rows)} movie items in {response.url}")
+        next_start = listing.next_page_start(start, len(rows), total)
+        if next_start is None:
+            self.count_unlisted(response.url, total, listing.unlisted_titles(start, len(rows), total))
+        for item in self.listed_items(PartitionListed(window.key, rows), finished=next_start is None):
+            yield item
+        if next_start is not None:
+            yield self.listing_request(window, next_start)
+
+    async def parse(self, response):
+        if self.listing_mode == 'replay':
+            target = self.replay_instance
+            self.logger.info(f"Starting to replay with {self.num_instances} workers...")
+        else:
+            target = self.scrape_instance
+            self.logger.info(f"Starting to scrape with {self.num_instances} browser instances...")
+        pool = ListingWorkerPool(target, self.max_instances, self.settings.getint('ENRICH_QUEUE_DEPTH', 10)).start()
+        async for listed in pool.drain():
+            for item in self.listed_items(listed):
+                yield item
+
+    def listed_items(self, listed, finished=True):
+        # Hands the titles of a listed partition to the dedup middleware and
+        # enrichment pipeline, recording them so the partition commits once
+        # they are all done. `finished` is False for all but the last page.
+        for movie_data in listed.rows:
+            if movie_data and self.is_valid_movie(movie_data):
+                self.tracker.track(listed.key, movie_data['imdb_id'])
+                yield ListingRow(**movie_data, partition=listed.key)
+        if finished:
+            self.tracker.finish_listing(listed.key)
+
+    def count_unlisted(self, source, total, unlisted):
+        if unlisted:
+            self.logger.warning(f"{source} reports {total} titles but the listing ended {unlisted} short")
+            self.crawler.stats.inc_value('listing/truncated', unlisted)
+
+    def retry_partition(self, window):
+        if self.count_partition_attempt(window):
+            self.partition_queue.put(window)
+
+    def count_partition_attempt(self, window):
+        # Returns whether a failed partition should be tried again. A
+        # partition given up on is left uncommitted, so the next run over the
+        # same JOBDIR lists it again; in distributed mode it is marked failed
+        # so the other nodes stop waiting for it.
+        self.partition_attempts[window.key] += 1
+        if self.partition_attempts[window.key] < self.max_partition_attempts:
+            self.crawler.stats.inc_value('partitions/retried')
             return True
-        except (TimeoutException, NoSuchElementException):
-            return False
+        self.logger.error(f"Giving up on partition {window} after {self.partition_attempts[window.key]} attempts")
+        self.crawler.stats.inc_value('partitions/failed')
+        if self.coordinator is not None:
+            self.coordinator.fail_partition(window.key)
+        return False
 
-    def fetch_tmdb_data(self, movie_data):
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            tmdb_id_future = executor.submit(self.get_tmdb_movie_id, movie_data['imdb_id'])
-            tmdb_id = tmdb_id_future.result()
-            if tmdb_id:
-                movie_data_future = executor.submit(self.get_movie_data_tmdb, tmdb_id)
-                trailer_future = executor.submit(self.get_trailer_link, tmdb_id)
-                tmdb_data = movie_data_future.result()
-                trailer_link = trailer_future.result()
-                if tmdb_data:
-                    tmdb_data['trailer_link'] = trailer_link
-                    return tmdb_data
-        return None
+    def scrape_instance(self, worker_id):
+        # Each partition is listed while holding a worker_limit slot and a
+        # driver; listed rows are handed off after both are given back.
+        while True:
+            with self.worker_limit:
+                window = self.next_partition()
+                if window is not None:
+                    driver = self.driver_pool.acquire()
+                    try:
+                        listed = self.scrape_partition(driver, window, worker_id)
+                    finally:
+                        self.driver_pool.release(driver)
+            if window is None:
+                if self.wait_for_partitions():
+                    continue
+                break
+            # Browsers beyond the current limit are shut down to free their memory.
+            self.driver_pool.trim(self.worker_limit.limit)
+            if listed is not None:
+                yield listed
 
-    def get_tmdb_movie_id(self, imdb_id):
-        try:
-            tmdb_url = f"{self.base_tmdb_url}/find/{imdb_id}"
-            params = {'api_key': self.tmdb_api_key, 'external_source': 'imdb_id'}
-            response = self.session.get(tmdb_url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            if data.get('movie_results'):
-                return data['movie_results'][0]['id']
-            elif data.get('tv_results'):
-                return data['tv_results'][0]['id']
-        except requests.RequestException as e:
-            self.logger.error(f"Error fetching TMDb ID: {e}")
-        return None
+    def scrape_partition(self, driver, window, worker_id):
+        from selenium.common.exceptions import WebDriverException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
 
-    def get_movie_data_tmdb(self, tmdb_id):
+        url = listing.search_url(window.start, window.end, base_url=self.imdb_base_url)
+        self.logger.info(f"[worker {worker_id}] Scraping URL: {url}")
         try:
-            tmdb_url = f"{self.base_tmdb_url}/movie/{tmdb_id}"
-            params = {'api_key': self.tmdb_api_key}
-            response = self.session.get(tmdb_url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            self.logger.error(f"Error fetching TMDb movie data: {e}")
+            driver.get(url)
+            total = self.parser_pool.search_total(driver.page_source)
+            halves = self.split_dense_partition(window, total, self.max_partition_results)
+            if halves is not None:
+                if self.record_pages:
+                    self.page_store.put(url, 'rendered', None, total)
+                for half in halves:
+                    self.partition_queue.put(half)
+                return None
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_all_elements_located((By.CSS_SELECTOR, listing.ITEM_SELECTOR))
+            )
+            while self.click_show_more(driver, total):
+                pass
+            rows = self.extract_rows(driver)
+            self.logger.info(f"Found {len(rows)} movie items after fully loading the page.")
+            self.count_unlisted(url, total, listing.unlisted_titles(1, len(rows), total))
+            if self.record_pages:
+                self.page_store.put(url, 'rendered', driver.page_source, total)
+            return PartitionListed(window.key, rows)
+        except WebDriverException as e:
+            self.logger.error(f"WebDriverException encountered: {e}")
+            self.retry_partition(window)
+            driver.restart()
+        except Exception:
+            self.logger.exception(f"[worker {worker_id}] Unexpected error listing partition {window}")
+            self.retry_partition(window)
         return None
 
-    def get_trailer_link(self, tmdb_id):
-        try:
-            tmdb_url = f"{self.base_tmdb_url}/movie/{tmdb_id}/videos"
-            params = {'api_key': self.tmdb_api_key}
-            response = self.session.get(tmdb_url, params=params)
-            response.raise_for_status()
-            video_data = response.json().get('results', [])
-            if video_data:
-                for video in video_data:
-                    if video['type'].lower() == 'trailer':
-                        return f"https://www.youtube.com/watch?v={video['key']}"
-        except requests.RequestException as e:
-            self.logger.error(f"Error fetching TMDb trailer data: {e}")
-        return None
+    def replay_instance(self, worker_id):
+        while True:
+            with self.worker_limit:
+                window = self.next_partition()
+                if window is not None:
+                    listed = self.replay_partition(window, worker_id)
+            if window is None:
+                if self.wait_for_partitions():
+                    continue
+                break
+            if listed is not None:
+                yield listed
+
+    def replay_partition(self, window, worker_id):
+        # Lists a partition from its recorded page, applying the same split
+        # rules as the mode that recorded it.
+        url = listing.search_url(window.start, window.end, base_url=self.imdb_base_url)
+        page = self.page_store.get(url)
+        if page is None:
+            self.logger.warning(f"[worker {worker_id}] No recorded page for partition {window}")
+            self.crawler.stats.inc_value('replay/missing')
+            return None
+        limit = self.max_partition_results
+        if page.kind == 'search':
+            limit = min(limit, listing.SEARCH_PAGE_SIZE)
+        halves = self.split_dense_partition(window, page.total, limit)
+        if halves is not None:
+            for half in halves:
+                self.partition_queue.put(half)
+            return None
+        if page.html is None:
+            self.logger.warning(f"[worker {worker_id}] Partition {window} was split when it was recorded")
+            self.crawler.stats.inc_value('replay/missing')
+            return None
+        if page.kind == 'search':
+            rows = self.replay_search_pages(window, page, worker_id)
+        else:
+            with timed(self.crawler.stats, 'listing/extract'):
+                rows = self.parser_pool.rendered_rows(page.html, self.imdb_base_url)
+            self.crawler.stats.inc_value('replay/pages')
+            self.count_unlisted(url, page.total, listing.unlisted_titles(1, len(rows), page.total))
+        return PartitionListed(window.key, rows)
+
+    def replay_search_pages(self, window, page, worker_id):
+        # Follows the recorded pages of a search listed page by page.
+        rows, start = [], 1
+        while True:
+            with timed(self.crawler.stats, 'listing/extract'):
+                page_rows, _ = self.parser_pool.search_page(page.html, self.imdb_base_url)
+            self.crawler.stats.inc_value('replay/pages')
+            rows += page_rows
+            next_start = listing.next_page_start(start, len(page_rows), page.total)
+            if next_start is None:
+                break
+            url = listing.search_url(window.start, window.end, base_url=self.imdb_base_url, start=next_start)
+            next_page = self.page_store.get(url)
+            if next_page is None or next_page.html is None:
+                self.logger.warning(f"[worker {worker_id}] No recorded page for {url}")
+                self.crawler.stats.inc_value('replay/missing')
+                break
+            page, start = next_page, next_start
+        self.count_unlisted(f'Partition {window}', page.total, listing.unlisted_titles(1, len(rows), page.total))
+        return rows
+
+    def sparse_before(self):
+        # A JOBDIR keeps the PARTITION_SPARSE_BEFORE it was started with:
+        # another cutoff would give the early partitions new keys and list
+        # their committed titles again.
+        configured = self.settings.getint('PARTITION_SPARSE_BEFORE', SPARSE_BEFORE)
+        stored = self.job_state.get_meta('partition_sparse_before')
+        if stored is not None and int(stored) != configured:
+            self.logger.warning(f"Keeping PARTITION_SPARSE_BEFORE={stored} from the crawl being resumed "
+                                f"instead of {configured}")
+            return int(stored)
+        self.job_state.set_meta('partition_sparse_before', str(configured))
+        return configured
+
+    def populate_partition_queue(self, start, end=None, sparse_before=SPARSE_BEFORE):
+        for window in seed_windows(start, end, sparse_before):
+            self.enqueue_partition(window)
+
+    def extract_rows(self, driver):
+        with timed(self.crawler.stats, 'listing/extract'):
+            if self.extraction_mode == 'batch':
+                return self.parser_pool.rendered_rows(driver.page_source, self.imdb_base_url)
+            from selenium.webdriver.common.by import By
 
-    def clean_movie_data(self, tmdb_data, imdb_data):
-        cleaned = {
-            'title': tmdb_data.get('title', imdb_data.get('title')),
-            'original_title': tmdb_data.get('original_title'),
-            'imdb_id': tmdb_data.get('imdb_id', imdb_data.get('imdb_id')),
-            'tmdb_id': tmdb_data.get('id'),
-            'year': imdb_data.get('year'),
-            'release_date': tmdb_data.get('release_date'),
-            'runtime': tmdb_data.get('runtime'),
-            'poster_path': f"https://image.tmdb.org/t/p/original{tmdb_data.get('poster_path', '')}" if tmdb_data.get(
-                'poster_path') else None,
-            'backdrop_path': f"https://image.tmdb.org/t/p/original{tmdb_data.get('backdrop_path', '')}" if tmdb_data.get(
-                'backdrop_path') else None,
-            'homepage': tmdb_data.get('homepage'),
-            'imdb_rating': imdb_data.get('imdb_rating'),
-            'imdb_votes': imdb_data.get('imdb_votes'),
-            'imdb_metascore': imdb_data.get('metascore'),
-            'tmdb_vote_average': float(tmdb_data.get('vote_average')) if tmdb_data.get(
-                'vote_average') is not None else None,
-            'tmdb_vote_count': int(tmdb_data.get('vote_count')) if tmdb_data.get('vote_count') is not None else None,
-            'genres': [genre['name'] for genre in tmdb_data.get('genres', [])],
-            'overview': tmdb_data.get('overview'),
-            'tagline': tmdb_data.get('tagline'),
-            'budget': tmdb_data.get('budget'),
-            'revenue': tmdb_data.get('revenue'),
-            'adult': tmdb_data.get('adult'),
-            'original_language': tmdb_data.get('original_language'),
-            'popularity': float(tmdb_data.get('popularity')) if tmdb_data.get('popularity') is not None else None,
-            'status': tmdb_data.get('status'),
-            'origin_country': tmdb_data.get('origin_country', []),
-            'production_companies': [company['name'] for company in tmdb_data.get('production_companies', [])],
-            'production_countries': [country['name'] for country in tmdb_data.get('production_countries', [])],
-            'spoken_languages': [lang['english_name'] for lang in tmdb_data.get('spoken_languages', [])],
-            'cast': [cast_member['name'] for cast_member in tmdb_data.get('credits', {}).get('cast', [])][:10],
-            'crew': [crew_member['name'] for crew_member in tmdb_data.get('credits', {}).get('crew', [])][:10],
-            'keywords': [keyword['name'] for keyword in tmdb_data.get('keywords', {}).get('keywords', [])],
-            'trailer_link': tmdb_data.get('trailer_link'),
-            'scraped_at': datetime.now().isoformat(),
-        }
-        return cleaned
+            movie_divs = driver.find_elements(By.CSS_SELECTOR, listing.ITEM_SELECTOR)
+            return [self.get_movie_data(movie_div) for movie_div in movie_divs]
+
+    def get_movie_data(self, movie_div):
+        return listing.row_from_element(movie_div)
+
+    @staticmethod
+    def is_valid_movie(movie_data):
+        return movie_data.get('title') and movie_data.get('imdb_id')
+
+    def click_show_more(self, driver, total=None):
+        result = driver.show_more(total)
+        if result.clicked and result.after <= result.before:
+            self.logger.warning(f"Show more loaded nothing after {result.seconds:.1f}s at {result.after} items")
+        return result.after > result.before
 
 
 if __name__ == '__main__':
-    process = CrawlerProcess()
-    process.crawl(IMDbTMDbSpider, tmdb_api_key="your_tmdb_api_key", num_instances=3, start=1950)
-    process.start()
+    from imdbscrapper.cli import main
+
+    main(['crawl', IMDbTMDbSpider.name, '--num-instances', '3', '--start', '1950'])
@@ -0,0 +1,166 @@
+# Durable crawl state for resumable jobs.
+#
+# Completed partitions are committed to SQLite as soon as every title listed
+# for them is done, so a crawl killed at any point resumes from the last
+# finished partition; titles it already scraped are skipped by the dedup
+# index (imdbscrapper/dedup.py). With StreamingExportPipeline enabled, a
+# scraped title only counts as done once its batch has been written to the
+# export and recorded in the dedup index, so a partition is never committed
+# ahead of its rows. The TMDb IDs of scraped titles, written in the same
+# transaction as each partition, and the time of the last finished run are
+# kept for refresh mode. State lives in JOBDIR when it is set, otherwise in
+# memory for this run only.
+
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+
+from scrapy.utils.conf import build_component_list
+
+from imdbscrapper.items import ListingRow
+
+STATE_FILENAME = 'crawl_state.sqlite3'
+
+# Sent by listing workers with every row of a fully listed partition.
+PartitionListed = namedtuple('PartitionListed', 'key rows')
+
+# Sent by StreamingExportPipeline with each batch of items once it is
+# written out and its IMDb IDs are recorded.
+items_exported = object()
+
+
+def exports_items(settings):
+    pipelines = build_component_list(settings.getwithbase('ITEM_PIPELINES'))
+    return any(getattr(pipeline, '__name__', str(pipeline)).rsplit('.', 1)[-1] == 'StreamingExportPipeline'
+               for pipeline in pipelines)
+
+
+class JobState:
+    def __init__(self, path=None):
+        self.path = path or ':memory:'
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=FULL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS partitions (key TEXT PRIMARY KEY, completed_at REAL NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS titles ('
+            'media_type TEXT NOT NULL, tmdb_id INTEGER NOT NULL, imdb_id TEXT NOT NULL, title TEXT, year TEXT, '
+            'imdb_rating REAL, imdb_votes INTEGER, metascore REAL, PRIMARY KEY (media_type, tmdb_id))'
+        )
+        self.unwritten_titles = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        jobdir = crawler.settings.get('JOBDIR')
+        return cls(os.path.join(jobdir, STATE_FILENAME) if jobdir else None)
+
+    def completed_partitions(self):
+        with self.lock:
+            return {key for (key,) in self.db.execute('SELECT key FROM partitions')}
+
+    def complete_partition(self, key):
+        with self.lock:
+            self._flush_titles(partition=key)
+
+    def get_meta(self, name, default=None):
+        with self.lock:
+            row = self.db.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, name, value):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)', (name, value))
+
+    def remember_title(self, item):
+        if item.tmdb_id is None or item.media_type is None:
+            return
+        with self.lock:
+            self.unwritten_titles.append((
+                item.media_type, item.tmdb_id, item.imdb_id, item.title, item.year,
+                item.imdb_rating, item.imdb_votes, item.imdb_metascore,
+            ))
+            if len(self.unwritten_titles) >= 1000:
+                self._flush_titles()
+
+    def _flush_titles(self, partition=None):
+        # Also marks `partition` done, in the same transaction.
+        if not self.unwritten_titles and partition is None:
+            return
+        self.db.execute('BEGIN')
+        self.db.executemany('INSERT OR REPLACE INTO titles VALUES (?, ?, ?, ?, ?, ?, ?, ?)', self.unwritten_titles)
+        if partition is not None:
+            self.db.execute('INSERT OR REPLACE INTO partitions (key, completed_at) VALUES (?, ?)',
+                            (partition, time.time()))
+        self.db.execute('COMMIT')
+        self.unwritten_titles = []
+
+    def known_titles(self, media_type, tmdb_ids):
+        # Returns refresh rows for the given TMDb IDs that earlier runs scraped.
+        tmdb_ids = list(tmdb_ids)
+        rows = []
+        with self.lock:
+            self._flush_titles()
+            for start in range(0, len(tmdb_ids), 500):
+                chunk = tmdb_ids[start:start + 500]
+                rows.extend(self.db.execute(
+                    'SELECT tmdb_id, imdb_id, title, year, imdb_rating, imdb_votes, metascore FROM titles '
+                    f'WHERE media_type = ? AND tmdb_id IN ({",".join("?" * len(chunk))})',
+                    (media_type, *chunk),
+                ))
+        return [
+            ListingRow(
+                imdb_id=imdb_id, title=title, year=year, imdb_rating=imdb_rating, imdb_votes=imdb_votes,
+                metascore=metascore, tmdb_id=tmdb_id, media_type=media_type, refresh=True,
+            )
+            for tmdb_id, imdb_id, title, year, imdb_rating, imdb_votes, metascore in rows
+        ]
+
+    def close(self):
+        with self.lock:
+            self._flush_titles()
+            self.db.close()
+
+
+class PartitionTracker:
+    # Commits a partition only once its listing has finished and every row
+    # handed to the engine for it has been scraped, dropped, failed or
+    # discarded as a duplicate. A title listed under several partitions is
+    # counted in each; scraped items are matched to the first of them.
+
+    def __init__(self, state):
+        self.state = state
+        self.pending = defaultdict(Counter)
+        self.listed = set()
+        self.item_partitions = {}
+
+    def track(self, key, imdb_id):
+        self.pending[key][imdb_id] += 1
+        self.item_partitions.setdefault(imdb_id, key)
+
+    def finish_listing(self, key):
+        self.listed.add(key)
+        self._maybe_commit(key)
+
+    def item_done(self, imdb_id, key=None):
+        key = key or self.item_partitions.get(imdb_id)
+        pending = self.pending.get(key)
+        if not pending or not pending[imdb_id]:
+            return
+        pending[imdb_id] -= 1
+        if not pending[imdb_id]:
+            del pending[imdb_id]
+            if self.item_partitions.get(imdb_id) == key:
+                del self.item_partitions[imdb_id]
+        self._maybe_commit(key)
+
+    def _maybe_commit(self, key):
+        if key in self.listed and not self.pending[key]:
+            self.state.complete_partition(key)
+            self.listed.discard(key)
+            del self.pending[key]
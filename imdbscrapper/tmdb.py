@@ -0,0 +1,312 @@
+# Shared asyncio client for the TMDb API.
+#
+# One aiohttp session (keep-alive connection pool) is used for every request,
+# a resizable limit caps the number of requests in flight (the Autoscaler in
+# imdbscrapper/autoscale.py may move it at runtime) and a process-wide token
+# bucket (imdbscrapper/ratelimit.py) paces them. The enrichment pipeline
+# awaits the coroutines on the reactor's asyncio loop. Request latency is
+# recorded per endpoint in the tmdb/latency/<endpoint> histograms. Cache
+# lookups run in a worker thread; new entries are buffered, then written and
+# the cache trimmed by a background task every TMDB_CACHE_FLUSH_INTERVAL and
+# TMDB_CACHE_EVICT_INTERVAL seconds. aiohttp is only imported once the first
+# request is made, so the spiders can use the URL helpers below without
+# loading it.
+
+import asyncio
+import logging
+import os
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+
+from imdbscrapper.autoscale import TMDB_IN_FLIGHT, AsyncLimit, register_limit
+from imdbscrapper.cache import DAY, ResponseCache
+from imdbscrapper.metrics import observe
+from imdbscrapper.ratelimit import get_bucket
+
+logger = logging.getLogger(__name__)
+
+TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DETAILS_APPEND = 'credits,keywords,videos'
+TV_TITLE_TYPES = {'tvSeries', 'tvMiniSeries'}
+CACHE_TTLS = {'find': 30 * DAY, 'movie': 7 * DAY, 'tv': 7 * DAY}
+# /movie/changes and /tv/changes accept at most this many days per query.
+CHANGES_MAX_DAYS = 14
+
+# Marks failed requests so they are not cached as "not found".
+_UNCACHEABLE = object()
+
+
+def resolve_api_key(settings, api_key=None):
+    # An explicit key (spider argument) wins over the TMDB_API_KEY setting,
+    # which wins over the TMDB_API_KEY environment variable.
+    api_key = api_key or settings.get('TMDB_API_KEY') or os.environ.get('TMDB_API_KEY')
+    if not api_key:
+        raise ValueError("No TMDb API key: pass -a tmdb_api_key=..., set TMDB_API_KEY in the settings "
+                         "or export TMDB_API_KEY")
+    return api_key
+
+
+def changes_windows(since, until, max_days=CHANGES_MAX_DAYS):
+    # Splits [since, until] into the date ranges the changes feeds accept.
+    while since <= until:
+        end = min(since + timedelta(days=max_days - 1), until)
+        yield since, end
+        since = end + timedelta(days=1)
+
+
+def auth(api_key):
+    # Returns the (headers, query params) that authenticate a request. v4
+    # read access tokens (JWTs) go in a bearer header; v3 API keys can only
+    # be sent as the api_key query parameter, so logged errors are redacted.
+    if api_key.startswith('eyJ'):
+        return {'Authorization': f'Bearer {api_key}'}, {}
+    return {}, {'api_key': api_key}
+
+
+def redact(text, api_key):
+    return str(text).replace(api_key, '<api_key>') if api_key else str(text)
+
+
+class TMDbClient:
+    def __init__(self, api_key, base_url=TMDB_BASE_URL, max_in_flight=20, timeout=30, retry_times=5,
+                 rate_limit=40, rate_burst=None, cache=None, cache_flush_interval=1.0, cache_evict_interval=60.0,
+                 stats=None):
+        self.api_key = api_key
+        self.auth_headers, self.auth_params = auth(api_key)
+        self.base_url = base_url.rstrip('/')
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.retry_times = retry_times
+        self.stats = stats
+        self.bucket = get_bucket('tmdb', rate_limit, rate_burst) if rate_limit else None
+        self.cache = cache
+        self.cache_flush_interval = cache_flush_interval
+        self.cache_evict_interval = cache_evict_interval
+        self.cache_task = None
+        self.session = None
+        self.limit = None
+
+    @classmethod
+    def from_crawler(cls, crawler, api_key):
+        settings = crawler.settings
+        cache = None
+        if settings.getbool('TMDB_CACHE_ENABLED', True):
+            cache = ResponseCache(
+                settings.get('TMDB_CACHE_PATH', '.scrapy/tmdb_cache.sqlite3'),
+                ttls={**CACHE_TTLS, **settings.getdict('TMDB_CACHE_TTLS')},
+                negative_ttl=settings.getint('TMDB_CACHE_NEGATIVE_TTL', DAY),
+                max_entries=settings.getint('TMDB_CACHE_MAX_ENTRIES', 500000),
+            )
+        return cls(
+            api_key,
+            base_url=settings.get('TMDB_BASE_URL', TMDB_BASE_URL),
+            max_in_flight=settings.getint('TMDB_MAX_IN_FLIGHT', 20),
+            timeout=settings.getfloat('TMDB_TIMEOUT', 30),
+            retry_times=settings.getint('TMDB_RETRY_TIMES', 5),
+            rate_limit=settings.getfloat('TMDB_RATE_LIMIT', 40),
+            rate_burst=settings.getint('TMDB_RATE_BURST') or None,
+            cache=cache,
+            cache_flush_interval=settings.getfloat('TMDB_CACHE_FLUSH_INTERVAL', 1.0),
+            cache_evict_interval=settings.getfloat('TMDB_CACHE_EVICT_INTERVAL', 60.0),
+            stats=crawler.stats,
+        )
+
+    async def open(self):
+        import aiohttp
+
+        if self.session is None:
+            self.limit = register_limit(TMDB_IN_FLIGHT, AsyncLimit(self.max_in_flight))
+            # No connector cap: the limit already bounds connections in use, and may grow.
+            connector = aiohttp.TCPConnector(limit=0, keepalive_timeout=60, ttl_dns_cache=300)
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout), headers=self.auth_headers
+            )
+            if self.cache is not None:
+                self.cache_task = asyncio.ensure_future(self._maintain_cache())
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        if self.cache_task is not None:
+            self.cache_task.cancel()
+            await asyncio.gather(self.cache_task, return_exceptions=True)
+            self.cache_task = None
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.close)
+            self.cache = None
+
+    async def _maintain_cache(self):
+        # Flushes buffered cache writes, and evicts once per evict interval, off the loop.
+        last_evict = time.monotonic()
+        while True:
+            await asyncio.sleep(self.cache_flush_interval)
+            try:
+                await asyncio.to_thread(self.cache.flush)
+                if time.monotonic() - last_evict >= self.cache_evict_interval:
+                    last_evict = time.monotonic()
+                    await asyncio.to_thread(self.cache.evict)
+            except Exception:
+                logger.exception("TMDb cache maintenance failed")
+
+    def _inc_stat(self, key, count=1):
+        if self.stats is not None:
+            self.stats.inc_value(f'tmdb/{key}', count)
+
+    @staticmethod
+    def _retry_delay(response, attempt):
+        try:
+            return float(response.headers['Retry-After'])
+        except (KeyError, ValueError):
+            return 0.5 * 2 ** attempt
+
+    async def _throttle(self):
+        if self.bucket is None:
+            return
+        # The bucket counts its own waits; see MetricsExporter.
+        await self.bucket.acquire_async()
+
+    async def get(self, path, fresh=False, **params):
+        # fresh=True skips the cached copy but still stores the new response.
+        path = path.lstrip('/')
+        endpoint = path.split('/', 1)[0]
+        cache_key = f'{path}?{urlencode(sorted(params.items()))}'
+        if self.cache is not None and not fresh:
+            hit, data = await asyncio.to_thread(self.cache.get, cache_key, endpoint)
+            self._inc_stat('cache/hit' if hit else 'cache/miss')
+            if hit:
+                return data
+        data = await self._request(path, endpoint, params)
+        if self.cache is not None and data is not _UNCACHEABLE:
+            self.cache.set(cache_key, endpoint, data)
+        return data if data is not _UNCACHEABLE else None
+
+    async def _request(self, path, endpoint, params):
+        import aiohttp
+
+        await self.open()
+        url = f'{self.base_url}/{path}'
+        params = {**params, **self.auth_params}
+        for attempt in range(self.retry_times + 1):
+            delay = 0
+            await self._throttle()
+            try:
+                async with self.limit:
+                    self._inc_stat('requests')
+                    started = time.monotonic()
+                    async with self.session.get(url, params=params) as response:
+                        observe(self.stats, f'tmdb/latency/{endpoint}', time.monotonic() - started)
+                        self._inc_stat(f'status/{response.status}')
+                        if response.status == 404:
+                            return None
+                        if response.status in RETRY_STATUSES and attempt < self.retry_times:
+                            self._inc_stat('retries')
+                            if response.status == 429 and self.bucket is not None:
+                                # Every caller waits out Retry-After in the shared bucket.
+                                self.bucket.pause(self._retry_delay(response, attempt))
+                            else:
+                                delay = self._retry_delay(response, attempt)
+                        else:
+                            response.raise_for_status()
+                            return await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"TMDb request to {path} failed: {redact(e, self.api_key)}")
+                self._inc_stat('failures')
+                return _UNCACHEABLE
+            if delay:
+                await asyncio.sleep(delay)
+        return _UNCACHEABLE
+
+    async def changes(self, media_type, start_date, end_date):
+        # Returns the TMDb IDs the /movie/changes or /tv/changes feed lists
+        # for the date range, across all its pages. Feeds are never cached.
+        changed, page, total_pages = set(), 1, 1
+        while page <= total_pages:
+            data = await self._request(f'{media_type}/changes', 'changes', {
+                'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(), 'page': page,
+            })
+            if not data or data is _UNCACHEABLE:
+                break
+            changed.update(result['id'] for result in data.get('results', []) if result.get('id') is not None)
+            total_pages = data.get('total_pages', 1)
+            page += 1
+        return changed
+
+    async def find(self, imdb_id):
+        data = await self.get(f'find/{imdb_id}', external_source='imdb_id')
+        if data:
+            if data.get('movie_results'):
+                return 'movie', data['movie_results'][0]['id']
+            elif data.get('tv_results'):
+                return 'tv', data['tv_results'][0]['id']
+        return None
+
+    async def details(self, media_type, tmdb_id, fresh=False):
+        data = await self.get(f'{media_type}/{tmdb_id}', fresh=fresh, append_to_response=DETAILS_APPEND)
+        if not data:
+            return None
+        if media_type == 'tv':
+            data = self._normalize_tv(data)
+        data['media_type'] = media_type
+        data['trailer_link'] = self._trailer_link(data.get('videos'))
+        return data
+
+    @staticmethod
+    def _trailer_link(videos):
+        for video in (videos or {}).get('results', []):
+            if video.get('type', '').lower() == 'trailer' and video.get('site', 'YouTube') == 'YouTube':
+                return f"https://www.youtube.com/watch?v={video['key']}"
+        return None
+
+    @staticmethod
+    def _normalize_tv(data):
+        # Map TV detail fields onto the movie field names build_movie_item reads.
+        runtimes = data.get('episode_run_time') or []
+        data.setdefault('title', data.get('name'))
+        data.setdefault('original_title', data.get('original_name'))
+        data.setdefault('release_date', data.get('first_air_date'))
+        data.setdefault('runtime', runtimes[0] if runtimes else None)
+        keywords = data.get('keywords') or {}
+        if 'results' in keywords:
+            data['keywords'] = {'keywords': keywords['results']}
+        return data
+
+    async def fetch(self, imdb_id, title_type=None, tmdb_ref=None):
+        # /movie/{id} accepts IMDb IDs, so a feature film resolves in a single
+        # request. TV titles, and movies TMDb can't resolve that way, go
+        # through /find first. A known (media_type, tmdb_id) ref is re-fetched
+        # directly, bypassing the cache.
+        if tmdb_ref:
+            return await self.details(*tmdb_ref, fresh=True)
+        if title_type not in TV_TITLE_TYPES:
+            tmdb_data = await self.details('movie', imdb_id)
+            if tmdb_data:
+                return tmdb_data
+        match = await self.find(imdb_id)
+        if not match:
+            return None
+        return await self.details(*match)
+
+    async def _fetch_pair(self, imdb_id, title_type, tmdb_ref):
+        return imdb_id, await self.fetch(imdb_id, title_type, tmdb_ref)
+
+    async def enrich(self, imdb_ids, title_types=None, tmdb_refs=None):
+        # Yields (imdb_id, tmdb_data) pairs as soon as each title completes;
+        # tmdb_data is None for titles TMDb does not know about. title_types
+        # optionally maps IMDb IDs to IMDb title types (e.g. 'tvSeries') and
+        # tmdb_refs to (media_type, tmdb_id) pairs that must be re-fetched.
+        title_types = title_types or {}
+        tmdb_refs = tmdb_refs or {}
+        tasks = [
+            asyncio.ensure_future(self._fetch_pair(imdb_id, title_types.get(imdb_id), tmdb_refs.get(imdb_id)))
+            for imdb_id in imdb_ids
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,64 @@
+# Producer/consumer plumbing between blocking listing workers (Selenium
+# browsers running in their own threads) and the Scrapy engine.
+#
+# Workers push finished items into a thread-safe hand-off queue; the spider
+# callback drains it without blocking the reactor thread.
+
+import logging
+import threading
+from queue import Empty, Queue
+
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.threads import deferToThread
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+async def run_in_thread(func, *args, **kwargs):
+    return await maybe_deferred_to_future(deferToThread(func, *args, **kwargs))
+
+
+class ListingWorkerPool:
+    def __init__(self, target, num_workers, queue_depth=0, name='listing-worker'):
+        self.target = target
+        self.num_workers = num_workers
+        self.name = name
+        self.results = Queue(maxsize=queue_depth)
+        self.threads = []
+
+    def start(self):
+        for worker_id in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._run, args=(worker_id,), name=f"{self.name}-{worker_id}", daemon=True
+            )
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def _run(self, worker_id):
+        try:
+            for item in self.target(worker_id):
+                self.results.put(item)
+        except Exception as e:
+            logger.error(f"Worker {worker_id} crashed: {e}", exc_info=True)
+        finally:
+            self.results.put(_DONE)
+
+    def _next_batch(self):
+        batch = [self.results.get()]
+        while True:
+            try:
+                batch.append(self.results.get_nowait())
+            except Empty:
+                return batch
+
+    async def drain(self):
+        finished = 0
+        while finished < self.num_workers:
+            for item in await run_in_thread(self._next_batch):
+                if item is _DONE:
+                    finished += 1
+                else:
+                    yield item
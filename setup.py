@@ -6,5 +6,9 @@ setup(
     name         = 'project',
     version      = '1.0',
     packages     = find_packages(),
-    entry_points = {'scrapy': ['settings = imdbscrapper.settings']},
+    python_requires = '>=3.10',
+    entry_points = {
+        'scrapy': ['settings = imdbscrapper.settings'],
+        'console_scripts': ['imdbscrapper = imdbscrapper.cli:main'],
+    },
 )
@@ -0,0 +1,36 @@
+# Runs advance_scrapper in a subprocess against the bench fixture servers.
+
+import json
+import os
+import subprocess
+
+from imdbscrapper.bench import PACKAGE_ROOT, crawl_command
+
+
+def start_crawl(tmp_path, imdb, tmdb, settings=None, **arguments):
+    settings = {
+        'IMDB_BASE_URL': imdb.base_url,
+        'TMDB_BASE_URL': f'{tmdb.base_url}/3',
+        'TMDB_RATE_LIMIT': 0,
+        'TMDB_MAX_IN_FLIGHT': 4,
+        'TMDB_CACHE_ENABLED': False,
+        'EXPORT_DIR': str(tmp_path / 'exports'),
+        'EXPORT_FORMATS': 'ndjson',
+        'EXPORT_BATCH_SIZE': 10,
+        'EXPORT_FLUSH_INTERVAL': 0.2,
+        'JOBDIR': str(tmp_path / 'job'),
+        'LOG_FILE': str(tmp_path / 'crawl.log'),
+        **(settings or {}),
+    }
+    arguments = {'tmdb_api_key': 'test', 'listing_mode': 'http', 'num_instances': 2, **arguments}
+    env = {**os.environ, 'SCRAPY_SETTINGS_MODULE': 'imdbscrapper.settings',
+           'PYTHONPATH': os.pathsep.join(filter(None, [PACKAGE_ROOT, os.environ.get('PYTHONPATH')]))}
+    return subprocess.Popen(crawl_command('advance_scrapper', arguments, settings), cwd=tmp_path, env=env)
+
+
+def exported_items(tmp_path):
+    path = tmp_path / 'exports' / 'advance_scrapper' / 'movies.ndjson'
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.endswith('\n')]
@@ -0,0 +1,66 @@
+import threading
+import time
+from datetime import date
+
+from scrapy.utils.test import get_crawler
+
+from imdbscrapper.partitions import Window
+from imdbscrapper.spiders.advance_scrapper import IMDbTMDbSpider
+
+WINDOW = Window(date(2020, 1, 1), date(2020, 1, 31))
+
+
+def advance_spider(**settings):
+    crawler = get_crawler(IMDbTMDbSpider, settings)
+    return IMDbTMDbSpider.from_crawler(crawler, tmdb_api_key='key', start=2020, end=2020)
+
+
+class BrokenDriver:
+    def get(self, url):
+        raise ValueError('unexpected page')
+
+
+def test_unexpected_listing_errors_are_retried_then_failed():
+    spider = advance_spider(DRIVER_MAX_PARTITION_ATTEMPTS=2)
+    while spider.partition_queue.qsize():
+        spider.partition_queue.get()
+
+    assert spider.scrape_partition(BrokenDriver(), WINDOW, 0) is None
+    assert spider.partition_queue.get_nowait() == WINDOW
+    assert spider.crawler.stats.get_value('partitions/retried') == 1
+
+    assert spider.scrape_partition(BrokenDriver(), WINDOW, 0) is None
+    assert spider.partition_queue.empty()
+    assert spider.crawler.stats.get_value('partitions/failed') == 1
+
+
+class BusyCoordinator:
+    # Another node still holds the only partition left.
+    poll_interval = 0.2
+
+    def __init__(self):
+        self.polls = 0
+
+    def claim_partition(self):
+        return None
+
+    def drained(self):
+        self.polls += 1
+        return self.polls > 2
+
+
+def test_idle_workers_wait_without_a_worker_slot():
+    spider = advance_spider()
+    while spider.partition_queue.qsize():
+        spider.partition_queue.get()
+    spider.coordinator = BusyCoordinator()
+    spider.worker_limit.resize(1)
+
+    waiting = threading.Thread(target=lambda: list(spider.replay_instance(0)))
+    waiting.start()
+    time.sleep(0.1)
+    # The worker is sleeping between polls and holds no slot.
+    assert spider.worker_limit.active == 0
+    waiting.join(5)
+    assert not waiting.is_alive()
+    assert spider.coordinator.polls == 3
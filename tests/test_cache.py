@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3
+
+from imdbscrapper.cache import ResponseCache
+from imdbscrapper.tmdb import TMDbClient
+
+
+def stored_keys(path):
+    db = sqlite3.connect(path)
+    try:
+        return {key for (key,) in db.execute('SELECT key FROM responses')}
+    finally:
+        db.close()
+
+
+def test_set_is_buffered_until_flush(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ResponseCache(path)
+    cache.set('movie/1?', 'movie', {'id': 1})
+    cache.set('find/tt2?', 'find', None)
+    assert stored_keys(path) == set()
+    assert cache.get('movie/1?', 'movie') == (True, {'id': 1})
+    assert cache.get('find/tt2?', 'find') == (True, None)
+
+    cache.flush()
+    assert stored_keys(path) == {'movie/1?', 'find/tt2?'}
+    assert cache.get('movie/1?', 'movie') == (True, {'id': 1})
+    assert cache.get('movie/3?', 'movie') == (False, None)
+    cache.close()
+
+
+def test_evict_trims_least_recently_used(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = ResponseCache(path, max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, 'movie', {'key': key})
+        cache.flush()
+    cache.get('a', 'movie')
+    cache.flush()
+    cache.evict()
+    assert stored_keys(path) == {'a', 'c'}
+    cache.close()
+
+
+def test_client_writes_the_cache_in_the_background(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+
+    async def crawl():
+        client = TMDbClient('key', cache=ResponseCache(path), cache_flush_interval=0.01)
+
+        async def request(path, endpoint, params):
+            return {'path': path}
+
+        client._request = request
+        client.cache_task = asyncio.ensure_future(client._maintain_cache())
+        assert await client.get('movie/1') == {'path': 'movie/1'}
+        await asyncio.sleep(0.1)
+        assert stored_keys(path) == {'movie/1?'}
+        await client.close()
+        assert client.cache_task is None
+
+    asyncio.run(crawl())
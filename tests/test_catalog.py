@@ -0,0 +1,48 @@
+import sqlite3
+from dataclasses import replace
+
+from twisted.internet import defer
+
+from imdbscrapper.bench import fixture_movie_items
+from imdbscrapper.catalog import start_year
+from imdbscrapper.pipelines import CatalogPipeline
+
+
+def catalog_pipeline(path):
+    pipeline = CatalogPipeline(path, batch_size=2, commit_interval=0)
+    # Writes run inline; crawls run them in the reactor's thread pool.
+    pipeline.run_in_thread = defer.maybeDeferred
+    pipeline.open_spider(None)
+    return pipeline
+
+
+def test_rescraped_title_updates_its_row(tmp_path):
+    path = str(tmp_path / 'catalog.sqlite3')
+    item, other = fixture_movie_items(2)
+    pipeline = catalog_pipeline(path)
+    for scraped in (item, other):
+        pipeline.process_item(scraped, None)
+    pipeline.close_spider(None)
+
+    pipeline = catalog_pipeline(path)
+    pipeline.process_item(replace(item, title='Renamed', year='2019–2021', genres=['Drama']), None)
+    pipeline.close_spider(None)
+
+    db = sqlite3.connect(path)
+    try:
+        assert db.execute('SELECT count(*) FROM titles').fetchone() == (2,)
+        assert db.execute('SELECT title, year, typeof(year) FROM titles WHERE imdb_id = ?',
+                          (item.imdb_id,)).fetchone() == ('Renamed', 2019, 'integer')
+        genres = db.execute('SELECT genres.name FROM title_genres JOIN genres ON genres.id = genre_id '
+                            'JOIN titles ON titles.id = title_id WHERE imdb_id = ?', (item.imdb_id,)).fetchall()
+        assert genres == [('Drama',)]
+    finally:
+        db.close()
+
+
+def test_years_are_stored_as_start_years():
+    assert start_year('2019') == 2019
+    assert start_year('2019–2021') == 2019
+    assert start_year('(2005 TV Movie)') == 2005
+    assert start_year('') is None
+    assert start_year(None) is None
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+import pytest
+
+from imdbscrapper import cli
+from imdbscrapper.bench import CLI_BUDGET_MS, PACKAGE_ROOT, SPIDER_BUDGET_MS, time_import
+
+HEAVY_MODULES = {'selenium', 'aiohttp', 'redis'}
+# Shared CI machines are slower and noisier than the ones the budgets were
+# set on, so the tests allow this multiple of them.
+BUDGET_TOLERANCE = 3
+
+
+def imported_modules(code):
+    # Top-level packages listed by `python -X importtime`.
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=PACKAGE_ROOT,
+                            capture_output=True, text=True, check=True)
+    modules = set()
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.rsplit('|', 1)[1].strip()
+            modules.add(name.split('.', 1)[0])
+    assert 'imdbscrapper' in modules
+    return modules
+
+
+@pytest.mark.parametrize('code', [
+    'import imdbscrapper.cli',
+    'import imdbscrapper.spiders.advance_scrapper',
+    'import imdbscrapper.spiders.basic_scrapper',
+    'import imdbscrapper.bench',
+    'import imdbscrapper.pipelines',
+])
+def test_imports_leave_heavy_modules_unloaded(code):
+    assert not imported_modules(code) & HEAVY_MODULES
+
+
+@pytest.mark.parametrize('module, baseline, budget_ms', [
+    ('imdbscrapper.cli', '', CLI_BUDGET_MS),
+    ('imdbscrapper.spiders.advance_scrapper', 'scrapy', SPIDER_BUDGET_MS),
+    ('imdbscrapper.spiders.basic_scrapper', 'scrapy', SPIDER_BUDGET_MS),
+])
+def test_imports_stay_within_budget(module, baseline, budget_ms):
+    elapsed, _ = time_import(module, baseline, repeat=3)
+    assert elapsed * 1000 <= budget_ms * BUDGET_TOLERANCE
+
+
+def test_basic_scrapper_rejects_replay():
+    with pytest.raises(SystemExit) as excinfo:
+        cli.main(['crawl', 'basic_scrapper', '--listing-mode', 'replay'])
+    assert 'basic_scrapper does not support --listing-mode replay' in str(excinfo.value)
@@ -0,0 +1,63 @@
+from datetime import date
+
+from imdbscrapper.coordination import SQLiteCoordinator
+from imdbscrapper.dedup import DedupIndex
+from imdbscrapper.partitions import Window
+
+
+def test_claim_many_keeps_order_and_drops_repeats(tmp_path):
+    index = DedupIndex(str(tmp_path / 'seen.sqlite3'), capacity=1000)
+    assert index.claim_many(['tt1', 'tt2', 'tt1', 'nm7', 'nm7']) == [True, True, False, True, True]
+    assert index.claim_many(['tt2', 'tt3']) == [False, True]
+    index.release('tt3')
+    assert index.claim_many(['tt3']) == [True]
+    index.close()
+
+
+def test_recorded_ids_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'seen.sqlite3')
+    index = DedupIndex(path, capacity=1000)
+    index.claim_many(['tt1', 'tt2'])
+    index.record('tt1')
+    index.release('tt2')
+    index.close()
+
+    index = DedupIndex(path, capacity=1000)
+    assert index.stored == 1
+    assert index.claim_many(['tt1', 'tt2']) == [False, True]
+    index.close()
+
+
+def coordinator(tmp_path, node_id):
+    return SQLiteCoordinator(f'sqlite:///{tmp_path}/shared.sqlite3', node_id, lease_seconds=60)
+
+
+def test_coordinator_claims_titles_once_across_nodes(tmp_path):
+    first, second = coordinator(tmp_path, 'first'), coordinator(tmp_path, 'second')
+    try:
+        assert first.claim_many(['tt1', 'tt2', 'tt2']) == [True, True, False]
+        assert second.claim_many(['tt1', 'tt2', 'tt3']) == [False, False, True]
+        first.release('tt2')
+        assert second.claim_many(['tt2']) == [False]
+        first.flush()
+        assert second.claim_many(['tt2']) == [True]
+    finally:
+        first.close()
+        second.close()
+
+
+def test_coordinator_records_titles_with_the_partition(tmp_path):
+    node = coordinator(tmp_path, 'node')
+    try:
+        window = Window(date(2020, 1, 1), date(2020, 1, 31))
+        node.seed([window])
+        assert node.claim_partition() == window
+        node.claim_many(['tt1', 'tt2'])
+        node.record('tt1')
+        node.record('tt2')
+        assert node.stored == 0
+        node.complete_partition(window.key)
+        assert node.stored == 2
+        assert node.drained()
+    finally:
+        node.close()
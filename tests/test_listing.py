@@ -0,0 +1,115 @@
+import asyncio
+from datetime import date
+
+import scrapy
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from imdbscrapper import listing
+from imdbscrapper.bench import fixture_ids, fixture_search_page
+from imdbscrapper.items import ListingRow
+from imdbscrapper.partitions import Window
+from imdbscrapper.spiders.advance_scrapper import IMDbTMDbSpider as AdvanceSpider
+from imdbscrapper.spiders.basic_scrapper import IMDbTMDbSpider as BasicSpider
+
+DAY = date(2020, 1, 1)
+
+
+def search_response(start_date, end_date, density, start=1, count=listing.SEARCH_PAGE_SIZE):
+    url = listing.search_url(start_date, end_date, start=start)
+    body = fixture_search_page(start_date, end_date, density, count, start=start)
+    return HtmlResponse(url, body=body, encoding='utf-8')
+
+
+def test_parse_search_results_reads_next_data():
+    rows, total = listing.parse_search_results(search_response(DAY, DAY, 3))
+    first = next(fixture_ids(DAY, DAY, 3))
+    assert total == 3
+    assert [row['imdb_id'] for row in rows] == [f'tt{number}' for number in fixture_ids(DAY, DAY, 3)]
+    assert rows[0] == {
+        'title': f'Fixture Title {first}',
+        'year': '2020',
+        'movie_url': f'{listing.IMDB_BASE_URL}/title/tt{first}/',
+        'imdb_rating': round(1 + first % 90 / 10, 1),
+        'imdb_votes': first % 100000,
+        'metascore': float(first % 100),
+        'imdb_id': f'tt{first}',
+        'title_type': 'tvSeries' if first % 5 == 0 else 'movie',
+    }
+
+
+def test_parse_search_results_without_next_data():
+    response = HtmlResponse('https://www.imdb.com/search/title/', body=b'<html></html>', encoding='utf-8')
+    assert listing.parse_search_results(response) == ([], None)
+
+
+def test_search_pages_cover_every_title_once():
+    ids, start = [], 1
+    while start is not None:
+        response = search_response(DAY, DAY, 600, start)
+        assert listing.page_start(response.url) == start
+        rows, total = listing.parse_search_results(response)
+        ids += [row['imdb_id'] for row in rows]
+        start = listing.next_page_start(start, len(rows), total)
+    assert len(ids) == 600
+    assert ids == [f'tt{number}' for number in fixture_ids(DAY, DAY, 600)]
+
+
+def test_next_page_start():
+    assert listing.next_page_start(1, 250, 600) == 251
+    assert listing.next_page_start(501, 100, 600) is None
+    assert listing.next_page_start(1, 250, 250) is None
+    assert listing.next_page_start(251, 0, 600) is None
+    assert listing.next_page_start(1, 10, None) is None
+    assert listing.unlisted_titles(251, 0, 600) == 350
+    assert listing.unlisted_titles(501, 100, 600) == 0
+
+
+def test_basic_spider_follows_pages_until_max_movies():
+    crawler = get_crawler(BasicSpider)
+    spider = BasicSpider.from_crawler(crawler, max_movies=400, tmdb_api_key='key', listing_mode='http')
+    start_date, end_date = spider.release_window
+    output = list(spider.parse(search_response(start_date, end_date, 20)))
+    rows = [item for item in output if isinstance(item, ListingRow)]
+    requests = [item for item in output if isinstance(item, scrapy.Request)]
+    assert len(rows) == 250
+    assert [listing.page_start(request.url) for request in requests] == [251]
+
+    output = list(spider.parse(search_response(start_date, end_date, 20, start=251)))
+    assert len(output) == 150
+    assert all(isinstance(item, ListingRow) for item in output)
+    assert spider.movie_count == 400
+
+
+def test_basic_spider_counts_truncated_titles():
+    crawler = get_crawler(BasicSpider)
+    spider = BasicSpider.from_crawler(crawler, tmdb_api_key='key', listing_mode='http')
+    start_date, end_date = spider.release_window
+    # IMDb stops returning results before the reported total.
+    assert list(spider.parse(search_response(start_date, end_date, 20, start=251, count=0))) == []
+    assert crawler.stats.get_value('listing/truncated') == 620 - 250
+
+
+async def collect(agen):
+    return [item async for item in agen]
+
+
+def test_advance_spider_lists_dense_day_page_by_page():
+    crawler = get_crawler(AdvanceSpider)
+    spider = AdvanceSpider.from_crawler(crawler, tmdb_api_key='key', listing_mode='http', start=2020, end=2020)
+    window = Window(DAY, DAY)
+    start, listed = 1, []
+    while start is not None:
+        output = asyncio.run(collect(spider.parse_listing(search_response(DAY, DAY, 600, start), window, start)))
+        listed += [item.imdb_id for item in output if isinstance(item, ListingRow)]
+        requests = [item for item in output if isinstance(item, scrapy.Request)]
+        assert len(requests) <= 1
+        if requests:
+            assert window.key not in spider.tracker.listed
+            start = requests[0].cb_kwargs['start']
+            assert listing.page_start(requests[0].url) == start
+        else:
+            start = None
+    assert listed == [f'tt{number}' for number in fixture_ids(DAY, DAY, 600)]
+    assert window.key in spider.tracker.listed
+    assert not crawler.stats.get_value('listing/truncated')
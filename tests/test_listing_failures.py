@@ -0,0 +1,39 @@
+from datetime import date
+
+import pytest
+
+from imdbscrapper.bench import FixtureServer, IMDbFixtureHandler, TMDbStubHandler, fixture_ids
+from tests.crawls import exported_items, start_crawl
+
+pytest.importorskip('aiohttp')
+
+YEAR = 2020
+MISSING = date(YEAR, 3, 1)
+
+
+@pytest.fixture
+def servers():
+    imdb = FixtureServer(IMDbFixtureHandler, density=1, show_more_delay=0, missing={MISSING.isoformat()}).start()
+    tmdb = FixtureServer(TMDbStubHandler, latency=0, error_rate=0, retry_after=0).start()
+    yield imdb, tmdb
+    imdb.stop()
+    tmdb.stop()
+
+
+@pytest.mark.parametrize('distributed', [False, True])
+def test_failed_search_page_is_retried_then_given_up(tmp_path, servers, distributed):
+    imdb, tmdb = servers
+    settings = {'DOWNLOAD_DELAY': 0, 'AUTOTHROTTLE_ENABLED': False}
+    if distributed:
+        settings.update(DISTRIBUTED_BACKEND=f'sqlite:///{tmp_path}/shared.sqlite3', DISTRIBUTED_POLL_INTERVAL=0.2)
+    crawl = start_crawl(tmp_path, imdb, tmdb, settings=settings, start=YEAR, end=YEAR)
+    assert crawl.wait(timeout=60) == 0
+
+    assert imdb.counts['missing'] == 3
+    march = set(fixture_ids(MISSING, date(YEAR, 3, 31), 1))
+    expected = {f'tt{number}' for number in fixture_ids(date(YEAR, 1, 1), date(YEAR, 12, 31), 1)
+                if TMDbStubHandler.known(number) and number not in march}
+    assert {item['imdb_id'] for item in exported_items(tmp_path)} == expected
+    log = (tmp_path / 'crawl.log').read_text()
+    assert "'partitions/failed': 1" in log
+    assert "'partitions/retried': 2" in log
@@ -0,0 +1,106 @@
+import asyncio
+import os
+import time
+import urllib.request
+
+import pytest
+
+from imdbscrapper.bench import BenchStats, FixtureServer, MediaFixtureHandler
+from imdbscrapper.media import MediaDownloader, MediaStore, variant_url
+
+pytest.importorskip('aiohttp')
+
+IMAGE_KB = 64
+
+
+@pytest.fixture
+def image_server():
+    server = FixtureServer(MediaFixtureHandler, image_kb=IMAGE_KB, duplicate_every=2, drop_rate=0, seed=0).start()
+    yield server
+    server.stop()
+
+
+def image_urls(server, count):
+    return [variant_url(f'https://image.tmdb.org/t/p/original/p{number}.jpg', 'w500', f'{server.base_url}/t/p')
+            for number in range(count)]
+
+
+def stored_files(media_dir):
+    return {name for root, _, files in os.walk(media_dir) if root != str(media_dir)
+            and os.path.basename(root) != '.partial' for name in files}
+
+
+def download_all(downloader, urls):
+    async def download():
+        try:
+            return await asyncio.gather(*(downloader.download(url) for url in urls))
+        finally:
+            await downloader.close()
+
+    return asyncio.run(download())
+
+
+def test_images_are_stored_once_per_content(tmp_path, image_server):
+    stats = BenchStats()
+    # Even-numbered images share one body.
+    paths = download_all(MediaDownloader(MediaStore(str(tmp_path)), stats=stats), image_urls(image_server, 6))
+    assert None not in paths
+    assert len(set(paths[0::2])) == 1
+    assert len(stored_files(tmp_path)) == 4
+    assert stats['media/stored'] == 4
+    assert stats['media/duplicates'] == 2
+
+    # A second run finds every URL in the index.
+    stats = BenchStats()
+    assert download_all(MediaDownloader(MediaStore(str(tmp_path)), stats=stats), image_urls(image_server, 6)) == paths
+    assert stats['media/already_stored'] == 6
+    assert image_server.counts['requests'] == 6
+
+
+def test_partial_download_resumes_with_a_range_request(tmp_path, image_server):
+    (url,) = image_urls(image_server, 1)
+    store = MediaStore(str(tmp_path))
+    with urllib.request.urlopen(url) as response:
+        body = response.read()
+    with open(store.partial_path(url), 'wb') as f:
+        f.write(body[:1000])
+    stats = BenchStats()
+    (path,) = download_all(MediaDownloader(store, stats=stats), [url])
+    with open(tmp_path / path, 'rb') as f:
+        assert f.read() == body
+    assert stats['media/resumed'] == 1
+    assert stats['media/bytes'] == len(body) - 1000
+    assert image_server.counts['ranges'] == 1
+
+
+def test_in_flight_bytes_stay_under_the_cap(tmp_path, image_server):
+    limit = IMAGE_KB * 1024 * 3 // 2
+    downloader = MediaDownloader(MediaStore(str(tmp_path)), max_in_flight=8, max_in_flight_bytes=limit)
+    peak = []
+
+    async def download():
+        await downloader.open()
+        budget, acquire = downloader.budget, downloader.budget.acquire
+
+        async def tracked(size):
+            reserved = await acquire(size)
+            peak.append(budget.used)
+            return reserved
+
+        budget.acquire = tracked
+        try:
+            return await asyncio.gather(*(downloader.download(url) for url in image_urls(image_server, 8)))
+        finally:
+            await downloader.close()
+
+    assert None not in asyncio.run(download())
+    assert 0 < max(peak) <= limit
+
+
+def test_disk_writes_are_paced(tmp_path, image_server):
+    rate = 4 * IMAGE_KB * 1024
+    downloader = MediaDownloader(MediaStore(str(tmp_path)), max_bytes_per_second=rate)
+    started = time.monotonic()
+    # Eight images are twice the rate; the first second's worth is the burst.
+    assert None not in download_all(downloader, image_urls(image_server, 8))
+    assert time.monotonic() - started >= 0.8
@@ -0,0 +1,73 @@
+import threading
+
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from imdbscrapper.autoscale import StatsWindow
+from imdbscrapper.extensions import MetricsExporter, render_prometheus, snapshot
+from imdbscrapper.metrics import histograms, observe
+from imdbscrapper.ratelimit import get_bucket
+
+
+def test_observe_keeps_one_value_per_histogram_across_threads():
+    stats = MemoryStatsCollector(get_crawler())
+
+    def work():
+        for k in range(1000):
+            observe(stats, 'driver/page_load', 0.003 if k % 2 else 2.0)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert list(stats.get_stats()) == ['driver/page_load']
+    histogram = stats.get_value('driver/page_load')
+    assert histogram['count'] == 8000
+    assert histogram['buckets'] == {'0.005': 4000, '2.5': 4000}
+    assert histogram['max'] == 2.0
+
+
+def test_exporters_read_compact_histograms():
+    stats = MemoryStatsCollector(get_crawler())
+    observe(stats, 'tmdb/latency/movie', 0.02)
+    observe(stats, 'tmdb/latency/movie', 0.2)
+    stats.set_value('tmdb/requests', 2)
+
+    (histogram,) = histograms(stats.get_stats()).values()
+    assert histogram['buckets'][-1] == (120, 2)
+    text = render_prometheus(stats.get_stats())
+    assert 'imdbscrapper_tmdb_latency_movie_seconds_bucket{le="0.025"} 1' in text
+    assert 'imdbscrapper_tmdb_latency_movie_seconds_count 2' in text
+    assert 'imdbscrapper_tmdb_requests 2' in text
+    data = snapshot(stats.get_stats())
+    assert data['stats'] == {'tmdb/requests': 2}
+    assert data['latency']['tmdb/latency/movie']['count'] == 2
+
+
+def test_stats_window_only_counts_new_observations():
+    stats = MemoryStatsCollector(get_crawler())
+    for _ in range(10):
+        observe(stats, 'driver/page_load', 20.0)
+    previous = dict(stats.get_stats())
+    for _ in range(10):
+        observe(stats, 'driver/page_load', 0.04)
+    window = StatsWindow(previous, dict(stats.get_stats()))
+    assert window.observations('driver/page_load') == 10
+    assert window.latency('driver/page_load') <= 0.05
+
+
+def test_exporter_publishes_rate_limit_counters():
+    crawler = get_crawler()
+    crawler.stats = MemoryStatsCollector(crawler)
+    bucket = get_bucket('test-exporter', rate=100, burst=1)
+    bucket.acquire()
+    bucket.acquire()
+    bucket.pause(0.01)
+    exporter = MetricsExporter(crawler)
+    exporter.started = exporter.last_time = 0
+    exporter.publish()
+    assert crawler.stats.get_value('test-exporter/ratelimit/waits') == 1
+    assert crawler.stats.get_value('test-exporter/ratelimit/wait_seconds') > 0
+    assert crawler.stats.get_value('test-exporter/ratelimit/pauses') == 1
@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+from scrapy.utils.test import get_crawler
+
+from imdbscrapper.partitions import Window, seed_windows, split_window
+from imdbscrapper.spiders.advance_scrapper import IMDbTMDbSpider
+
+CAP = 1000
+
+
+def assert_covers(windows, start, end):
+    # Windows are in order, contiguous and do not overlap.
+    assert windows[0].start == start and windows[-1].end == end
+    for previous, window in zip(windows, windows[1:]):
+        assert window.start == previous.end + timedelta(days=1)
+
+
+def test_seeding_is_sparse_then_monthly_and_deterministic():
+    windows = list(seed_windows(1968, 1971, sparse_before=1970))
+    assert windows[:2] == [Window(date(1968, 1, 1), date(1968, 12, 31)), Window(date(1969, 1, 1), date(1969, 12, 31))]
+    assert len(windows) == 2 + 24
+    assert_covers(windows, date(1968, 1, 1), date(1971, 12, 31))
+    assert list(seed_windows(1968, 1971, sparse_before=1970)) == windows
+    # An open-ended crawl stops at the current month.
+    today = date(2024, 3, 15)
+    assert list(seed_windows(2024, sparse_before=1970, today=today))[-1] == Window(date(2024, 3, 1), date(2024, 3, 31))
+
+
+def split_to_cap(window, titles_per_day):
+    # Splits the way the spider does: a window reporting more than CAP
+    # titles is halved, down to single days.
+    if window.days * titles_per_day <= CAP:
+        return [window]
+    halves = split_window(window)
+    if not halves:
+        return [window]
+    return [part for half in halves for part in split_to_cap(half, titles_per_day)]
+
+
+def test_dense_windows_split_until_they_fit_the_cap():
+    month = Window(date(2020, 1, 1), date(2020, 1, 31))
+    assert split_to_cap(month, 32) == [month]
+    parts = split_to_cap(month, 100)
+    assert all(part.days * 100 <= CAP for part in parts)
+    assert_covers(parts, month.start, month.end)
+    assert split_to_cap(month, 100) == parts
+    # A single day cannot be split however dense it is.
+    day = Window(date(2020, 1, 1), date(2020, 1, 1))
+    assert split_window(day) == []
+    assert split_to_cap(day, 5000) == [day]
+
+
+def test_window_keys_round_trip():
+    for window in seed_windows(1969, 1970, sparse_before=1970):
+        assert Window.from_key(window.key) == window
+        assert [Window.from_key(half.key) for half in split_window(window)] == split_window(window)
+
+
+def advance_spider(tmp_path, **settings):
+    crawler = get_crawler(IMDbTMDbSpider, {'JOBDIR': str(tmp_path), **settings})
+    return IMDbTMDbSpider.from_crawler(crawler, tmdb_api_key='key', start=1969, end=1970)
+
+
+def queued(spider):
+    windows = []
+    while not spider.partition_queue.empty():
+        windows.append(spider.partition_queue.get_nowait())
+    return windows
+
+
+def test_spider_splits_at_the_result_cap_and_skips_committed_halves(tmp_path):
+    spider = advance_spider(tmp_path)
+    month = Window(date(1970, 1, 1), date(1970, 1, 31))
+    assert spider.split_dense_partition(month, CAP, CAP) is None
+    halves = spider.split_dense_partition(month, CAP + 1, CAP)
+    assert halves == split_window(month)
+    # A resumed crawl lists the month again but only the half not committed.
+    spider.completed_partitions = {halves[0].key}
+    assert spider.split_dense_partition(month, CAP + 1, CAP) == halves[1:]
+    spider.job_state.close()
+
+
+def test_resumed_crawl_keeps_its_sparse_cutoff(tmp_path):
+    spider = advance_spider(tmp_path, PARTITION_SPARSE_BEFORE=1970)
+    first = queued(spider)
+    assert first[0] == Window(date(1969, 1, 1), date(1969, 12, 31))
+    spider.job_state.complete_partition(first[0].key)
+    spider.job_state.close()
+
+    spider = advance_spider(tmp_path, PARTITION_SPARSE_BEFORE=1900)
+    assert queued(spider) == first[1:]
+    spider.job_state.close()
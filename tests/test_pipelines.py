@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.statscollectors import MemoryStatsCollector
+from scrapy.utils.test import get_crawler
+
+from imdbscrapper.items import ListingRow, MovieItem
+from imdbscrapper import settings
+from imdbscrapper.pipelines import CatalogPipeline, EnrichmentPipeline
+
+
+class StubTMDb:
+    # Answers odd ids and tracks how many rows are being enriched at once.
+
+    def __init__(self):
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    async def enrich(self, imdb_ids, title_types, tmdb_refs):
+        # The pipeline pops ids off as they are answered.
+        rows = len(imdb_ids)
+        self.in_flight += rows
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            for imdb_id in list(imdb_ids):
+                yield imdb_id, {'id': int(imdb_id[2:]), 'title': imdb_id} if int(imdb_id[2:]) % 2 else None
+        finally:
+            self.in_flight -= rows
+
+
+def test_enrichment_caps_rows_across_responses_and_counts_misses():
+    crawler = get_crawler(settings_dict={'ENRICH_BATCH_SIZE': 4, 'ENRICH_BATCH_TIMEOUT': 0.01,
+                                         'ENRICH_MAX_PENDING': 8})
+    crawler.stats = MemoryStatsCollector(crawler)
+    pipeline = EnrichmentPipeline.from_crawler(crawler)
+    pipeline.tmdb = StubTMDb()
+
+    async def crawl():
+        # Every row stands in for a different response, so CONCURRENT_ITEMS
+        # would not hold any of them back.
+        rows = [ListingRow(imdb_id=f'tt{number}', title_type='movie') for number in range(40)]
+        return await asyncio.gather(*(pipeline.process_item(row, None) for row in rows),
+                                    return_exceptions=True)
+
+    results = asyncio.run(crawl())
+    assert pipeline.tmdb.most_in_flight <= 8
+    assert sum(isinstance(result, MovieItem) for result in results) == 20
+    assert sum(isinstance(result, DropItem) for result in results) == 20
+    assert crawler.stats.get_value('enrich/no_match') == 20
+    assert crawler.stats.get_value('enrich/rows') == 40
+    assert crawler.stats.get_value('enrich/pending_waits') > 0
+
+
+def test_other_items_pass_through():
+    pipeline = EnrichmentPipeline()
+    item = MovieItem(imdb_id='tt1')
+    assert asyncio.run(pipeline.process_item(item, None)) is item
+
+
+@pytest.mark.parametrize('max_pending', [1, 3])
+def test_small_caps_still_drain(max_pending):
+    crawler = get_crawler(settings_dict={'ENRICH_BATCH_SIZE': 4, 'ENRICH_BATCH_TIMEOUT': 0.01,
+                                         'ENRICH_MAX_PENDING': max_pending})
+    crawler.stats = MemoryStatsCollector(crawler)
+    pipeline = EnrichmentPipeline.from_crawler(crawler)
+    pipeline.tmdb = StubTMDb()
+
+    async def crawl():
+        rows = [ListingRow(imdb_id=f'tt{2 * number + 1}') for number in range(6)]
+        return await asyncio.gather(*(pipeline.process_item(row, None) for row in rows))
+
+    assert len(asyncio.run(crawl())) == 6
+    assert pipeline.tmdb.most_in_flight <= max_pending
+
+
+def test_catalog_is_opt_in(tmp_path):
+    project_settings = {name: getattr(settings, name) for name in dir(settings) if name.startswith('CATALOG_')}
+    with pytest.raises(NotConfigured):
+        CatalogPipeline.from_crawler(get_crawler(settings_dict=project_settings))
+    path = str(tmp_path / 'catalog.sqlite3')
+    crawler = get_crawler(settings_dict={**project_settings, 'CATALOG_ENABLED': True, 'CATALOG_PATH': path})
+    assert CatalogPipeline.from_crawler(crawler).path == path
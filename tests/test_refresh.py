@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+from imdbscrapper import listing
+from imdbscrapper.bench import FixtureServer, IMDbFixtureHandler, TMDbStubHandler, fixture_ids
+from tests.crawls import exported_items, start_crawl
+
+pytest.importorskip('aiohttp')
+
+YEAR = 2020
+DENSITY = 2
+
+
+@pytest.fixture
+def servers():
+    imdb = FixtureServer(IMDbFixtureHandler, density=DENSITY, show_more_delay=0).start()
+    tmdb = FixtureServer(TMDbStubHandler, latency=0, error_rate=0, retry_after=0).start()
+    yield imdb, tmdb
+    imdb.stop()
+    tmdb.stop()
+
+
+def known_ids(start_date, end_date):
+    return [number for number in fixture_ids(start_date, end_date, DENSITY) if TMDbStubHandler.known(number)]
+
+
+def test_refresh_re_enriches_changed_titles_and_the_current_month(tmp_path, servers):
+    imdb, tmdb = servers
+    crawl = start_crawl(tmp_path, imdb, tmdb, start=YEAR, end=YEAR)
+    assert crawl.wait(timeout=120) == 0
+    scraped = exported_items(tmp_path)
+    assert {item['imdb_id'] for item in scraped} == {f'tt{number}' for number in
+                                                    known_ids(date(YEAR, 1, 1), date(YEAR, 12, 31))}
+
+    # The stub uses fixture numbers as TMDb IDs; multiples of five are TV.
+    known = known_ids(date(YEAR, 6, 1), date(YEAR, 6, 30))
+    movies = [number for number in known if number % 5][:2]
+    shows = [number for number in known if not number % 5][:1]
+    tmdb.options['changes'] = {'movie': movies + [999999901], 'tv': shows}
+    crawl = start_crawl(tmp_path, imdb, tmdb, mode='refresh')
+    assert crawl.wait(timeout=120) == 0
+
+    merged = exported_items(tmp_path)
+    changed = {f'tt{number}' for number in movies + shows}
+    month = listing.month_window(date.today().year, date.today().month)
+    current_month = {f'tt{number}' for number in known_ids(*month)}
+    # Changed titles are updated in place; the current month is appended.
+    ids = [item['imdb_id'] for item in merged]
+    assert len(ids) == len(set(ids))
+    assert ids[:len(scraped)] == [item['imdb_id'] for item in scraped]
+    assert set(ids[len(scraped):]) == current_month
+    for before, after in zip(scraped, merged):
+        if after['imdb_id'] in changed:
+            assert after['overview'].startswith('Revised overview')
+            assert after['scraped_at'] > before['scraped_at']
+        else:
+            assert after == before
+    # The fixture TMDb key is a v3 key, sent as a query parameter.
+    assert tmdb.counts['requests/movie'] and tmdb.counts['auth/query'] == tmdb.counts['requests']
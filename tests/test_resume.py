@@ -0,0 +1,61 @@
+import signal
+import sqlite3
+import time
+from datetime import date
+
+import pytest
+
+from imdbscrapper.bench import FixtureServer, IMDbFixtureHandler, TMDbStubHandler, fixture_ids
+from imdbscrapper.state import STATE_FILENAME
+from tests.crawls import exported_items, start_crawl
+
+pytest.importorskip('aiohttp')
+
+# 240 monthly partitions, so the killed run has scheduled more listing
+# requests than fit in one write buffer of Scrapy's JOBDIR dupefilter.
+START, END = 2000, 2019
+DENSITY = 1
+# Listing and enrichment run without delays so both runs stay quick.
+FAST = {'DOWNLOAD_DELAY': 0, 'AUTOTHROTTLE_ENABLED': False, 'TMDB_MAX_IN_FLIGHT': 32}
+
+
+@pytest.fixture
+def servers():
+    imdb = FixtureServer(IMDbFixtureHandler, density=DENSITY, show_more_delay=0).start()
+    tmdb = FixtureServer(TMDbStubHandler, latency=0.01, error_rate=0, retry_after=0).start()
+    yield imdb, tmdb
+    imdb.stop()
+    tmdb.stop()
+
+
+def exported_ids(tmp_path):
+    return [item['imdb_id'] for item in exported_items(tmp_path)]
+
+
+def test_crawl_killed_partway_resumes_without_duplicates_or_gaps(tmp_path, servers):
+    imdb, tmdb = servers
+    expected = {f'tt{number}' for number in fixture_ids(date(START, 1, 1), date(END, 12, 31), DENSITY)
+                if TMDbStubHandler.known(number)}
+
+    crawl = start_crawl(tmp_path, imdb, tmdb, settings=FAST, start=START, end=END)
+    deadline = time.monotonic() + 60
+    while len(exported_ids(tmp_path)) < len(expected) // 3:
+        assert crawl.poll() is None, "crawl finished before it could be killed"
+        assert time.monotonic() < deadline, "crawl exported nothing"
+        time.sleep(0.05)
+    crawl.send_signal(signal.SIGKILL)
+    crawl.wait()
+    assert len(set(exported_ids(tmp_path))) < len(expected)
+
+    crawl = start_crawl(tmp_path, imdb, tmdb, settings=FAST, start=START, end=END)
+    assert crawl.wait(timeout=240) == 0
+
+    ids = exported_ids(tmp_path)
+    assert len(ids) == len(set(ids))
+    assert set(ids) == expected
+    db = sqlite3.connect(tmp_path / 'job' / STATE_FILENAME)
+    try:
+        (done,) = db.execute('SELECT COUNT(*) FROM partitions').fetchone()
+    finally:
+        db.close()
+    assert done == (END - START + 1) * 12
@@ -0,0 +1,107 @@
+import json
+import sqlite3
+from types import SimpleNamespace
+
+from twisted.internet import defer
+
+from imdbscrapper.bench import fixture_movie_items
+from imdbscrapper.dedup import DedupIndex
+from imdbscrapper.pipelines import StreamingExportPipeline
+from imdbscrapper.state import JobState, PartitionTracker
+
+
+def test_partition_commit_writes_remembered_titles(tmp_path):
+    path = str(tmp_path / 'crawl_state.sqlite3')
+    state = JobState(path)
+    item = next(fixture_movie_items(1))
+    state.remember_title(item)
+    tracker = PartitionTracker(state)
+    tracker.track('2000-01-01,2000-01-31', item.imdb_id)
+    tracker.finish_listing('2000-01-01,2000-01-31')
+    tracker.item_done(item.imdb_id)
+
+    # Read through a second connection, as a resumed crawl would.
+    db = sqlite3.connect(path)
+    assert db.execute('SELECT key FROM partitions').fetchall() == [('2000-01-01,2000-01-31',)]
+    assert db.execute('SELECT imdb_id FROM titles').fetchall() == [(item.imdb_id,)]
+    db.close()
+    state.close()
+
+
+def export_pipeline(tmp_path):
+    pipeline = StreamingExportPipeline(str(tmp_path / 'exports'), formats=['ndjson'], batch_size=2, flush_interval=0)
+    # Writes run inline; crawls run them in the reactor's thread pool.
+    pipeline.run_in_thread = defer.maybeDeferred
+    pipeline.index = DedupIndex(str(tmp_path / 'seen_ids.sqlite3'), capacity=1000)
+    pipeline.open_spider(SimpleNamespace(name='spider'))
+    return pipeline
+
+
+def exported_ids(pipeline):
+    with open(pipeline.ndjson_path, encoding='utf-8') as f:
+        return [json.loads(line)['imdb_id'] for line in f]
+
+
+def test_export_records_ids_after_each_batch(tmp_path):
+    pipeline = export_pipeline(tmp_path)
+    items = list(fixture_movie_items(3))
+    for item in items:
+        pipeline.process_item(item, None)
+    assert pipeline.index.stored == 2
+    pipeline.close_spider(None)
+    pipeline.index.close()
+    assert exported_ids(pipeline) == [item.imdb_id for item in items]
+    index = DedupIndex(str(tmp_path / 'seen_ids.sqlite3'), capacity=1000)
+    assert index.claim_many([item.imdb_id for item in items]) == [False, False, False]
+    index.close()
+
+
+def test_resume_cuts_rows_that_were_never_recorded(tmp_path):
+    pipeline = export_pipeline(tmp_path)
+    items = list(fixture_movie_items(3))
+    for item in items[:2]:
+        pipeline.process_item(item, None)
+    # Killed after writing a row but before recording its ID.
+    pipeline.ndjson_file.write(json.dumps({'imdb_id': items[2].imdb_id}) + '\n')
+    pipeline.ndjson_file.close()
+    pipeline.index.close()
+
+    pipeline = export_pipeline(tmp_path)
+    assert exported_ids(pipeline) == [item.imdb_id for item in items[:2]]
+    assert pipeline.index.claim_many([items[2].imdb_id]) == [True]
+    pipeline.close_spider(None)
+    pipeline.index.close()
+
+
+def test_export_batches_are_written_one_at_a_time(tmp_path):
+    pipeline = export_pipeline(tmp_path)
+    writes = []
+
+    def run_in_thread(f, *args):
+        d = defer.Deferred()
+        writes.append((d, f, args))
+        return d
+
+    def finish_write():
+        d, f, args = writes.pop(0)
+        d.callback(f(*args))
+
+    pipeline.run_in_thread = run_in_thread
+    items = list(fixture_movie_items(4))
+    results = [pipeline.process_item(item, None) for item in items]
+    assert results[0] is items[0] and results[2] is items[2]
+    passed = []
+    for result in results[1::2]:
+        result.addCallback(passed.append)
+    # The second batch waits for the first to be written.
+    assert len(writes) == 1 and passed == []
+    finish_write()
+    assert passed == [items[1]] and len(writes) == 1
+    finish_write()
+    assert passed == [items[1], items[3]]
+    closed = []
+    pipeline.close_spider(None).addCallback(closed.append)
+    finish_write()
+    assert closed and pipeline.ndjson_file.closed
+    pipeline.index.close()
+    assert exported_ids(pipeline) == [item.imdb_id for item in items]
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import date
+
+import pytest
+
+from imdbscrapper import listing
+from imdbscrapper.bench import FixtureServer, TMDbStubHandler, fixture_search_page
+from imdbscrapper.tmdb import TMDbClient, redact
+
+pytest.importorskip('aiohttp')
+
+
+@pytest.fixture
+def tmdb_stub():
+    server = FixtureServer(TMDbStubHandler, latency=0, error_rate=0, retry_after=0).start()
+    yield server
+    server.stop()
+
+
+def requests_per_title(server, rows):
+    async def crawl():
+        client = TMDbClient('key', base_url=f'{server.base_url}/3', rate_limit=0)
+        counts = {}
+        try:
+            for row in rows:
+                before = server.counts['requests']
+                async for _, data in client.enrich([row['imdb_id']], {row['imdb_id']: row['title_type']}):
+                    assert data is None or data['imdb_id'] == row['imdb_id']
+                counts[row['imdb_id']] = server.counts['requests'] - before
+        finally:
+            await client.close()
+        return counts
+
+    return asyncio.run(crawl())
+
+
+def test_rendered_rows_take_the_shortest_tmdb_path(tmdb_stub):
+    day = date(2020, 3, 1)
+    html = fixture_search_page(day, day, density=20, expanded=True)
+    rows = listing.parse_rendered_items(html)
+    assert {row['title_type'] for row in rows} == {'movie', 'tvSeries'}
+
+    counts = requests_per_title(tmdb_stub, rows)
+    for row in rows:
+        number = int(row['imdb_id'][2:])
+        known = TMDbStubHandler.known(number)
+        if row['title_type'] == 'tvSeries':
+            # /find, then /tv/{id} when TMDb knows the show.
+            assert counts[row['imdb_id']] == (2 if known else 1)
+        else:
+            # /movie/{imdb_id}, then /find only when that misses.
+            assert counts[row['imdb_id']] == (1 if known else 2)
+
+
+def test_unlabelled_row_types():
+    assert listing.title_type_from_label(None) == 'movie'
+    assert listing.title_type_from_label(' TV Mini Series ') == 'tvMiniSeries'
+    assert listing.title_type_from_label('Podcast Series') is None
+
+
+@pytest.mark.parametrize('api_key, sent_as', [('v3key', 'auth/query'), ('eyJhbGciOiJIUzI1NiJ9.e30.token', 'auth/header')])
+def test_api_key_is_sent_like_tmdb_expects(tmdb_stub, api_key, sent_as):
+    tmdb_stub.options['changes'] = {'movie': [1, 2], 'tv': [5]}
+
+    async def crawl():
+        client = TMDbClient(api_key, base_url=f'{tmdb_stub.base_url}/3', rate_limit=0)
+        try:
+            return await client.changes('movie', date(2020, 1, 1), date(2020, 1, 14))
+        finally:
+            await client.close()
+
+    assert asyncio.run(crawl()) == {1, 2}
+    assert tmdb_stub.counts[sent_as] == tmdb_stub.counts['requests'] == 1
+
+
+def test_logged_errors_hide_the_api_key():
+    url = 'https://api.themoviedb.org/3/movie/changes?page=1&api_key=secret'
+    assert redact(f"404, message='Not Found', url='{url}'", 'secret') == \
+        "404, message='Not Found', url='https://api.themoviedb.org/3/movie/changes?page=1&api_key=<api_key>'"